@@ -0,0 +1,142 @@
+# MIT 6.034 Lab 1: Rule-Based Systems
+
+# A tabled backward chainer for lists of IF rules.
+#
+# Building a goal tree by backward chaining visits the same subgoal again
+# every time some rule needs it, and never finishes if the rules are
+# recursive ("(?x) is an ancestor of (?y)" needing "(?z) is an ancestor of
+# (?y)").  The Backchainer remembers the tree for each subgoal it has
+# finished, treating two subgoals that differ only in their variable names as
+# the same one, and stops at a subgoal that it is already in the middle of
+# expanding, leaving it as a leaf.
+#
+# Trees are built from the shared nodes of a GoalTreeTable, so simplify()
+# compares subtrees by number rather than by string.
+
+from production import (AND, OR, NOT, RuleExpression, GoalTreeTable, match,
+                        partial_populate)
+from utils import AIRegex, AIStringVars
+
+def canonical_variables(hypothesis):
+    """
+    Rename the variables in 'hypothesis' to (?0), (?1), ... in order of
+    appearance.  Returns the renamed string and a dictionary that maps the
+    new names back to the old ones.
+    """
+    names = {}
+    def rename(m):
+        if m.group(1) not in names:
+            names[m.group(1)] = str(len(names))
+        return '(?%s)' % names[m.group(1)]
+    canonical = AIRegex.sub(rename, hypothesis)
+    return canonical, dict([(new, old) for old, new in names.items()])
+
+class Backchainer(object):
+    """
+    Builds simplified goal trees for hypotheses from a list of rules,
+    remembering the tree for each subgoal across calls to goal_tree().
+    """
+    def __init__(self, rules):
+        self.rules = list(rules)
+        self.table = GoalTreeTable()
+        self._trees = {}
+        self._in_progress = {}
+        self._variables_of = {}
+        self._fresh = 0
+
+    def goal_tree(self, hypothesis):
+        """Return the simplified goal tree for 'hypothesis'."""
+        return self._subgoal(hypothesis)[0]
+
+    def _subgoal(self, goal):
+        """Return the tree for one antecedent, and how far up it looped."""
+        if isinstance(goal, (AND, OR)):
+            subtrees = []
+            loops_to = None
+            for x in goal:
+                tree, depth = self._subgoal(x)
+                subtrees.append(tree)
+                loops_to = _shallower(loops_to, depth)
+            return self.table.make(goal.__class__, subtrees), loops_to
+        if not isinstance(goal, str):
+            # A NOT can't be chained through; leave it as a leaf.
+            return self.table.intern(goal), None
+        canonical, names = canonical_variables(goal)
+        tree, loops_to = self._solve(canonical)
+        free = self._variables(tree) - set(names)
+        if free or any([old != new for new, old in names.items()]):
+            # Variables that only appear further down the tree (from rule
+            # antecedents) get fresh names, so that they can't be confused
+            # with the goal's own variables or with another copy of this
+            # subtree elsewhere.
+            names = dict(names)
+            for name in sorted(free):
+                self._fresh += 1
+                names[name] = '_%d' % self._fresh
+            tree = self._rename(tree, names)
+        return tree, loops_to
+
+    def _solve(self, goal):
+        if goal in self._trees:
+            return self._trees[goal], None
+        if goal in self._in_progress:
+            return goal, self._in_progress[goal]
+
+        depth = len(self._in_progress)
+        self._in_progress[goal] = depth
+        loops_to = None
+        branches = [goal]
+        for rule in self.rules:
+            bindings = match(rule.consequent(), goal)
+            if bindings is None:
+                continue
+            tree, looped = self._subgoal(_populate(rule.antecedent(), bindings))
+            branches.append(tree)
+            loops_to = _shallower(loops_to, looped)
+        del self._in_progress[goal]
+
+        tree = self.table.simplify(self.table.make(OR, branches))
+        if loops_to is None or loops_to >= depth:
+            # Nothing in this tree was cut short on account of a goal above
+            # this one, so it's the same wherever this goal turns up.
+            self._trees[goal] = tree
+            loops_to = None
+        return tree, loops_to
+
+    def _variables(self, tree):
+        """The names of the variables in a shared tree (or a string)."""
+        if not isinstance(tree, RuleExpression):
+            return AIStringVars(tree)
+        key = self.table.key(tree)
+        if key not in self._variables_of:
+            found = set()
+            for x in tree:
+                found |= self._variables(x)
+            self._variables_of[key] = frozenset(found)
+        return self._variables_of[key]
+
+    def _rename(self, tree, names):
+        if isinstance(tree, RuleExpression):
+            return self.table.make(tree.__class__,
+                                   [self._rename(x, names) for x in tree])
+        return AIRegex.sub(lambda m: '(?%s)' % names.get(m.group(1),
+                                                         m.group(1)),
+                           tree)
+
+def _shallower(a, b):
+    if a is None:
+        return b
+    if b is None:
+        return a
+    return min(a, b)
+
+def _populate(expression, bindings):
+    # Variables that only appear in a rule's antecedent stay as variables.
+    if isinstance(expression, (AND, OR, NOT)):
+        return expression.__class__(*[_populate(x, bindings)
+                                      for x in expression])
+    return partial_populate(expression, bindings)
+
+def tabled_goal_tree(rules, hypothesis):
+    """Return the simplified goal tree for 'hypothesis', by tabling."""
+    return Backchainer(rules).goal_tree(hypothesis)
@@ -0,0 +1,172 @@
+# MIT 6.034 Lab 1: Rule-Based Systems
+
+# Benchmarks for forward_chain.
+#
+# For each dataset, the rules are run once through a copy of the naive
+# engine's loop that counts, for every rule, how many times it was matched,
+# how many bindings it found, how many times it changed the data and how long
+# it took, and times each pass through the rules.  Then each engine is timed
+# on its own, and its result is checked against the naive one.
+#
+# Run it as
+#   python benchmark.py [--engines naive,rete,seminaive] [--all-bindings]
+#                       [--scale 3,4,5] [--repeat N] [--output results.json]
+# to print (or save) the results as JSON, so that runs of different versions
+# of the engines can be compared.
+
+import argparse
+import json
+import sys
+import time
+from contextlib import redirect_stdout
+
+from production import forward_chain, AssertionStore, pattern_cache
+import data as lab_data
+
+# lab1.py runs forward_chain when it's imported, and prints while it does;
+# keep that out of the JSON.
+with redirect_stdout(sys.stderr):
+    from lab1 import transitive_rule, family_rules
+
+DATASETS = [
+    ('poker', 'transitive', lab_data.poker_data),
+    ('abc', 'transitive', lab_data.abc_data),
+    ('minecraft', 'transitive', lab_data.minecraft_data),
+    ('simpsons', 'family', lab_data.simpsons_data),
+    ('black', 'family', lab_data.black_data),
+]
+
+RULE_SETS = {
+    'transitive': [transitive_rule],
+    'family': family_rules,
+}
+
+def synthetic_family(generations, children=2):
+    """
+    Data for a made-up family tree: one ancestor, and 'children' children
+    for everyone in each of the next 'generations' - 1 generations.
+    """
+    people = ['p0']
+    data = ['person p0']
+    parents = ['p0']
+    for _ in range(generations - 1):
+        next_parents = []
+        for parent in parents:
+            for _ in range(children):
+                child = 'p%d' % len(people)
+                people.append(child)
+                data.append('person ' + child)
+                data.append('parent %s %s' % (parent, child))
+                next_parents.append(child)
+        parents = next_parents
+    return tuple(data)
+
+def profile_naive(rules, data, apply_only_one=True):
+    """
+    Run the naive engine's loop over 'rules' and 'data', counting as it
+    goes.  Returns (result, profile), where 'result' is what forward_chain
+    would return.
+    """
+    rule_stats = [{'rule': str(rule), 'matches': 0, 'bindings': 0,
+                   'firings': 0, 'seconds': 0.0} for rule in rules]
+    iterations = []
+    if not rules or not data:
+        return data, {'rules': rule_stats, 'iterations': iterations}
+
+    data = AssertionStore(data)
+    while True:
+        start = time.perf_counter()
+        fired = None
+        data.mark()
+        for index, rule in enumerate(rules):
+            rule_start = time.perf_counter()
+            bindings = rule.matches(data)
+            rule.fire(data, bindings, apply_only_one, False)
+            stats = rule_stats[index]
+            stats['seconds'] += time.perf_counter() - rule_start
+            stats['matches'] += 1
+            stats['bindings'] += len(bindings)
+            if data.changed_since_mark():
+                stats['firings'] += 1
+                fired = index
+                break
+        iterations.append({'fired': fired, 'assertions': len(data),
+                           'seconds': time.perf_counter() - start})
+        if fired is None:
+            break
+    return tuple(data), {'rules': rule_stats, 'iterations': iterations}
+
+def time_engine(rules, data, engine, apply_only_one, repeat):
+    """Return the best wall time of 'repeat' runs, and the result."""
+    best = None
+    for _ in range(repeat):
+        pattern_cache.clear()
+        start = time.perf_counter()
+        result = forward_chain(rules, data, apply_only_one, engine=engine)
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best, tuple(result)
+
+def benchmark(name, rule_set, data, engines, apply_only_one=True, repeat=1):
+    """Benchmark one dataset; returns a dictionary ready for JSON."""
+    rules = RULE_SETS[rule_set]
+    pattern_cache.clear()
+    start = time.perf_counter()
+    expected, profile = profile_naive(rules, data, apply_only_one)
+    profile['seconds'] = time.perf_counter() - start
+    profile['pattern_cache'] = pattern_cache.info()
+
+    results = {}
+    for engine in engines:
+        seconds, result = time_engine(rules, data, engine, apply_only_one,
+                                      repeat)
+        if engine == 'seminaive':
+            # Same assertions, possibly listed in a different order.
+            agrees = set(result) == set(expected)
+        else:
+            agrees = result == expected
+        results[engine] = {'seconds': seconds, 'assertions': len(result),
+                           'agrees_with_naive': agrees}
+    return {'dataset': name, 'rules': rule_set, 'assertions': len(data),
+            'apply_only_one': apply_only_one, 'profile': profile,
+            'engines': results}
+
+def run(engines, scales, apply_only_one=True, repeat=1):
+    datasets = list(DATASETS)
+    for generations in scales:
+        datasets.append(('family-%d' % generations, 'family',
+                         synthetic_family(generations)))
+    return [benchmark(name, rule_set, data, engines, apply_only_one, repeat)
+            for name, rule_set, data in datasets]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Benchmark forward_chain over the lab 1 datasets.")
+    parser.add_argument('--engines', default='naive,rete,seminaive',
+                        help="comma-separated engines to time")
+    parser.add_argument('--scale', default='4,5,6',
+                        help="generations of each synthetic family")
+    parser.add_argument('--all-bindings', action='store_true',
+                        help="run with apply_only_one=False")
+    parser.add_argument('--repeat', type=int, default=3,
+                        help="report the best of this many runs")
+    parser.add_argument('--output', help="write the JSON here")
+    args = parser.parse_args(argv)
+    if args.repeat < 1:
+        parser.error("--repeat must be at least 1")
+
+    engines = [e for e in args.engines.split(',') if e]
+    scales = [int(s) for s in args.scale.split(',') if s]
+    results = {'python': sys.version.split()[0],
+               'benchmarks': run(engines, scales, not args.all_bindings,
+                                 args.repeat)}
+    text = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w') as out:
+            out.write(text + '\n')
+    else:
+        print(text)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,263 @@
+# MIT 6.034 Lab 1: Rule-Based Systems
+
+# Knowledge-base files: the result of forward chaining, saved so that it can
+# be picked up again without deriving everything a second time.
+#
+# A file holds two lists of assertions: the ones that were asserted (the
+# 'data' given to forward_chain) and the facts that forward_chain derived from
+# them (its whole result), along with a fingerprint of the rules.  It's laid
+# out as a header and then one or more segments:
+#
+#   header   magic, version, fingerprint, length of the file in use
+#   segment  number of asserted, number of facts, (asserted + facts + 1)
+#            little-endian 64-bit offsets into the text, and the text:
+#            every assertion in UTF-8, one after another
+#
+# The lists are the asserted data of every segment in turn, and the facts of
+# every segment in turn.  The file is memory-mapped when it's loaded, so an
+# assertion is only read (and decoded) when something asks for it.
+#
+# resume_forward_chain carries on from a saved file.  If the rules are the
+# same ones and only ever add assertions (see seminaive.py), the saved facts
+# are already complete, so only bindings that use a new assertion need to be
+# looked for, and the new data and facts are appended to the file as a new
+# segment.  (The saved facts are still all read, to index them for the
+# search and to return them.)  Otherwise everything is derived again from
+# the asserted data and the new data, and the file is written afresh.
+
+import bisect
+import hashlib
+import mmap
+import os
+import struct
+import sys
+from array import array
+
+_MAGIC = b'6034KB'
+_VERSION = 2
+_HEADER = struct.Struct('<6sH20sQ')
+_SEGMENT = struct.Struct('<QQ')
+# Where the length is, in the header, so that it can be changed on its own.
+_LENGTH_OFFSET = _HEADER.size - 8
+
+def rules_fingerprint(rules):
+    """A digest of a list of rules, to tell if a file was made by them."""
+    text = '\n'.join([str(rule) for rule in rules])
+    return hashlib.sha1(text.encode('utf-8')).digest()
+
+
+class AssertionList(object):
+    """A read-only sequence of the assertions in one part of a file."""
+    def __init__(self, parts=()):
+        # Each part is (offsets, text, start, count): 'count' assertions,
+        # from offsets[start] on.
+        self._parts = []
+        self._firsts = []
+        self._count = 0
+        for part in parts:
+            self._add_part(*part)
+
+    def _add_part(self, offsets, text, start, count):
+        if count:
+            self._parts.append((offsets, text, start))
+            self._firsts.append(self._count)
+            self._count += count
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(self._count))]
+        if index < 0:
+            index += self._count
+        if not 0 <= index < self._count:
+            raise IndexError("assertion index out of range")
+        part = bisect.bisect_right(self._firsts, index) - 1
+        offsets, text, start = self._parts[part]
+        i = start + index - self._firsts[part]
+        begin, end = offsets[i], offsets[i + 1]
+        return bytes(text[begin:end]).decode('utf-8')
+
+    def __iter__(self):
+        for index in range(self._count):
+            yield self[index]
+
+
+class KnowledgeBase(object):
+    """
+    A knowledge-base file, memory-mapped.  'asserted' and 'facts' are
+    read-only sequences of strings; 'fingerprint' identifies the rules.
+    """
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'rb')
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0,
+                                  access=mmap.ACCESS_READ)
+        except ValueError:
+            self._file.close()
+            raise ValueError("Not a knowledge-base file: %s" % path)
+        try:
+            self._load()
+        except ValueError:
+            self.close()
+            raise
+
+    def _load(self):
+        if len(self._map) < _HEADER.size:
+            raise ValueError("Not a knowledge-base file: %s" % self.path)
+        magic, version, fingerprint, length = \
+            _HEADER.unpack_from(self._map, 0)
+        if magic != _MAGIC:
+            raise ValueError("Not a knowledge-base file: %s" % self.path)
+        if version != _VERSION:
+            raise ValueError("Unsupported knowledge-base version %d: %s"
+                             % (version, self.path))
+        if length > len(self._map):
+            raise ValueError("Truncated knowledge-base file: %s" % self.path)
+        self.fingerprint = fingerprint
+        view = memoryview(self._map)
+        # Every view of the map has to be released before it can be closed.
+        self._views = [view]
+        self.asserted = AssertionList()
+        self.facts = AssertionList()
+        position = _HEADER.size
+        while position < length:
+            if position + _SEGMENT.size > length:
+                raise ValueError("Truncated knowledge-base file: %s"
+                                 % self.path)
+            n_asserted, n_facts = _SEGMENT.unpack_from(self._map, position)
+            start = position + _SEGMENT.size
+            end = start + 8 * (n_asserted + n_facts + 1)
+            if end > length:
+                raise ValueError("Truncated knowledge-base file: %s"
+                                 % self.path)
+            offsets = view[start:end]
+            self._views.append(offsets)
+            if sys.byteorder == 'little':
+                offsets = offsets.cast('Q')
+                self._views.append(offsets)
+            else:
+                offsets = array('Q', offsets)
+                offsets.byteswap()
+            position = end + offsets[-1]
+            if position > length:
+                raise ValueError("Truncated knowledge-base file: %s"
+                                 % self.path)
+            text = view[end:position]
+            self._views.append(text)
+            self.asserted._add_part(offsets, text, 0, n_asserted)
+            self.facts._add_part(offsets, text, n_asserted, n_facts)
+
+    def close(self):
+        """Unmap the file.  The assertion lists can't be used after this."""
+        for view in reversed(getattr(self, '_views', [])):
+            view.release()
+        self._views = []
+        self._map.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+def load_kb(path):
+    """Open a knowledge-base file."""
+    return KnowledgeBase(path)
+
+def _segment(asserted, facts):
+    encoded = ([a.encode('utf-8') for a in asserted]
+               + [f.encode('utf-8') for f in facts])
+    offsets = array('Q', [0])
+    for item in encoded:
+        offsets.append(offsets[-1] + len(item))
+    if sys.byteorder != 'little':
+        offsets.byteswap()
+    return (_SEGMENT.pack(len(asserted), len(facts)) + offsets.tobytes()
+            + b''.join(encoded))
+
+def save_kb(path, rules, asserted, facts):
+    """
+    Write a knowledge-base file for 'rules', with 'asserted' as the data
+    they were given and 'facts' as what forward_chain made of it.  The
+    file is written alongside and then renamed into place, so a file that
+    is being read is never seen half-written.
+    """
+    segment = _segment(asserted, facts)
+    temp_path = path + '.tmp'
+    with open(temp_path, 'wb') as out:
+        out.write(_HEADER.pack(_MAGIC, _VERSION, rules_fingerprint(rules),
+                               _HEADER.size + len(segment)))
+        out.write(segment)
+    os.replace(temp_path, path)
+
+def append_kb(path, asserted, facts):
+    """
+    Add more asserted data and facts to the end of a knowledge-base file.
+    The new segment is written after the part of the file in use, and only
+    then is the header's length changed to take it in, so a file that is
+    being read never seems to end partway through a segment.
+    """
+    segment = _segment(asserted, facts)
+    with open(path, 'r+b') as f:
+        header = f.read(_HEADER.size)
+        if len(header) < _HEADER.size:
+            raise ValueError("Not a knowledge-base file: %s" % path)
+        magic, version, fingerprint, length = _HEADER.unpack(header)
+        if magic != _MAGIC or version != _VERSION:
+            raise ValueError("Not a knowledge-base file: %s" % path)
+        # Anything after the part in use is left from an append that
+        # didn't finish.
+        f.seek(length)
+        f.truncate()
+        f.write(segment)
+        f.flush()
+        os.fsync(f.fileno())
+        f.seek(_LENGTH_OFFSET)
+        f.write(struct.pack('<Q', length + len(segment)))
+
+def resume_forward_chain(rules, path, data=(), apply_only_one=True,
+                         verbose=False, engine='rete'):
+    """
+    forward_chain(rules, (the saved asserted data) + data), using the file
+    at 'path' to avoid deriving the saved facts again, and save the result
+    back there.  If there's no file yet, or it was made with different
+    rules, everything is derived from 'data' alone (or the asserted data
+    and 'data') and a new file is written.
+
+    With monotone rules, the result has the same assertions as chaining
+    from scratch would, but the new ones may be listed in a different
+    order: the saved facts come first.
+    """
+    from production import forward_chain
+    from seminaive import is_monotone, seminaive_forward_chain
+
+    rules = list(rules)
+    data = tuple(data)
+    if not os.path.exists(path):
+        result = tuple(forward_chain(rules, data, apply_only_one, verbose,
+                                     engine=engine))
+        save_kb(path, rules, data, result)
+        return result
+
+    with load_kb(path) as kb:
+        same_rules = kb.fingerprint == rules_fingerprint(rules)
+        if same_rules and not data:
+            return tuple(kb.facts)
+        if same_rules and rules and is_monotone(rules):
+            saved = len(kb.facts)
+            result = tuple(seminaive_forward_chain(rules, data, verbose,
+                                                   fixpoint=kb.facts))
+        else:
+            saved = None
+            asserted = tuple(kb.asserted) + data
+    if saved is not None:
+        append_kb(path, data, result[saved:])
+        return result
+    result = tuple(forward_chain(rules, asserted, apply_only_one, verbose,
+                                 engine=engine))
+    save_kb(path, rules, asserted, result)
+    return result
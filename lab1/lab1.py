@@ -72,6 +72,7 @@ black_family_cousins = [
 
 # Import additional methods for backchaining
 from production import PASS, FAIL, match, populate, simplify, variables
+from backchain import tabled_goal_tree
 
 def backchain_to_goal_tree(rules, hypothesis):
     """
@@ -85,20 +86,12 @@ def backchain_to_goal_tree(rules, hypothesis):
     need to be tested. The leaves of this tree should be strings
     (possibly with unbound variables), *not* AND or OR objects.
     Make sure to use simplify(...) to flatten trees where appropriate.
+
+    Subgoals are expanded once and remembered, and a subgoal that depends
+    on itself is left as a leaf, so recursive rules are fine (see
+    backchain.py).
     """
-    tree = OR(hypothesis)
-
-    for rule in rules:
-        variables = match(rule.consequent(), hypothesis)
-        if variables is not None:
-            if isinstance(rule.antecedent(), OR):
-                tree.append(OR([ backchain_to_goal_tree(rules, ant) for ant in populate(rule.antecedent(), variables)]))
-            elif isinstance(rule.antecedent(), AND):
-                tree.append(AND([ backchain_to_goal_tree(rules, ant) for ant in populate(rule.antecedent(), variables)]))
-            else:
-                tree.append(backchain_to_goal_tree(rules, populate(rule.antecedent(), variables)))
-    
-    return simplify(tree)
+    return tabled_goal_tree(rules, hypothesis)
 
 
 # Uncomment this to test out your backward chainer:
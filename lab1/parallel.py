@@ -0,0 +1,95 @@
+# MIT 6.034 Lab 1: Rule-Based Systems
+
+# Matching rules in worker processes.
+#
+# With apply_only_one=False, forward_chain goes through the rules in order,
+# and each rule finds all of its bindings before changing anything.  Until
+# some rule changes the data, every rule is matched against the same
+# assertions, so all of them can be matched at once, in separate processes,
+# against a snapshot of the data.  The main process then fires the rules in
+# order, just as the serial loop would, until one of them changes something;
+# the others' bindings are thrown away and the next round starts from a new
+# snapshot.  Since each rule fires with exactly the bindings it would have
+# found by itself, the result is the same as the serial engine's.
+#
+# Each worker keeps its own AssertionStore for its share of the rules.  It
+# gets the data once, when it starts (where processes are forked, without
+# copying anything), and after that only the assertions the last round
+# added and removed, so its store stays in step with the main one.
+
+import multiprocessing
+from production import AssertionStore
+
+def _worker(connection, rules, indices, data):
+    """Match some of the rules each round, in a worker process."""
+    store = AssertionStore(data)
+    while True:
+        changes = connection.recv()
+        if changes is None:
+            break
+        removed, added = changes
+        for assertion in removed:
+            store.remove(assertion)
+        for assertion in added:
+            store.add(assertion)
+        connection.send([(i, [dict(bindings)
+                              for bindings in rules[i].matches(store)])
+                         for i in indices])
+    connection.close()
+
+def parallel_forward_chain(rules, data, workers, verbose=False):
+    """
+    forward_chain with apply_only_one=False, matching the rules in
+    'workers' processes.
+    """
+    rules = list(rules)
+    if not rules or not data:
+        return data
+
+    data = AssertionStore(data)
+    # Deal the rules out round-robin, so that the first few rules (the ones
+    # most likely to fire) are spread across the workers.
+    chunks = [list(range(i, len(rules), workers))
+              for i in range(min(workers, len(rules)))]
+    connections = []
+    processes = []
+    try:
+        for chunk in chunks:
+            parent, child = multiprocessing.Pipe()
+            process = multiprocessing.Process(
+                target=_worker, args=(child, rules, chunk, tuple(data)))
+            process.daemon = True
+            process.start()
+            child.close()
+            connections.append(parent)
+            processes.append(process)
+
+        changes = ((), ())
+        while True:
+            for connection in connections:
+                connection.send(changes)
+            matches = [None] * len(rules)
+            for connection in connections:
+                for i, bindings in connection.recv():
+                    matches[i] = bindings
+            data.mark()
+            for rule, bindings in zip(rules, matches):
+                rule.fire(data, bindings, False, verbose)
+                if data.changed_since_mark():
+                    break
+            else:
+                break
+            changes = data.changes_since_mark()
+        for connection in connections:
+            connection.send(None)
+        for process in processes:
+            process.join()
+    finally:
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+                process.join()
+        for connection in connections:
+            connection.close()
+
+    return tuple(data)
@@ -0,0 +1,183 @@
+# MIT 6.034 Lab 1: Rule-Based Systems
+
+# A query planner for AND antecedents.
+#
+# AND matches its conditions in the order they're written, so a rule like
+#   AND("grandchild (?x) (?z)", "grandchild (?y) (?z)", NOT("sibling (?x) (?y)"))
+# pairs up every grandchild with every other one before the NOT gets a look
+# in.  The planner instead matches the most selective condition first, using
+# the per-word counts kept by the AssertionStore, and runs each NOT as soon
+# as all of its variables are bound.
+#
+# Matching in a different order finds the same bindings, but in a different
+# order, and forward_chain's result depends on that order.  So every binding
+# remembers the positions of the assertions it matched, and the bindings are
+# sorted back into the order the written-out AND would have produced.
+#
+# Partial results are kept in the store's join_cache until the store next
+# changes, so rules whose plans begin with the same conditions (for example
+# grandparent_rule and grandchild_rule in lab1.py) share the work.
+
+from production import (IF, AND, OR, NOT, match, populate, partial_populate,
+                        AssertionStore, _REGEX_SPECIALS)
+from utils import AIRegex, AIStringVars, NoClobberDict
+
+def _is_plain(template):
+    # Templates that use regex syntax, or one variable twice, are left to
+    # AND's own matcher: matching them out of order could raise an error
+    # that the written order would never have reached.
+    return (isinstance(template, str)
+            and not _REGEX_SPECIALS.search(AIRegex.sub('', template))
+            and len(AIRegex.findall(template)) == len(AIStringVars(template)))
+
+def plannable(expression):
+    """Can the planner handle this AND: plain conditions and NOTs only?"""
+    if not isinstance(expression, AND):
+        return False
+    for condition in expression:
+        if isinstance(condition, NOT):
+            if len(condition) != 1 or not _is_plain(condition[0]):
+                return False
+        elif not _is_plain(condition):
+            return False
+    return True
+
+def estimate(condition, bound, store):
+    """
+    Estimate how many assertions 'condition' will match for each binding
+    of the variables in 'bound'.
+    """
+    words = condition.split(' ')
+    size = len(store.candidates(condition))
+    for i, word in enumerate(words):
+        match_var = AIRegex.match(word)
+        if (match_var and match_var.end() == len(word)
+            and match_var.group(1) in bound):
+            size = size / float(max(1, store.distinct_words(i)))
+    return size
+
+def make_plan(expression, store):
+    """
+    Return the plan for an AND: a list of steps (kind, condition, index,
+    estimate), where kind is 'match' or 'not' and index is the condition's
+    place among the AND's matching conditions.
+    """
+    positives = []
+    ground_nots = []
+    plan = []
+    bound = set()
+    for condition in expression:
+        if isinstance(condition, NOT):
+            pattern = condition[0]
+            variables = AIStringVars(pattern)
+            if variables and variables <= bound:
+                ground_nots.append(pattern)
+            else:
+                # NOT fills in nothing unless all of its variables are
+                # bound (and a NOT with no variables doesn't depend on the
+                # bindings at all), so it can run first, with nothing bound.
+                plan.append(('not', pattern, None, None))
+        else:
+            positives.append((len(positives), condition))
+            bound |= AIStringVars(condition)
+
+    bound = set()
+    remaining = positives
+    while remaining:
+        def cost(item):
+            index, condition = item
+            connected = not bound or bool(AIStringVars(condition) & bound)
+            return (not connected, estimate(condition, bound, store), index)
+        best = min(remaining, key=cost)
+        remaining = [item for item in remaining if item is not best]
+        plan.append(('match', best[1], best[0],
+                     estimate(best[1], bound, store)))
+        bound |= AIStringVars(best[1])
+        for pattern in list(ground_nots):
+            if AIStringVars(pattern) <= bound:
+                plan.append(('not', pattern, None, None))
+                ground_nots.remove(pattern)
+    return plan
+
+def _run_step(step, rows, store):
+    kind, condition = step
+    new_rows = []
+    if kind == 'not':
+        for key, bindings in rows:
+            try:
+                pattern = populate(condition, bindings)
+            except KeyError:
+                pattern = condition
+            for assertion in store.candidates(pattern):
+                if match(pattern, assertion) is not None:
+                    break
+            else:
+                new_rows.append((key, bindings))
+        return new_rows
+    for key, bindings in rows:
+        for assertion in store.candidates(partial_populate(condition,
+                                                           bindings)):
+            new_bindings = match(condition, assertion)
+            if new_bindings is None:
+                continue
+            if any([bindings.get(k, v) != v
+                    for k, v in new_bindings.items()]):
+                continue
+            new_bindings.update(bindings)
+            new_rows.append((key + (store.position(assertion),),
+                             new_bindings))
+    return new_rows
+
+def run_plan(plan, store):
+    """
+    Run a plan, reusing any prefix of it that's in the store's join_cache.
+    Returns a list of (positions, bindings) in the order they were found.
+    """
+    steps = tuple([(kind, condition) for kind, condition, _, _ in plan])
+    cache = store.join_cache
+    done = len(steps)
+    while done > 0 and steps[:done] not in cache:
+        done -= 1
+    rows = cache[steps[:done]] if done else [((), {})]
+    for i in range(done, len(steps)):
+        rows = _run_step(steps[i], rows, store)
+        cache[steps[:i+1]] = rows
+    return rows
+
+def planned_bindings(expression, store):
+    """
+    Return the bindings of an AND in the order AND.test_matches would
+    produce them, or None if the planner can't handle it.
+    """
+    if not isinstance(store, AssertionStore) or not plannable(expression):
+        return None
+    plan = make_plan(expression, store)
+    order = [step[2] for step in plan if step[0] == 'match']
+    rows = []
+    for key, bindings in run_plan(plan, store):
+        written_key = [None] * len(order)
+        for place, index in enumerate(order):
+            written_key[index] = key[place]
+        rows.append((written_key, bindings))
+    rows.sort(key=lambda row: row[0])
+    return [NoClobberDict(bindings) for _, bindings in rows]
+
+def explain_plan(rule, data=()):
+    """Print the plan the planner would use for each AND in a rule."""
+    store = data if isinstance(data, AssertionStore) else AssertionStore(data)
+    antecedent = rule.antecedent() if isinstance(rule, IF) else rule
+    expressions = list(antecedent) if isinstance(antecedent, OR) else [antecedent]
+    print("Plan for {}:".format(rule))
+    for expression in expressions:
+        if not plannable(expression):
+            print("  {} is matched as written".format(expression))
+            continue
+        if len(expressions) > 1:
+            print("  {}:".format(expression))
+        for number, (kind, condition, _, size) in \
+                enumerate(make_plan(expression, store)):
+            if kind == 'not':
+                print("  {}. NOT {!r}".format(number + 1, condition))
+            else:
+                print("  {}. match {!r} (~{:.3g} per binding)".format(
+                    number + 1, condition, size))
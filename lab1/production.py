@@ -29,7 +29,8 @@ except NameError:
         new_lst.sort()
         return new_lst
 
-def forward_chain(rules, data, apply_only_one=True, verbose=False):
+def forward_chain(rules, data, apply_only_one=True, verbose=False,
+                  engine='rete', workers=None):
     """
     Apply a list of IF-expressions (rules) through a set of data (assertions)
     in order.  Return the modified data set that results from the rules.
@@ -39,17 +40,58 @@ def forward_chain(rules, data, apply_only_one=True, verbose=False):
     variables at the same time, making the code considerably more efficient.
     If your rules have any NOTs or DELETEs, your results may wildly vary based
     on the value of apply_only_one; otherwise, the results will be the same.
-    """
-    old_data = ()
 
-    while set(old_data) != set(data):
-        old_data = list(data)
+    'engine' chooses how rules are matched.  With 'rete' (the default), new
+    assertions are pushed through a Rete network (see rete.py) instead of
+    re-matching every rule against all of the data; rules it can't handle,
+    such as ones with DELETE clauses, quietly use 'naive', the original
+    matcher.  Both give exactly the same result.
+
+    'seminaive' runs rules without NOTs or DELETEs in rounds, each round
+    only joining against the assertions added by the one before (see
+    seminaive.py).  It finds the same assertions, but may list the new ones
+    in a different order.  Other rule sets use the default engine.
+
+    With apply_only_one=False, 'workers'=N matches the rules with the
+    'naive' matcher in N worker processes, each round firing the same
+    rule the serial loop would (see parallel.py); 'engine' is then
+    ignored.  The result is the same as without it.  Runs with
+    apply_only_one=True are always serial.
+
+    To save a result and carry on from it later with more data, see
+    resume_forward_chain in kb.py.
+    """
+    if workers is not None and workers > 1 and not apply_only_one:
+        from parallel import parallel_forward_chain
+        return parallel_forward_chain(rules, data, workers, verbose)
+    if engine == 'seminaive':
+        from seminaive import seminaive_forward_chain
+        result = seminaive_forward_chain(rules, data, verbose)
+        if result is not None:
+            return result
+        engine = 'rete'
+    if engine == 'rete':
+        from rete import rete_forward_chain
+        result = rete_forward_chain(rules, data, apply_only_one, verbose)
+        if result is not None:
+            return result
+    elif engine != 'naive':
+        raise ValueError("Unknown forward_chain engine: %s" % engine)
+
+    if not rules or not data:
+        return data
+
+    data = AssertionStore(data)
+    while True:
+        data.mark()
         for rule in rules:
-            data = rule.apply(data, apply_only_one, verbose)
-            if set(data) != set(old_data):
+            rule.apply(data, apply_only_one, verbose)
+            if data.changed_since_mark():
                 break
+        else:
+            break
 
-    return data
+    return tuple(data)
 
 def instantiate(template, values_dict):
     """
@@ -66,13 +108,21 @@ def instantiate(template, values_dict):
         return template.__class__(*[populate(x, values_dict)
                                     for x in template])
     elif isinstance(template, str):
-        return AIStringToPyTemplate(template) % values_dict
+        return pattern_cache.get(template).py_template % values_dict
     else: raise ValueError("Don't know how to populate a %s" % \
       type(template))
 
 # alternate name for instantiate
 populate = instantiate
 
+def partial_populate(template, values_dict):
+    """
+    Like populate, for a string template, but leaves any variables that
+    aren't in values_dict in place instead of raising a KeyError.
+    """
+    return AIRegex.sub(lambda m: values_dict.get(m.group(1), m.group(0)),
+                       template)
+
 def match(template, AIStr):
     """
     Given two strings, 'template': a string containing variables
@@ -84,8 +134,7 @@ def match(template, AIStr):
     AIStr, or None if no such set exists.
     """
     try:
-        return re.match( AIStringToRegex(template),
-                         AIStr ).groupdict()
+        return pattern_cache.get(template).regex.match(AIStr).groupdict()
     except AttributeError: # The re.match() expression probably
                            # just returned None
         return None
@@ -100,11 +149,151 @@ def variables(exp):
     Return a dictionary containing the names of all variables in
     'exp' as keys, or None if there are no such variables.
     """
-    try:
-        return re.search( AIStringToRegex(exp).groupdict() )
-    except AttributeError: # The re.match() expression probably
-                           # just returned None
+    names = pattern_cache.get(exp).variables
+    if not names:
         return None
+    return dict.fromkeys(names)
+
+# Characters that make match() treat a template as more than plain words.
+_REGEX_SPECIALS = re.compile(r'[.^$*+?{}\[\]\\|()]')
+
+class AssertionStore(object):
+    """
+    An ordered set of assertions that forward_chain updates in place.
+
+    Assertions are indexed by the word at each position (so "parent marge
+    bart" is filed under "parent" at position 0, "marge" at 1 and "bart" at
+    2) and by their number of words.  candidates() uses the index to find
+    the few assertions a condition could possibly match, in the same order
+    they appear in the store.
+
+    Iterating over a store gives its assertions in order, so tuple(store)
+    is the familiar tuple of assertions.  position() gives a number that
+    increases in the same order.
+
+    join_cache is scratch space for the query planner (see planner.py); it
+    is emptied whenever the store changes.
+    """
+    def __init__(self, data=()):
+        self._assertions = {}
+        self._by_word = {}
+        self._by_length = {}
+        self._distinct = {}
+        self._marked = {}
+        self._next_position = 0
+        self.join_cache = {}
+        for assertion in data:
+            self.add(assertion)
+
+    def _index_keys(self, assertion):
+        # match() lets a trailing newline through, so ignore one here too.
+        if assertion.endswith('\n'):
+            assertion = assertion[:-1]
+        words = assertion.split(' ')
+        return len(words), [(i, w) for i, w in enumerate(words)]
+
+    def _note_change(self, assertion, was_present):
+        if assertion not in self._marked:
+            self._marked[assertion] = was_present
+
+    def add(self, assertion):
+        """Add an assertion at the end.  Return False if it was present."""
+        if assertion in self._assertions:
+            return False
+        self._note_change(assertion, False)
+        self._assertions[assertion] = self._next_position
+        self._next_position += 1
+        length, keys = self._index_keys(assertion)
+        self._by_length.setdefault(length, {})[assertion] = True
+        for key in keys:
+            if key not in self._by_word:
+                self._by_word[key] = {}
+                self._distinct[key[0]] = self._distinct.get(key[0], 0) + 1
+            self._by_word[key][assertion] = True
+        if self.join_cache:
+            self.join_cache = {}
+        return True
+
+    def remove(self, assertion):
+        """Remove an assertion.  Return False if it wasn't present."""
+        if assertion not in self._assertions:
+            return False
+        self._note_change(assertion, True)
+        del self._assertions[assertion]
+        length, keys = self._index_keys(assertion)
+        del self._by_length[length][assertion]
+        for key in keys:
+            del self._by_word[key][assertion]
+            if not self._by_word[key]:
+                del self._by_word[key]
+                self._distinct[key[0]] -= 1
+        if self.join_cache:
+            self.join_cache = {}
+        return True
+
+    def position(self, assertion):
+        """Return a number giving the assertion's place in the order."""
+        return self._assertions[assertion]
+
+    def distinct_words(self, position):
+        """How many different words appear at this position?"""
+        return self._distinct.get(position, 0)
+
+    def candidates(self, template):
+        """
+        Return the assertions that 'template' could match, in order.  Every
+        assertion that match(template, ...) accepts is included.
+        """
+        if (not isinstance(template, str) or
+            _REGEX_SPECIALS.search(AIRegex.sub('', template))):
+            return self._assertions
+        words = template.split(' ')
+        best = self._by_length.get(len(words), {})
+        for key in enumerate(words):
+            if '(?' in key[1]:
+                continue
+            bucket = self._by_word.get(key, {})
+            if len(bucket) < len(best):
+                best = bucket
+        return best
+
+    def mark(self):
+        """Start tracking changes, for changed_since_mark()."""
+        self._marked = {}
+
+    def changed_since_mark(self):
+        """Is the set of assertions different from when mark() was called?"""
+        for assertion, was_present in self._marked.items():
+            if (assertion in self._assertions) != was_present:
+                return True
+        return False
+
+    def changes_since_mark(self):
+        """
+        Return (removed, added): every assertion added or removed since
+        mark() was called, and those of them now present, in order.
+        Removing the first and then adding the second brings a copy of the
+        store as it was at mark() up to date, in the same order.
+        """
+        removed = list(self._marked)
+        added = sorted([assertion for assertion in removed
+                        if assertion in self._assertions],
+                       key=self._assertions.get)
+        return removed, added
+
+    def __contains__(self, assertion):
+        return assertion in self._assertions
+
+    def __iter__(self):
+        return iter(self._assertions)
+
+    def __len__(self):
+        return len(self._assertions)
+
+    def __str__(self):
+        return 'AssertionStore(%r)' % (tuple(self),)
+
+    __repr__ = __str__
 
 class IF(object):
     """
@@ -142,33 +331,43 @@ class IF(object):
     def apply(self, data, apply_only_one, verbose):
         """
         Return a new set of data updated by the conditions and
-        actions of this IF statement.
+        actions of this IF statement.  If 'data' is an AssertionStore,
+        it is updated in place and returned instead.
 
         If 'apply_only_one' is True, after adding one datum,
         return immediately instead of continuing. This is the
         behavior described in class, but it is slower.
         """
+        in_place = isinstance(data, AssertionStore)
+        new_data = data if in_place else AssertionStore(data)
+        # Find every binding before changing anything.
+        self.fire(new_data, self.matches(new_data), apply_only_one, verbose)
+        return new_data if in_place else tuple(new_data)
+
+    def matches(self, data):
+        """Return a list of every binding of this rule's antecedent."""
+        return list(RuleExpression().test_term_matches(self._conditional,
+                                                       data))
+
+    def fire(self, new_data, bindings, apply_only_one, verbose):
+        """
+        Carry out this rule's actions and deletions on the AssertionStore
+        'new_data' for each of 'bindings' in turn, which must have been
+        found before it changed.  Returns True if any assertion was added
+        or deleted (even if the set ends up as it was).
+        """
         verbose = int(verbose) # False -> 0, True -> 1
-
-        new_data = data[:] # Preserve ordering of data to get bindings!
-        old_data_count = len(new_data) #original number of assertions
-        bindings = list(RuleExpression().test_term_matches(self._conditional,
-                                                      new_data))
+        changed = False
         if len(bindings) > 0 and verbose >= 2:
             print("Rule matches: {}".format(self))
 
-        new_data = list(new_data)
-        new_data_set = set(new_data)
         for k in bindings:
             rule_fired = False
             if verbose >= 2:
                 print(" {}".format(k))
             for a in self._action:
                 new_datum = populate(a, k)
-                new_data_set.add(new_datum)
-                if len(new_data_set) != old_data_count:
-                    new_data.append(new_datum)
-                    old_data_count = len(new_data_set) #update old_data_count
+                if new_data.add(new_datum):
                     rule_fired = True
                     if verbose >= 1:
                         if verbose <= 1: print("Rule: {}".format(self))
@@ -179,20 +378,21 @@ class IF(object):
             for d in self._delete_clause:
                 try:
                     delete_datum = populate(d, k)
-                    new_data_set.remove(delete_datum) # Throws KeyError if failure
-                    new_data.remove(delete_datum)
-                    old_data_count = len(new_data_set) #update old_data_count
+                except KeyError:
+                    delete_datum = None
+                if delete_datum is not None and new_data.remove(delete_datum):
                     rule_fired = True
                     if verbose >= 1:
                         if verbose <= 1: print("Rule: {}".format(self))
                         print("  Deleted assertion: {}".format(delete_datum))
-                except KeyError:
+                else:
                     if verbose >= 2:
-                        print("  Assertion doesn't exist, so it was not deleted: {}".format(new_datum))
+                        print("  Assertion doesn't exist, so it was not deleted: {}".format(delete_datum))
+            changed = changed or rule_fired
             if apply_only_one and rule_fired:
-                return tuple(new_data)
+                break
 
-        return tuple(new_data)
+        return changed
 
     def __str__(self):
         if self._delete_clause == ():
@@ -206,6 +406,14 @@ class IF(object):
     def antecedent(self):
         return self._conditional
 
+    def explain(self, data=()):
+        """
+        Print the order in which the conditions of this rule would be
+        matched against 'data' (see planner.py).
+        """
+        from planner import explain_plan
+        explain_plan(self, data)
+
     def consequent(self):
         # Note that while _conditional points to a string, an AND, or an OR;
         #  _action points to a THEN(___) instead of just the ___. From a data
@@ -250,7 +458,8 @@ class RuleExpression(list):
         Given an condition (which might be just a string), check
         it against the data (assertions).
         """
-        data = list(data)
+        if not isinstance(data, AssertionStore):
+            data = list(data)
         if context_so_far == None: context_so_far = {}
 
         # Deal with nesting first
@@ -263,6 +472,8 @@ class RuleExpression(list):
             return self.basecase_bindings(condition, data, context_so_far)
 
     def basecase_bindings(self, condition, data, context_so_far):
+        if isinstance(data, AssertionStore):
+            data = data.candidates(condition)
         for assertion in data:
             bindings = match(condition, assertion)
             if bindings is None: continue
@@ -303,6 +514,12 @@ class AND(RuleExpression):
 
     def test_matches(self, data, context_so_far=None):
         if context_so_far == None: context_so_far = {}
+        if isinstance(data, AssertionStore):
+            # Let the query planner pick the join order, if it can.
+            from planner import planned_bindings
+            bindings = planned_bindings(self, data)
+            if bindings is not None:
+                return iter(bindings)
         return self._test_matches_iter(data, list(self))
 
     def _test_matches_iter(self, data, conditions=None, cumulative_dict=None):
@@ -406,6 +623,84 @@ def uniq(lst):
             seen[str(item)]=True
     return result
 
+class GoalTreeTable(object):
+    """
+    Hash-consed AND/OR trees.
+
+    intern() returns one shared node for each distinct tree, and gives it a
+    number, so two trees can be compared by number instead of by walking or
+    stringifying them.  simplify() remembers its answer for each shared
+    node.  Shared nodes must not be modified.
+    """
+    def __init__(self):
+        self._nodes = {}        # (class, child keys) -> shared node
+        self._numbers = {}      # id(shared node) -> its number
+        self._simplified = {}   # number -> simplified shared node
+
+    def key(self, node):
+        """A hashable stand-in for an interned node (or a string)."""
+        if isinstance(node, RuleExpression):
+            return self._numbers[id(node)]
+        return node
+
+    def make(self, cls, children):
+        """Return the shared node cls(*children) for interned children."""
+        key = (cls, tuple([self.key(x) for x in children]))
+        node = self._nodes.get(key)
+        if node is None:
+            node = cls(*children)
+            self._nodes[key] = node
+            self._numbers[id(node)] = len(self._numbers)
+        return node
+
+    def intern(self, node):
+        """Return the shared copy of an AND/OR/NOT tree."""
+        if not isinstance(node, RuleExpression):
+            return node
+        if id(node) in self._numbers:
+            return node
+        return self.make(node.__class__, [self.intern(x) for x in node])
+
+    def simplify(self, node):
+        """simplify(), on shared nodes."""
+        node = self.intern(node)
+        if not isinstance(node, RuleExpression):
+            return node
+        number = self._numbers[id(node)]
+        if number in self._simplified:
+            return self._simplified[number]
+        branches = []
+        seen = set()
+        for x in node:
+            x = self.simplify(x)
+            if self.key(x) not in seen:
+                seen.add(self.key(x))
+                branches.append(x)
+        if isinstance(node, AND):
+            result = self._reduce_singletons(self._flatten(AND, FAIL, branches))
+        elif isinstance(node, OR):
+            result = self._reduce_singletons(self._flatten(OR, PASS, branches))
+        else:
+            result = node
+        self._simplified[number] = result
+        return result
+
+    def _flatten(self, cls, absorbing, branches):
+        absorbing = self.key(self.intern(absorbing))
+        for b in branches:
+            if self.key(b) == absorbing:
+                return self.intern(b)
+        pieces = []
+        for branch in branches:
+            if isinstance(branch, cls): pieces.extend(branch)
+            else: pieces.append(branch)
+        return self.make(cls, pieces)
+
+    def _reduce_singletons(self, node):
+        if not isinstance(node, RuleExpression): return node
+        if len(node) == 1: return node[0]
+        return node
+
 def simplify(node):
     """
     Given an AND/OR tree, reduce it to a canonical, simplified
@@ -414,36 +709,7 @@ def simplify(node):
     You should do this to the expressions you produce by backward
     chaining.
     """
-    if not isinstance(node, RuleExpression): return node
-    branches = uniq([simplify(x) for x in node])
-    if isinstance(node, AND):
-        return _reduce_singletons(_simplify_and(branches))
-    elif isinstance(node, OR):
-        return _reduce_singletons(_simplify_or(branches))
-    else: return node
-
-def _reduce_singletons(node):
-    if not isinstance(node, RuleExpression): return node
-    if len(node) == 1: return node[0]
-    return node
-
-def _simplify_and(branches):
-    for b in branches:
-        if b == FAIL: return FAIL
-    pieces = []
-    for branch in branches:
-        if isinstance(branch, AND): pieces.extend(branch)
-        else: pieces.append(branch)
-    return AND(*pieces)
-
-def _simplify_or(branches):
-    for b in branches:
-        if b == PASS: return PASS
-    pieces = []
-    for branch in branches:
-        if isinstance(branch, OR): pieces.extend(branch)
-        else: pieces.append(branch)
-    return OR(*pieces)
+    return GoalTreeTable().simplify(node)
 
 PASS = AND()
 FAIL = OR()
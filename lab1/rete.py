@@ -0,0 +1,467 @@
+# MIT 6.034 Lab 1: Rule-Based Systems
+
+# A Rete network that forward_chain can use in place of re-matching every rule
+# against every assertion on every pass.
+#
+# The network has one alpha memory per distinct condition pattern (holding the
+# assertions that match it, with their bindings) and, for each rule, a chain of
+# join and negation nodes whose beta memories hold the partial matches
+# ("tokens") of the AND's prefixes.  Only newly added assertions are pushed
+# through the network.
+#
+# To reproduce forward_chain's output exactly, every assertion gets a sequence
+# number when it is added, and every token is keyed by the sequence numbers of
+# the assertions it matched.  Sorting tokens by key gives the same order that
+# the nested matching loops in production.py produce, so "the first binding
+# that fires" is simply the smallest pending key.
+#
+# The network handles rule sets that only ever add assertions (no DELETE
+# clauses), whose antecedents are a condition, a NOT, an AND of conditions and
+# NOTs, or an OR of those.  compile_rules returns None for anything else, and
+# forward_chain falls back to the naive matcher.
+#
+# Inside the network, assertions are tuples of interned word numbers and
+# bindings are tuples laid out per rule (see symbols.py); they're only turned
+# back into strings for printing and for the result.
+
+import heapq
+import re
+from operator import itemgetter
+from production import IF, AND, OR, NOT
+from utils import AIRegex, AIStringVars
+from symbols import (SymbolTable, Pattern, compile_filler, fill,
+                     is_word_string, is_word_template)
+
+# Characters that would make a template or an assertion behave like a regular
+# expression in match(), rather than like plain words.
+_REGEX_SPECIALS = re.compile(r'[.^$*+?{}\[\]\\|()%\n]')
+
+def _is_plain(template):
+    return (is_word_template(template)
+            and not _REGEX_SPECIALS.search(AIRegex.sub('', template)))
+
+def _is_matchable(template):
+    # match() can't compile a pattern that uses one variable twice.  The
+    # naive matcher only fails once it reaches such a condition, but the
+    # network matches every pattern up front.
+    return (_is_plain(template) and
+            len(AIRegex.findall(template)) == len(AIStringVars(template)))
+
+def _key_getter(indices):
+    """A function picking the join key out of a frame or a match."""
+    if not indices:
+        return lambda values: ()
+    return itemgetter(*indices)
+
+
+class Token(object):
+    """
+    A partial match, keyed by the assertions it matched.  'frame' holds the
+    values bound so far, in the order of its RuleChain's 'variables'.
+    """
+    __slots__ = ('key', 'frame', 'level', 'children', 'alive', 'actions')
+
+    def __init__(self, key, frame, level):
+        self.key = key
+        self.frame = frame
+        self.level = level
+        self.children = []
+        self.alive = True
+        self.actions = None
+
+
+class AlphaMemory(object):
+    """The assertions that match one condition pattern, with their values."""
+    def __init__(self, pattern):
+        self.pattern = pattern
+        self.items = {}
+        self.successors = []
+
+    def activate(self, assertion, network):
+        values = self.pattern.match(assertion)
+        if values is None:
+            return
+        self.items[assertion] = values
+        # Deeper nodes first, so that a new assertion matching two conditions
+        # of the same rule is only joined with itself once.
+        for node in self.successors:
+            node.right_activate(assertion, values, network)
+
+
+class JoinNode(object):
+    """
+    Joins the tokens of a beta memory with an alpha memory, on the
+    variables they share.  A joined token's frame is the left token's frame
+    followed by the values of the alpha pattern's new variables.
+    """
+    def __init__(self, chain, level, alpha, bound):
+        self.chain = chain
+        self.level = level
+        self.alpha = alpha
+        variables = alpha.pattern.variables
+        shared = [v for v in variables if v in bound]
+        self.left_key = _key_getter([bound[v] for v in shared])
+        self.right_key = _key_getter([variables.index(v) for v in shared])
+        self.new_values = [i for i, v in enumerate(variables)
+                           if v not in bound]
+        self.left_index = {}
+        self.right_index = {}
+        for assertion, values in alpha.items.items():
+            self._index_right(assertion, values)
+
+    def _index_right(self, assertion, values):
+        self.right_index.setdefault(self.right_key(values),
+                                    []).append((assertion, values))
+
+    def left_activate(self, token, network):
+        join_key = self.left_key(token.frame)
+        self.left_index.setdefault(join_key, {})[token.key] = token
+        for assertion, values in list(self.right_index.get(join_key, ())):
+            self._emit(token, assertion, values, network)
+
+    def right_activate(self, assertion, values, network):
+        self._index_right(assertion, values)
+        for token in list(self.left_index.get(self.right_key(values),
+                                              {}).values()):
+            self._emit(token, assertion, values, network)
+
+    def _emit(self, token, assertion, values, network):
+        frame = token.frame
+        if self.new_values:
+            frame = frame + tuple([values[i] for i in self.new_values])
+        key = token.key + (network.sequence[assertion],)
+        self.chain.add_token(token, key, frame, self.level + 1, network)
+
+    def left_retract(self, token):
+        del self.left_index[self.left_key(token.frame)][token.key]
+
+
+class NegativeNode(object):
+    """
+    Passes a token on only while its NOT condition has no match.
+
+    If the prefix binds every variable in the condition, the condition is
+    filled in and looked up directly.  Otherwise NOT.test_matches uses the
+    raw pattern, which blocks every token as soon as anything matches it.
+    """
+    def __init__(self, chain, level, filler, alpha):
+        self.chain = chain
+        self.level = level
+        self.filler = filler
+        self.ground = filler is not None
+        self.alpha = alpha
+        self.waiting = {}
+        self.passing = {}
+
+    def is_blocked(self, token, network):
+        if self.ground:
+            return fill(self.filler, token.frame) in network.sequence
+        return len(self.alpha.items) > 0
+
+    def left_activate(self, token, network):
+        if self.is_blocked(token, network):
+            return
+        if self.ground:
+            self.waiting.setdefault(fill(self.filler, token.frame),
+                                    {})[token.key] = token
+        else:
+            self.passing[token.key] = token
+        self.chain.add_token(token, token.key, token.frame,
+                             self.level + 1, network)
+
+    def right_activate(self, assertion, values, network):
+        # Only raw-pattern nodes are fed by an alpha memory.
+        blocked = list(self.passing.values())
+        self.passing.clear()
+        for token in blocked:
+            for child in token.children:
+                self.chain.retract(child)
+
+    def assertion_added(self, assertion):
+        for token in self.waiting.pop(assertion, {}).values():
+            for child in token.children:
+                self.chain.retract(child)
+
+    def left_retract(self, token):
+        if self.ground:
+            self.waiting.get(fill(self.filler, token.frame),
+                             {}).pop(token.key, None)
+        else:
+            self.passing.pop(token.key, None)
+
+
+class RuleChain(object):
+    """
+    The network for one AND (or a lone condition or NOT): a node per
+    condition, with a beta memory of tokens in front of each one.
+
+    'variables' lists the variables in the order the conditions bind them,
+    which is the layout of every token's frame; 'actions' are the rule's
+    consequents, compiled for filling in from a complete frame.
+    """
+    def __init__(self, rule_node, branch, conditions, network):
+        self.rule_node = rule_node
+        self.branch = branch
+        self.nodes = []
+        self.memories = [{}]
+        self.variables = []
+        bound = {}
+        for level, condition in enumerate(conditions):
+            if isinstance(condition, NOT):
+                pattern = condition[0]
+                if AIStringVars(pattern) <= set(bound):
+                    node = NegativeNode(self, level,
+                                        network.filler(pattern, bound), None)
+                    network.negative_nodes.append(node)
+                else:
+                    alpha = network.alpha_memory(pattern)
+                    node = NegativeNode(self, level, None, alpha)
+                    alpha.successors.insert(0, node)
+            else:
+                alpha = network.alpha_memory(condition)
+                node = JoinNode(self, level, alpha, bound)
+                alpha.successors.insert(0, node)
+                for variable in alpha.pattern.variables:
+                    if variable not in bound:
+                        bound[variable] = len(self.variables)
+                        self.variables.append(variable)
+            self.nodes.append(node)
+            self.memories.append({})
+        self.actions = [network.filler(action, bound)
+                        for action in rule_node.rule._action]
+
+    def start(self, network):
+        self.add_token(None, (), (), 0, network)
+
+    def add_token(self, parent, key, frame, level, network):
+        if key in self.memories[level]:
+            return
+        token = Token(key, frame, level)
+        self.memories[level][key] = token
+        if parent is not None:
+            parent.children.append(token)
+        if level == len(self.nodes):
+            self.rule_node.add_match(self, token)
+        else:
+            self.nodes[level].left_activate(token, network)
+
+    def retract(self, token):
+        if not token.alive:
+            return
+        token.alive = False
+        del self.memories[token.level][token.key]
+        if token.level < len(self.nodes):
+            self.nodes[token.level].left_retract(token)
+        for child in token.children:
+            self.retract(child)
+
+
+class RuleNode(object):
+    """The terminal node of one rule: its complete matches, in firing order."""
+    def __init__(self, index, rule, network):
+        self.index = index
+        self.rule = rule
+        self.network = network
+        self.pending = []
+        antecedent = rule.antecedent()
+        if isinstance(antecedent, OR):
+            branches = list(antecedent)
+        else:
+            branches = [antecedent]
+        self.chains = []
+        for branch, conditions in enumerate(branches):
+            if not isinstance(conditions, AND):
+                conditions = [conditions]
+            self.chains.append(RuleChain(self, branch, conditions, network))
+
+    def add_match(self, chain, token):
+        key = token.key
+        if len(self.chains) > 1:
+            key = (chain.branch,) + key
+        if token.actions is None:
+            token.actions = [fill(action, token.frame)
+                             for action in chain.actions]
+        heapq.heappush(self.pending, (key, token))
+        self.network.mark_ready(self.index)
+
+    def would_fire(self, token, network):
+        for action in token.actions:
+            if action not in network.sequence:
+                return True
+        return False
+
+    def next_match(self, network):
+        """
+        Return the first match that would add an assertion, discarding the
+        ones before it.  Nothing is ever deleted, so a discarded match could
+        never fire later.
+        """
+        while self.pending:
+            token = self.pending[0][1]
+            if token.alive and self.would_fire(token, network):
+                return token
+            heapq.heappop(self.pending)
+        return None
+
+    def all_matches(self, network):
+        """Remove and return every match that would add an assertion."""
+        tokens = []
+        while self.pending:
+            token = heapq.heappop(self.pending)[1]
+            if token.alive and self.would_fire(token, network):
+                tokens.append(token)
+        return tokens
+
+
+class ReteNetwork(object):
+    """A Rete network for a list of rules, and the assertions fed through it."""
+    def __init__(self, rules):
+        self.symbols = SymbolTable()
+        self.sequence = {}
+        self.alpha_memories = {}
+        self.alpha_by_word = {}
+        self.alpha_wildcards = []
+        self.negative_nodes = []
+        self.ready = []
+        self.ready_set = set()
+        self.rule_nodes = []
+        for index, rule in enumerate(rules):
+            self.rule_nodes.append(RuleNode(index, rule, self))
+        for node in self.rule_nodes:
+            for chain in node.chains:
+                chain.start(self)
+
+    def alpha_memory(self, template):
+        if template not in self.alpha_memories:
+            pattern = Pattern(template, self.symbols)
+            alpha = AlphaMemory(pattern)
+            self.alpha_memories[template] = alpha
+            if pattern.constants and pattern.constants[0][0] == 0:
+                self.alpha_by_word.setdefault(pattern.constants[0][1],
+                                              []).append(alpha)
+            else:
+                self.alpha_wildcards.append(alpha)
+        return self.alpha_memories[template]
+
+    def filler(self, template, slots):
+        return compile_filler(template, self.symbols, slots)
+
+    def mark_ready(self, index):
+        if index not in self.ready_set:
+            self.ready_set.add(index)
+            heapq.heappush(self.ready, index)
+
+    def add(self, assertion):
+        """Add an (interned) assertion and push it through the network."""
+        if assertion in self.sequence:
+            return False
+        self.sequence[assertion] = len(self.sequence)
+        for node in self.negative_nodes:
+            node.assertion_added(assertion)
+        for alpha in self.alpha_by_word.get(assertion[0], ()):
+            alpha.activate(assertion, self)
+        for alpha in self.alpha_wildcards:
+            alpha.activate(assertion, self)
+        return True
+
+    def first_ready_rule(self):
+        """Return the first rule (in rule order) with a match that would fire."""
+        while self.ready:
+            index = self.ready[0]
+            node = self.rule_nodes[index]
+            if node.next_match(self) is not None:
+                return node
+            heapq.heappop(self.ready)
+            self.ready_set.discard(index)
+        return None
+
+    def data(self):
+        decode = self.symbols.decode
+        return tuple([decode(assertion) for assertion in self.sequence])
+
+
+def compile_rules(rules, data):
+    """
+    Build a ReteNetwork for 'rules' loaded with 'data', or return None if
+    the network can't reproduce forward_chain for them exactly.
+    """
+    for rule in rules:
+        if not _supported_rule(rule):
+            return None
+    data = list(data)
+    for assertion in data:
+        if (not is_word_string(assertion)
+            or _REGEX_SPECIALS.search(assertion)):
+            return None
+    if len(set(data)) != len(data):
+        return None
+    network = ReteNetwork(rules)
+    for assertion in data:
+        network.add(network.symbols.encode(assertion))
+    return network
+
+def _supported_rule(rule):
+    if not isinstance(rule, IF) or rule._delete_clause:
+        return False
+    if not isinstance(rule._action, list) or not rule._action:
+        return False
+    antecedent = rule.antecedent()
+    branches = list(antecedent) if isinstance(antecedent, OR) else [antecedent]
+    if not branches:
+        return False
+    for branch in branches:
+        bound = _supported_branch(branch)
+        if bound is None:
+            return False
+        for action in rule._action:
+            if (not isinstance(action, str) or not _is_plain(action)
+                or not AIStringVars(action) <= bound):
+                return False
+    return True
+
+def _supported_branch(branch):
+    """Return the variables bound by 'branch', or None if it's unsupported."""
+    conditions = branch if isinstance(branch, AND) else [branch]
+    bound = set()
+    for condition in conditions:
+        if isinstance(condition, NOT):
+            if len(condition) != 1 or not isinstance(condition[0], str):
+                return None
+            condition = condition[0]
+        elif isinstance(condition, str):
+            bound |= AIStringVars(condition)
+        else:
+            return None
+        if not _is_matchable(condition):
+            return None
+    return bound
+
+def rete_forward_chain(rules, data, apply_only_one=True, verbose=False):
+    """
+    forward_chain, driven by a Rete network.  Returns None if the rules or
+    data need the naive matcher.
+    """
+    verbose = int(verbose)
+    # With no rules or no data, forward_chain hands back 'data' untouched.
+    if verbose >= 2 or not rules or not data:
+        return None
+    network = compile_rules(rules, data)
+    if network is None:
+        return None
+
+    while True:
+        node = network.first_ready_rule()
+        if node is None:
+            break
+        if apply_only_one:
+            tokens = [node.next_match(network)]
+        else:
+            tokens = node.all_matches(network)
+        for token in tokens:
+            for new_datum in token.actions:
+                if network.add(new_datum) and verbose >= 1:
+                    print("Rule: {}".format(node.rule))
+                    print("  Added assertion: {}".format(
+                        network.symbols.decode(new_datum)))
+
+    return network.data()
@@ -0,0 +1,131 @@
+# MIT 6.034 Lab 1: Rule-Based Systems
+
+# Semi-naive (delta-driven) forward chaining for monotone rule sets.
+#
+# A rule set is monotone if it only ever adds assertions: no NOTs and no
+# DELETEs.  Firing such rules in any order reaches the same final set of
+# assertions, so instead of restarting from the first rule after every
+# change, we can run the rules in rounds.  Each round only looks for
+# bindings that use at least one assertion added in the previous round
+# (the "delta"); any binding made entirely of older assertions was already
+# found in an earlier round.
+#
+# The result has the same assertions as forward_chain's other engines, but
+# the derived ones may be listed in a different order.
+
+from production import (IF, AND, OR, NOT, AssertionStore, match, populate,
+                        partial_populate)
+
+def is_monotone(rules):
+    """Do these rules only ever add assertions (no NOTs, no DELETEs)?"""
+    for rule in rules:
+        if not isinstance(rule, IF) or rule._delete_clause:
+            return False
+        if not _is_monotone_expression(rule.antecedent()):
+            return False
+    return True
+
+def _is_monotone_expression(expression):
+    if isinstance(expression, NOT):
+        return False
+    if isinstance(expression, (AND, OR)):
+        return all([_is_monotone_expression(x) for x in expression])
+    return isinstance(expression, str)
+
+def conjunctions(expression):
+    """
+    Rewrite an AND/OR tree of conditions as a list of conjunctions (lists
+    of condition strings), any one of which is enough to match.
+    """
+    if isinstance(expression, str):
+        return [[expression]]
+    if isinstance(expression, OR):
+        return [c for x in expression for c in conjunctions(x)]
+    result = [[]]
+    for x in expression:
+        result = [left + right for left in result
+                  for right in conjunctions(x)]
+    return result
+
+def _join(conditions, sources, bindings):
+    """
+    Generate every extension of 'bindings' that matches each condition
+    against the corresponding store in 'sources'.
+    """
+    if not conditions:
+        yield bindings
+        return
+    condition = conditions[0]
+    # Looking up the partly-filled-in condition narrows the candidates, but
+    # match() still sees the original, so values are never read as regexes.
+    for store in sources[0]:
+        for assertion in store.candidates(partial_populate(condition,
+                                                           bindings)):
+            new_bindings = match(condition, assertion)
+            if new_bindings is None:
+                continue
+            if any([bindings.get(k, v) != v
+                    for k, v in new_bindings.items()]):
+                continue
+            new_bindings.update(bindings)
+            for result in _join(conditions[1:], sources[1:], new_bindings):
+                yield result
+
+def delta_bindings(conditions, old, delta):
+    """
+    Generate the bindings of a conjunction that use at least one assertion
+    from 'delta'.  Condition i is matched against delta, the conditions
+    before it against 'old' only and the ones after it against both, so
+    each binding is found once.
+    """
+    for i in range(len(conditions)):
+        sources = ([[old]] * i + [[delta]]
+                   + [[old, delta]] * (len(conditions) - i - 1))
+        for bindings in _join(conditions, sources, {}):
+            yield bindings
+
+def seminaive_forward_chain(rules, data, verbose=False, fixpoint=()):
+    """
+    forward_chain for monotone rules, by semi-naive evaluation.  Returns
+    None if the rules aren't monotone.
+
+    'fixpoint' may hold assertions that these rules have already been run
+    to completion on (an earlier result).  Then only bindings that use
+    something from 'data' are looked for, and the result lists the
+    fixpoint's assertions first.
+    """
+    if not is_monotone(rules):
+        return None
+    if not rules or not data:
+        return data
+    verbose = int(verbose)
+
+    compiled = [(rule, conjunctions(rule.antecedent())) for rule in rules]
+    old = AssertionStore(fixpoint)
+    delta = AssertionStore([a for a in data if a not in old])
+    order = list(old) + list(delta)
+    while len(delta) > 0:
+        new = AssertionStore()
+        for rule, rule_conjunctions in compiled:
+            for conditions in rule_conjunctions:
+                if not conditions:
+                    # An empty AND always matches, once.
+                    if len(old) > 0:
+                        continue
+                    matches = [{}]
+                else:
+                    matches = delta_bindings(conditions, old, delta)
+                for bindings in matches:
+                    for a in rule._action:
+                        new_datum = populate(a, bindings)
+                        if (new_datum in old or new_datum in delta
+                            or not new.add(new_datum)):
+                            continue
+                        if verbose >= 1:
+                            print("Rule: {}".format(rule))
+                            print("  Added assertion: {}".format(new_datum))
+        for assertion in delta:
+            old.add(assertion)
+        order.extend(new)
+        delta = new
+    return tuple(order)
@@ -0,0 +1,111 @@
+# MIT 6.034 Lab 1: Rule-Based Systems
+
+# Interned assertions, for the Rete network in rete.py.
+#
+# An assertion like "parent marge bart" is stored as a tuple of word numbers,
+# (7, 3, 12), where each distinct word is kept once, in a SymbolTable.  A
+# template is compiled into a Pattern that checks the numbers of its constant
+# words directly instead of running a regular expression, and the values it
+# binds are kept as a tuple (a "frame") whose layout is fixed when the rule
+# is compiled, rather than as a dictionary per partial match.
+#
+# Strings are only converted at the edges: when forward_chain's data is
+# loaded, when something is printed, and when the result is handed back.
+
+import re
+
+# A word that is nothing but a variable, like "(?x)".
+_WORD_VARIABLE = re.compile(r'\(\?([^\s()]+)\)$')
+
+# Whitespace that ' '.split() wouldn't treat as exactly one separator.
+_ODD_SPACING = re.compile(r'[^\S ]|  |^ | $')
+
+def is_word_string(string):
+    """Does 'string' split into words on single spaces, with none empty?"""
+    return (isinstance(string, str) and string != ''
+            and not _ODD_SPACING.search(string))
+
+def is_word_template(template):
+    """Is every word of 'template' either constant or a whole variable?"""
+    if not is_word_string(template):
+        return False
+    for word in template.split(' '):
+        if '(?' in word and not _WORD_VARIABLE.match(word):
+            return False
+    return True
+
+
+class SymbolTable(object):
+    """Numbers words, and turns assertions into tuples of word numbers."""
+    def __init__(self):
+        self.ids = {}
+        self.words = []
+
+    def intern(self, word):
+        try:
+            return self.ids[word]
+        except KeyError:
+            self.ids[word] = len(self.words)
+            self.words.append(word)
+            return self.ids[word]
+
+    def encode(self, assertion):
+        return tuple([self.intern(word) for word in assertion.split(' ')])
+
+    def decode(self, symbols):
+        words = self.words
+        return ' '.join([words[i] for i in symbols])
+
+    def __len__(self):
+        return len(self.words)
+
+
+class Pattern(object):
+    """
+    A condition template compiled against a SymbolTable.  match() returns
+    the values of the template's variables, in the order they appear in
+    the template (see 'variables'), or None.
+    """
+    __slots__ = ('template', 'length', 'constants', 'positions', 'variables')
+
+    def __init__(self, template, table):
+        self.template = template
+        words = template.split(' ')
+        self.length = len(words)
+        self.constants = []
+        self.positions = []
+        self.variables = []
+        for i, word in enumerate(words):
+            match_var = _WORD_VARIABLE.match(word)
+            if match_var:
+                self.positions.append(i)
+                self.variables.append(match_var.group(1))
+            else:
+                self.constants.append((i, table.intern(word)))
+
+    def match(self, symbols):
+        if len(symbols) != self.length:
+            return None
+        for i, symbol in self.constants:
+            if symbols[i] != symbol:
+                return None
+        return tuple([symbols[i] for i in self.positions])
+
+
+def compile_filler(template, table, slots):
+    """
+    Compile 'template' for filling in from a frame, where 'slots' maps each
+    variable name to its place in the frame.
+    """
+    parts = []
+    for word in template.split(' '):
+        match_var = _WORD_VARIABLE.match(word)
+        if match_var:
+            parts.append((True, slots[match_var.group(1)]))
+        else:
+            parts.append((False, table.intern(word)))
+    return tuple(parts)
+
+def fill(parts, frame):
+    """Fill in a compiled template from a frame, giving an interned assertion."""
+    return tuple([frame[x] if is_var else x for is_var, x in parts])
@@ -1,11 +1,16 @@
 # MIT 6.034 Lab 1: Rule-Based Systems
 
-from production import IF, AND, OR, NOT, THEN, run_conditions
+from production import IF, AND, OR, NOT, THEN, DELETE, run_conditions
 import production as lab
 from tester import make_test, get_tests, type_encode, type_decode
 from data import *
 from lab1 import transitive_rule, family_rules
+import kb
+import os
 import random
+import re
+import shutil
+import tempfile
 random.seed()
 lab_number = 1
 
@@ -476,3 +481,396 @@ make_test(type = 'FUNCTION_ENCODED_ARGS',
           testanswer = backchain_to_goal_tree_5_testanswer,
           expected_val = str(result_bc_5)
           )
+
+
+### TEST 18 ###
+
+# An AND whose only condition is a NOT with no variables: the rule fires
+# only if the assertion isn't there, here as it is for any other AND.
+
+NOT_ONLY_GROUND_RULES = (IF( AND( NOT( 'foo' )),
+                             THEN( 'bar' ),
+                             DELETE( 'baz' )),)
+
+def forward_chain_not_only_1_getargs():
+    return [ NOT_ONLY_GROUND_RULES, ('foo', 'baz') ]
+
+def forward_chain_not_only_1_testanswer(val, original_val = None):
+    return ( tuple(val) == ('foo', 'baz') )
+
+make_test(type = 'FUNCTION',
+          getargs = forward_chain_not_only_1_getargs,
+          testanswer = forward_chain_not_only_1_testanswer,
+          expected_val = "('foo', 'baz')",
+          name = 'forward_chain'
+          )
+
+
+### TEST 19 ###
+
+# The same, with a NOT whose variables nothing else in the AND binds.
+
+NOT_ONLY_VARIABLE_RULES = (IF( AND( NOT( 'foo (?x)' )),
+                               THEN( 'bar' ),
+                               DELETE( 'baz' )),)
+
+def forward_chain_not_only_2_getargs():
+    return [ NOT_ONLY_VARIABLE_RULES, ('foo a', 'baz') ]
+
+def forward_chain_not_only_2_testanswer(val, original_val = None):
+    return ( tuple(val) == ('foo a', 'baz') )
+
+make_test(type = 'FUNCTION',
+          getargs = forward_chain_not_only_2_getargs,
+          testanswer = forward_chain_not_only_2_testanswer,
+          expected_val = "('foo a', 'baz')",
+          name = 'forward_chain'
+          )
+
+
+### TEST 20 ###
+
+# The Rete network (the default engine) must give exactly what the naive
+# matcher gives, in the same order, one binding at a time ...
+
+def forward_chain_rete_1_getargs():
+    return [ family_rules, simpsons_data, True ]
+
+def forward_chain_rete_1_testanswer(val, original_val = None):
+    return ( tuple(val) ==
+             tuple(lab.forward_chain(family_rules, simpsons_data, True,
+                                     engine = 'naive')) )
+
+make_test(type = 'FUNCTION',
+          getargs = forward_chain_rete_1_getargs,
+          testanswer = forward_chain_rete_1_testanswer,
+          expected_val = "the result of forward_chain with engine='naive'",
+          name = 'forward_chain'
+          )
+
+
+### TEST 21 ###
+
+# ... or all at once.
+
+def forward_chain_rete_2_getargs():
+    return [ family_rules, black_data, False ]
+
+def forward_chain_rete_2_testanswer(val, original_val = None):
+    return ( tuple(val) ==
+             tuple(lab.forward_chain(family_rules, black_data, False,
+                                     engine = 'naive')) )
+
+make_test(type = 'FUNCTION',
+          getargs = forward_chain_rete_2_getargs,
+          testanswer = forward_chain_rete_2_testanswer,
+          expected_val = "the result of forward_chain with engine='naive'",
+          name = 'forward_chain'
+          )
+
+
+### TEST 22 ###
+
+# Templates are compiled once and cached (see PatternCache in utils.py).
+# populate() must still work for a template that uses a variable twice,
+# even though it can't be compiled into a regex for match().
+
+def populate_cached_1_getargs():
+    return [ 'self (?x) (?x)', {'x': 'bart'} ]
+
+def populate_cached_1_testanswer(val, original_val = None):
+    return ( val == 'self bart bart'
+             and lab.populate('self (?x) (?x)', {'x': 'lisa'}) == 'self lisa lisa' )
+
+make_test(type = 'FUNCTION',
+          getargs = populate_cached_1_getargs,
+          testanswer = populate_cached_1_testanswer,
+          expected_val = "'self bart bart'",
+          name = 'populate'
+          )
+
+
+### TEST 23 ###
+
+# A cached template matches each assertion on its own merits, and one
+# that has been dropped from a full cache is compiled again when it's
+# next used.
+
+def match_cached_1_getargs():
+    return [ 'sister (?x) (?y)', 'sister lisa bart' ]
+
+def match_cached_1_testanswer(val, original_val = None):
+    from utils import PatternCache
+    cache = PatternCache(maxsize = 2)
+    for template in [ 'a (?x)', 'b (?x)', 'c (?x)', 'a (?x)' ]:
+        cache.get(template)
+    return ( val == {'x': 'lisa', 'y': 'bart'}
+             and lab.match('sister (?x) (?y)', 'sister maggie lisa') ==
+                 {'x': 'maggie', 'y': 'lisa'}
+             and lab.match('sister (?x) (?y)', 'brother bart lisa') is None
+             and cache.info() == {'hits': 0, 'misses': 4, 'size': 2,
+                                  'maxsize': 2}
+             and cache.get('a (?x)').regex.match('a b').groupdict() ==
+                 {'x': 'b'} )
+
+make_test(type = 'FUNCTION',
+          getargs = match_cached_1_getargs,
+          testanswer = match_cached_1_testanswer,
+          expected_val = "{'x': 'lisa', 'y': 'bart'}",
+          name = 'match'
+          )
+
+
+### TEST 24 ###
+
+# The assertions are kept in an indexed AssertionStore (see production.py),
+# but must stay in the order a plain tuple would keep them in: an assertion
+# that is deleted and then added again goes at the end.
+
+DELETE_AND_READD_RULES = (IF( AND( 'a (?x)', NOT( 'seen (?x)' )),
+                              THEN( 'seen (?x)', 'b (?x)' ),
+                              DELETE( 'a (?x)' )),
+                          IF( 'b (?x)',
+                              THEN( 'a (?x)' )))
+
+delete_and_readd_answer = ('c 3', 'seen 1', 'b 1', 'seen 2', 'b 2', 'a 1', 'a 2')
+
+def forward_chain_store_1_getargs():
+    return [ DELETE_AND_READD_RULES, ('a 1', 'a 2', 'c 3'), True, False, 'naive' ]
+
+def forward_chain_store_1_testanswer(val, original_val = None):
+    return ( tuple(val) == delete_and_readd_answer )
+
+make_test(type = 'FUNCTION',
+          getargs = forward_chain_store_1_getargs,
+          testanswer = forward_chain_store_1_testanswer,
+          expected_val = str(delete_and_readd_answer),
+          name = 'forward_chain'
+          )
+
+
+### TEST 25 ###
+
+# The semi-naive engine (for rules without NOTs or DELETEs; see
+# seminaive.py) must find the same assertions as the naive matcher, each
+# once, though it may list the new ones in a different order.
+
+MONOTONE_FAMILY_RULES = [ family_rules[1], family_rules[3], family_rules[4] ]
+
+def seminaive_agrees(val, rules, data):
+    expected = lab.forward_chain(rules, data, engine = 'naive')
+    return ( tuple(val[:len(data)]) == tuple(data)
+             and len(val) == len(expected)
+             and set(val) == set(expected) )
+
+def forward_chain_seminaive_1_getargs():
+    return [ [transitive_rule], poker_data, True, False, 'seminaive' ]
+
+def forward_chain_seminaive_1_testanswer(val, original_val = None):
+    return seminaive_agrees(val, [transitive_rule], poker_data)
+
+make_test(type = 'FUNCTION',
+          getargs = forward_chain_seminaive_1_getargs,
+          testanswer = forward_chain_seminaive_1_testanswer,
+          expected_val = "the assertions forward_chain finds with engine='naive'",
+          name = 'forward_chain'
+          )
+
+
+### TEST 26 ###
+
+def forward_chain_seminaive_2_getargs():
+    return [ MONOTONE_FAMILY_RULES, simpsons_data, True, False, 'seminaive' ]
+
+def forward_chain_seminaive_2_testanswer(val, original_val = None):
+    return seminaive_agrees(val, MONOTONE_FAMILY_RULES, simpsons_data)
+
+make_test(type = 'FUNCTION',
+          getargs = forward_chain_seminaive_2_getargs,
+          testanswer = forward_chain_seminaive_2_testanswer,
+          expected_val = "the assertions forward_chain finds with engine='naive'",
+          name = 'forward_chain'
+          )
+
+
+### TEST 27 ###
+
+# Recursive rules: the backchainer must stop when a subgoal comes round
+# again (with its variables renamed), and leave it as a leaf.  Variables
+# the backchainer makes up are compared by where they first appear, not by
+# name.
+
+ANCESTOR_RULES = (
+    IF( AND( '(?x) parent (?y)' ),
+        THEN( '(?x) ancestor (?y)' )),
+    IF( AND( '(?x) parent (?z)',
+             '(?z) ancestor (?y)' ),
+        THEN( '(?x) ancestor (?y)' ))
+    )
+
+def rename_variables(tree, names = None):
+    if names is None:
+        names = {}
+    if isinstance(tree, (list, tuple)):
+        return [ rename_variables(elt, names) for elt in tree ]
+    def rename(m):
+        return '(?%s)' % names.setdefault(m.group(1), 'v%d' % (len(names) + 1))
+    return re.sub(r'\(\?(\S+?)\)', rename, tree)
+
+def backchain_to_goal_tree_6_getargs():
+    return [ ANCESTOR_RULES, 'alice ancestor bob' ]
+
+result_bc_6 = OR('alice ancestor bob',
+                 'alice parent bob',
+                 AND('alice parent (?v1)',
+                     OR('(?v1) ancestor bob',
+                        '(?v1) parent bob',
+                        AND('(?v1) parent (?v2)',
+                            '(?v2) ancestor bob'))))
+
+def backchain_to_goal_tree_6_testanswer(val, original_args = None):
+    return ( rename_variables(type_encode(val)) ==
+             rename_variables(type_encode(result_bc_6)) )
+
+make_test(type = 'FUNCTION_ENCODED_ARGS',
+          getargs = backchain_to_goal_tree_6_getargs,
+          testanswer = backchain_to_goal_tree_6_testanswer,
+          expected_val = str(result_bc_6),
+          name = "backchain_to_goal_tree"
+          )
+
+
+### TEST 28 ###
+
+# With workers, the rules are matched in worker processes (see
+# parallel.py), but the result must be exactly the serial one ...
+
+def forward_chain_workers_1_getargs():
+    return [ family_rules, black_data, False, False, 'naive', 2 ]
+
+def forward_chain_workers_1_testanswer(val, original_val = None):
+    return ( tuple(val) ==
+             tuple(lab.forward_chain(family_rules, black_data, False,
+                                     engine = 'naive')) )
+
+make_test(type = 'FUNCTION',
+          getargs = forward_chain_workers_1_getargs,
+          testanswer = forward_chain_workers_1_testanswer,
+          expected_val = "the result of forward_chain without workers",
+          name = 'forward_chain'
+          )
+
+
+### TEST 29 ###
+
+# ... even when rules delete assertions that other rules then add back.
+
+def forward_chain_workers_2_getargs():
+    return [ DELETE_AND_READD_RULES, ('a 1', 'a 2', 'c 3'), False, False,
+             'naive', 3 ]
+
+def forward_chain_workers_2_testanswer(val, original_val = None):
+    return ( tuple(val) ==
+             tuple(lab.forward_chain(DELETE_AND_READD_RULES,
+                                     ('a 1', 'a 2', 'c 3'), False,
+                                     engine = 'naive')) )
+
+make_test(type = 'FUNCTION',
+          getargs = forward_chain_workers_2_getargs,
+          testanswer = forward_chain_workers_2_testanswer,
+          expected_val = "the result of forward_chain without workers",
+          name = 'forward_chain'
+          )
+
+
+### TEST 30 ###
+
+# The Rete network interns assertions as tuples of words (see symbols.py).
+# Assertions with doubled, leading or trailing spaces, tabs or newlines
+# aren't made of plain words, and must still match just as they do for the
+# naive matcher.
+
+SPACED_DATA = ('parent  ann bob', 'parent ann bob', 'parent bob  cy',
+               ' parent bob dee', 'parent bob dee', 'parent bob eve ',
+               'parent bob eve', 'parent bob\tfay', 'parent bob gus\n')
+
+def forward_chain_interned_1_getargs():
+    return [ family_rules, SPACED_DATA ]
+
+def forward_chain_interned_1_testanswer(val, original_val = None):
+    return ( tuple(val) ==
+             tuple(lab.forward_chain(family_rules, SPACED_DATA,
+                                     engine = 'naive')) )
+
+make_test(type = 'FUNCTION',
+          getargs = forward_chain_interned_1_getargs,
+          testanswer = forward_chain_interned_1_testanswer,
+          expected_val = "the result of forward_chain with engine='naive'",
+          name = 'forward_chain'
+          )
+
+
+### TEST 31 ###
+
+# A knowledge-base file (see kb.py) saved from some of the data, and then
+# resumed with the rest, must hold all of the data and give what chaining
+# over all of it at once would.  With monotone rules, the new facts are
+# appended to the file, and may be listed in a different order ...
+
+def resume_kb(rules, first, rest):
+    """Save a knowledge base from 'first', then resume it with 'rest'.
+    Returns what resuming gives, or None if a file doesn't hold what it
+    should."""
+    directory = tempfile.mkdtemp()
+    path = os.path.join(directory, 'test.kb')
+    try:
+        saved = kb.resume_forward_chain(rules, path, first)
+        with kb.load_kb(path) as loaded:
+            if ( tuple(loaded.asserted) != tuple(first)
+                 or tuple(loaded.facts) != tuple(saved) ):
+                return None
+        resumed = kb.resume_forward_chain(rules, path, rest)
+        with kb.load_kb(path) as loaded:
+            if ( tuple(loaded.asserted) != tuple(first) + tuple(rest)
+                 or tuple(loaded.facts) != tuple(resumed) ):
+                return None
+        if kb.resume_forward_chain(rules, path) != tuple(resumed):
+            return None
+        return resumed
+    finally:
+        shutil.rmtree(directory)
+
+def forward_chain_kb_1_getargs():
+    return [ [transitive_rule], poker_data ]
+
+def forward_chain_kb_1_testanswer(val, original_val = None):
+    resumed = resume_kb([transitive_rule], poker_data[:5], poker_data[5:])
+    return ( resumed is not None
+             and len(resumed) == len(val) and set(resumed) == set(val) )
+
+make_test(type = 'FUNCTION',
+          getargs = forward_chain_kb_1_getargs,
+          testanswer = forward_chain_kb_1_testanswer,
+          expected_val = "the assertions forward_chain finds from all of the data",
+          name = 'forward_chain'
+          )
+
+
+### TEST 32 ###
+
+# ... otherwise everything is chained again, so the result is exactly the
+# same.
+
+def forward_chain_kb_2_getargs():
+    return [ family_rules, simpsons_data ]
+
+def forward_chain_kb_2_testanswer(val, original_val = None):
+    resumed = resume_kb(family_rules, simpsons_data[:6], simpsons_data[6:])
+    return ( resumed is not None and tuple(resumed) == tuple(val) )
+
+make_test(type = 'FUNCTION',
+          getargs = forward_chain_kb_2_getargs,
+          testanswer = forward_chain_kb_2_testanswer,
+          expected_val = "the result of forward_chain over all of the data",
+          name = 'forward_chain'
+          )
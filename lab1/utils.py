@@ -1,6 +1,6 @@
 # MIT 6.034 Lab 1: Rule-Based Systems
 
-from collections import MutableMapping as DictMixin
+from collections import MutableMapping as DictMixin, OrderedDict
 import re
 
 class ClobberedDictKey(Exception):
@@ -56,7 +56,71 @@ def AIStringToPyTemplate(AIStr):
     return AIRegex.sub( r'%(\1)s', AIStr )
 
 def AIStringVars(AIStr):
-    # This is not the fastest way of doing things, but
-    # it is probably the most explicit and robust
-    return set([ AIRegex.sub(r'\1', x) for x in AIRegex.findall(AIStr) ])
+    return set(pattern_cache.get(AIStr).variables)
+
+class CompiledPattern(object):
+    """
+    Everything derived from one template string: the compiled regex that
+    match() uses, the Python template that populate() fills in, and the
+    names of its variables.
+    """
+    __slots__ = ('AIStr', '_regex', 'py_template', 'variables')
+
+    def __init__(self, AIStr):
+        self.AIStr = AIStr
+        self._regex = None
+        self.py_template = AIStringToPyTemplate(AIStr)
+        # This is not the fastest way of doing things, but
+        # it is probably the most explicit and robust
+        self.variables = frozenset([ AIRegex.sub(r'\1', x)
+                                     for x in AIRegex.findall(AIStr) ])
+
+    @property
+    def regex(self):
+        # Compiled on first use: a consequent like "self (?x) (?x)" can be
+        # populated, but isn't a valid regex.
+        if self._regex is None:
+            self._regex = re.compile(AIStringToRegex(self.AIStr))
+        return self._regex
+
+class PatternCache(object):
+    """
+    A bounded, least-recently-used cache of CompiledPatterns, keyed by
+    template string.  'hits' and 'misses' count lookups since the last
+    clear().
+    """
+    def __init__(self, maxsize=10000):
+        self.maxsize = maxsize
+        self._patterns = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, AIStr):
+        try:
+            pattern = self._patterns[AIStr]
+        except KeyError:
+            self.misses += 1
+            pattern = CompiledPattern(AIStr)
+            self._patterns[AIStr] = pattern
+            if len(self._patterns) > self.maxsize:
+                self._patterns.popitem(last=False)
+            return pattern
+        self.hits += 1
+        self._patterns.move_to_end(AIStr)
+        return pattern
+
+    def clear(self):
+        self._patterns.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def info(self):
+        return {'hits': self.hits, 'misses': self.misses,
+                'size': len(self._patterns), 'maxsize': self.maxsize}
+
+    def __len__(self):
+        return len(self._patterns)
+
+# Shared by match(), populate(), variables() and AIStringVars().
+pattern_cache = PatternCache()
 
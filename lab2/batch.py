@@ -0,0 +1,100 @@
+# MIT 6.034 Lab 2: Search
+
+# Running many searches on the same graph in a pool of worker processes.
+#
+# search_many takes a list of (start, goal) queries and one of the strategies
+# in lab2.py (generic_bfs, generic_a_star, ...), and gives back each query's
+# path as soon as some worker has found it.  The graph is only handed to each
+# worker once, not with every query: where processes can be forked, the
+# workers simply inherit it (and the search function) from this process, and
+# never change it, so nothing is copied at all; otherwise each worker gets the
+# graph's nodes, edges and heuristic when it starts and builds its own copy.
+# The queries are sent out in chunks, to keep the messages between processes
+# down.
+
+import multiprocessing
+import os
+
+from search import Edge, UndirectedGraph
+
+# The graph and search function each worker uses, and the beam width.
+_shared = None
+
+def _graph_parts(graph):
+    return (list(graph.nodes),
+            [(e.startNode, e.endNode, e.length) for e in graph.edges],
+            graph.heuristic_dict)
+
+def _init_worker(shared):
+    # Used when the workers are forked: the arguments are inherited, not
+    # copied, and a worker the pool starts again later gets them too.
+    global _shared
+    _shared = shared
+
+def _init_spawned_worker(parts, strategy, beam_width):
+    # Used when the workers can't be forked.
+    global _shared
+    from lab2 import generic_search
+    nodes, edges, heuristic = parts
+    graph = UndirectedGraph()
+    graph.nodes = nodes
+    graph.edges = [Edge(start, end, length) for start, end, length in edges]
+    graph.set_heuristic(heuristic)
+    _shared = (graph, generic_search(*strategy), beam_width)
+
+def _search(graph, search_fn, beam_width, start, goal):
+    if beam_width is None:
+        return search_fn(graph, start, goal)
+    return search_fn(graph, start, goal, beam_width)
+
+def _run_queries(chunk):
+    """Run a chunk of (index, start, goal) queries, in a worker process."""
+    graph, search_fn, beam_width = _shared
+    return [(index, _search(graph, search_fn, beam_width, start, goal))
+            for index, start, goal in chunk]
+
+def search_many(graph, queries, strategy, workers=None, beam_width=None,
+                chunk_size=None):
+    """
+    Search 'graph' once for each (start, goal) in 'queries', using
+    'strategy' (one of the generic_* lists in lab2.py).  Yields
+    (index, path) pairs, where 'index' is the query's position in
+    'queries', in whatever order the searches finish; a path is None if
+    there's no path.  'workers' is the number of processes (by default,
+    one per CPU); with 1, the searches are run here, in order.
+    """
+    from lab2 import generic_search
+    queries = [(index, start, goal)
+               for index, (start, goal) in enumerate(queries)]
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = min(workers, len(queries))
+    if workers <= 1:
+        search_fn = generic_search(*strategy)
+        for index, start, goal in queries:
+            yield index, _search(graph, search_fn, beam_width, start, goal)
+        return
+
+    if chunk_size is None:
+        # A few chunks per worker, so that one slow chunk doesn't hold
+        # everything up at the end.
+        chunk_size = max(1, len(queries) // (workers * 4))
+    chunks = [queries[i:i + chunk_size]
+              for i in range(0, len(queries), chunk_size)]
+
+    if 'fork' in multiprocessing.get_all_start_methods():
+        pool = multiprocessing.get_context('fork').Pool(
+            workers, _init_worker,
+            ((graph, generic_search(*strategy), beam_width),))
+    else:
+        pool = multiprocessing.Pool(workers, _init_spawned_worker,
+                                    (_graph_parts(graph), strategy,
+                                     beam_width))
+    try:
+        for results in pool.imap_unordered(_run_queries, chunks):
+            for index, path in results:
+                yield index, path
+        pool.close()
+    finally:
+        pool.terminate()
+        pool.join()
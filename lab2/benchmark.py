@@ -0,0 +1,204 @@
+# MIT 6.034 Lab 2: Search
+
+# Benchmarks for the search strategies in lab2.py.
+#
+# Every strategy is run on every graph in graphs.txt, and on made-up grid and
+# random graphs, with stats=True (see SearchStats in search.py), and the
+# results are printed as a table: the length of the path found, how many
+# paths were expanded and generated, the most paths on the agenda at once,
+# the size of the extended set, how many times the heuristic was looked up,
+# and the best time of a few runs.
+#
+# Run it as
+#   python benchmark.py [--strategies generic_bfs,generic_a_star] [--grid 5]
+#                       [--random 12] [--beam-width 2] [--memory 100]
+#                       [--repeat N] [--json] [--output results.txt]
+#
+# The strategies without an extended set can take exponential time, so keep
+# the made-up graphs small if they're included.
+
+import argparse
+import json
+import random
+import sys
+
+import lab2
+from search import Edge, UndirectedGraph
+from landmarks import distances_to
+
+STRATEGIES = ['generic_dfs', 'generic_bfs', 'generic_hill_climbing',
+              'generic_best_first', 'generic_branch_and_bound',
+              'generic_branch_and_bound_with_heuristic',
+              'generic_branch_and_bound_with_extended_set',
+              'generic_a_star', 'generic_alt_a_star', 'generic_beam',
+              'ida_star', 'sma_star']
+
+COLUMNS = ['graph', 'strategy', 'length', 'expanded', 'generated',
+           'peak_agenda', 'extended', 'heuristic_evaluations', 'pruned', 'ms']
+
+def grid_graph(size):
+    """
+    A size x size grid of nodes 'row,column' with edges of length 1, and a
+    heuristic to the far corner (the Manhattan distance).
+    """
+    def name(row, column):
+        return '%d,%d' % (row, column)
+    nodes = [name(r, c) for r in range(size) for c in range(size)]
+    edges = ([Edge(name(r, c), name(r + 1, c), 1)
+              for r in range(size - 1) for c in range(size)]
+             + [Edge(name(r, c), name(r, c + 1), 1)
+                for r in range(size) for c in range(size - 1)])
+    goal = name(size - 1, size - 1)
+    heuristic = {goal: dict([(name(r, c), (size - 1 - r) + (size - 1 - c))
+                             for r in range(size) for c in range(size)])}
+    return UndirectedGraph(nodes, edges, heuristic), name(0, 0), goal
+
+def random_graph(size, degree=3, seed=0):
+    """
+    A graph of 'size' nodes, each joined to about 'degree' others by edges
+    of length 1 to 9, and a heuristic to the last node of half the real
+    distance (so it's admissible, but not perfect).
+    """
+    rnd = random.Random(seed)
+    nodes = ['r%d' % i for i in range(size)]
+    graph = UndirectedGraph(nodes, [], {})
+    # A path through all of the nodes first, so that the goal can be reached.
+    for a, b in zip(nodes, nodes[1:]):
+        graph.join(a, b, rnd.randint(1, 9))
+    for _ in range(size * (degree - 2) // 2):
+        a, b = rnd.sample(nodes, 2)
+        if not graph.is_neighbor(a, b):
+            graph.join(a, b, rnd.randint(1, 9))
+    goal = nodes[-1]
+    graph.set_heuristic({goal: dict([(node, distance / 2.0) for node, distance
+                                     in distances_to(graph, goal).items()])})
+    return graph, nodes[0], goal
+
+def bundled_queries():
+    "A (name, graph, start, goal) for each graph in graphs.txt."
+    queries = []
+    for name in sorted(lab2.all_graphs):
+        graph = lab2.all_graphs[name]
+        goals = sorted(graph.heuristic_dict)
+        goal = goals[-1] if goals else graph.nodes[-1]
+        start = graph.nodes[0] if graph.nodes[0] != goal else graph.nodes[-1]
+        queries.append((name, graph, start, goal))
+    return queries
+
+def _length(graph, path):
+    # Unweighted graphs (like GRAPH_0) count the edges instead.
+    if path is None:
+        return None
+    edges = [graph.get_edge(a, b) for a, b in zip(path, path[1:])]
+    if any([edge.length is None for edge in edges]):
+        return len(edges)
+    return lab2.path_length(graph, path)
+
+def _search_fn(name, beam_width, memory_limit):
+    if name == 'ida_star':
+        return lab2.ida_star
+    if name == 'sma_star':
+        return lab2.sma_star(memory_limit)
+    search = lab2.generic_search(*getattr(lab2, name))
+    if name == 'generic_beam':
+        return lambda graph, start, goal, stats: search(graph, start, goal,
+                                                        beam_width, stats)
+    return search
+
+def run_strategy(name, graph, start, goal, beam_width=2, repeat=1,
+                 memory_limit=100):
+    """Run one strategy; returns a dictionary ready for JSON."""
+    if repeat < 1:
+        raise ValueError("repeat must be at least 1")
+    search = _search_fn(name, beam_width, memory_limit)
+    best = None
+    try:
+        for _ in range(repeat):
+            path, stats = search(graph, start, goal, stats=True)
+            if best is None or stats.seconds < best.seconds:
+                best = stats
+    except Exception as e:
+        return {'strategy': name, 'error': '%s: %s' % (type(e).__name__, e)}
+    result = {'strategy': name, 'path': path, 'length': _length(graph, path)}
+    result.update(best.as_dict())
+    return result
+
+def run(strategies, grids, randoms, beam_width=2, repeat=1, memory_limit=100):
+    queries = bundled_queries()
+    for size in grids:
+        graph, start, goal = grid_graph(size)
+        queries.append(('grid-%d' % size, graph, start, goal))
+    for size in randoms:
+        graph, start, goal = random_graph(size)
+        queries.append(('random-%d' % size, graph, start, goal))
+    results = []
+    for graph_name, graph, start, goal in queries:
+        for name in strategies:
+            result = run_strategy(name, graph, start, goal, beam_width,
+                                  repeat, memory_limit)
+            result['graph'] = '%s (%s to %s)' % (graph_name, start, goal)
+            results.append(result)
+    return results
+
+def table(results):
+    "The results, as a text table."
+    def cell(result, column):
+        if column == 'ms':
+            value = result.get('seconds')
+            return '' if value is None else '%.3f' % (value * 1000)
+        value = result.get(column)
+        if value is None:
+            return ''
+        return '%g' % value if isinstance(value, float) else str(value)
+    rows = [[cell(result, column) for column in COLUMNS] for result in results]
+    widths = [max([len(column)] + [len(row[i]) for row in rows])
+              for i, column in enumerate(COLUMNS)]
+    lines = ['  '.join([column.ljust(width)
+                        for column, width in zip(COLUMNS, widths)]).rstrip()]
+    for result, row in zip(results, rows):
+        if 'error' in result:
+            row = row[:2] + [result['error']]
+        lines.append('  '.join([value.ljust(width)
+                                for value, width in zip(row, widths)]).rstrip())
+    return '\n'.join(lines)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Compare the lab 2 search strategies.")
+    parser.add_argument('--strategies', default=','.join(STRATEGIES),
+                        help="comma-separated strategies from lab2.py")
+    parser.add_argument('--grid', default='4',
+                        help="sizes of made-up grid graphs")
+    parser.add_argument('--random', default='10',
+                        help="sizes of made-up random graphs")
+    parser.add_argument('--beam-width', type=int, default=2,
+                        help="beam width for generic_beam")
+    parser.add_argument('--memory', type=int, default=100,
+                        help="memory_limit for sma_star")
+    parser.add_argument('--repeat', type=int, default=3,
+                        help="report the best of this many runs")
+    parser.add_argument('--json', action='store_true',
+                        help="print JSON instead of a table")
+    parser.add_argument('--output', help="write the results here")
+    args = parser.parse_args(argv)
+    if args.repeat < 1:
+        parser.error("--repeat must be at least 1")
+
+    strategies = [s for s in args.strategies.split(',') if s]
+    grids = [int(s) for s in args.grid.split(',') if s]
+    randoms = [int(s) for s in args.random.split(',') if s]
+    results = run(strategies, grids, randoms, args.beam_width, args.repeat,
+                  args.memory)
+    if args.json:
+        text = json.dumps({'python': sys.version.split()[0],
+                           'benchmarks': results}, indent=2)
+    else:
+        text = table(results)
+    if args.output:
+        with open(args.output, 'w') as out:
+            out.write(text + '\n')
+    else:
+        print(text)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,273 @@
+# MIT 6.034 Lab 2: Search
+
+# Searches that don't keep the whole agenda in memory.
+#
+# ida_star (iterative-deepening A*) does a depth-first search that gives up
+# on any path whose length plus heuristic is over a bound, starting with the
+# heuristic of the start node.  If that doesn't reach the goal, it starts
+# again with the bound raised to the smallest value that went over it.  It
+# only ever holds the paths branching off the one it's on, but it may
+# extend the same paths many times, once for each bound.
+#
+# sma_star(memory_limit) (simplified memory-bounded A*) is A* that holds at
+# most memory_limit paths at once, as a tree of paths sharing their
+# prefixes.  When it needs room for a new path, it forgets the worst leaf
+# of the tree (the one with the highest length plus heuristic, and of
+# those, the shortest), and the leaf's parent remembers its value (just
+# the number), so that a forgotten path is only made again once everything
+# else looks worse.  Paths with more nodes than memory_limit can't be held
+# at all, so they're never found.
+#
+# Both use the extensions and has_loops functions they're made with (as
+# generic_search does), and the heuristic in the graph's heuristic_dict.
+# With an admissible heuristic, both find a shortest path (for sma_star, a
+# shortest one of those that fit in memory_limit).
+
+import heapq
+import itertools
+import time
+
+from search import SearchStats, counting_heuristic
+
+INF = float('inf')
+
+def _with_stats(run, graph, start, goal, stats):
+    search_stats = SearchStats()
+    if not stats:
+        return run(graph, start, goal, search_stats)
+    began = time.perf_counter()
+    with counting_heuristic(graph, search_stats):
+        path = run(graph, start, goal, search_stats)
+    search_stats.seconds = time.perf_counter() - began
+    return path, search_stats
+
+def make_ida_star(extensions_fn, has_loops_fn):
+
+    def ida_star(graph, start, goal, stats=False):
+        """
+        Returns a path from start to goal, or None; with stats=True,
+        returns (path, a SearchStats) instead.
+        """
+        return _with_stats(run, graph, start, goal, stats)
+
+    def run(graph, start, goal, stats):
+        bound = graph.get_heuristic_value(start, goal)
+        while True:
+            path, next_bound = bounded_search(graph, start, goal, bound, stats)
+            if path is not None or next_bound == INF:
+                return path
+            bound = next_bound
+
+    def bounded_search(graph, start, goal, bound, stats):
+        # Returns the first path to the goal that stays within the bound (or
+        # None), and the smallest value of a path that went over it.
+        next_bound = INF
+        agenda_paths = [([start], 0)]
+        while agenda_paths:
+            path, length = agenda_paths.pop()
+            lastNode = path[-1]
+            value = length + graph.get_heuristic_value(lastNode, goal)
+            if value > bound:
+                next_bound = min(next_bound, value)
+                continue
+            if lastNode == goal:
+                return path, next_bound
+            new_paths = [p for p in extensions_fn(graph, path)
+                         if not has_loops_fn(p)]
+            for new_path in reversed(new_paths):
+                edge = graph.get_edge(lastNode, new_path[-1])
+                agenda_paths.append((new_path, length + edge.length))
+            stats.expanded += 1
+            stats.generated += len(new_paths)
+            stats.peak_agenda = max(stats.peak_agenda, len(agenda_paths))
+        return None, next_bound
+
+    return ida_star
+
+
+class _TreeNode(object):
+    """
+    One path in sma_star's tree: its last node, the path before it, and its
+    length.  'value' is a lower bound on the length of a path to the goal
+    through it.  'forgotten' holds the values of the paths one step longer
+    that were forgotten, by their last nodes, and 'pending' is the best
+    value of the paths that could still be made from it (the best one
+    forgotten, or its own value if it hasn't been extended yet), or INF if
+    there are none.
+    """
+    __slots__ = ('node', 'parent', 'length', 'depth', 'value', 'pending',
+                 'children', 'forgotten', 'extended', 'order', 'version',
+                 'alive')
+
+    def __init__(self, node, parent, length, value, order):
+        self.node = node
+        self.parent = parent
+        self.length = length
+        self.depth = 0 if parent is None else parent.depth + 1
+        self.value = value
+        self.pending = value
+        self.children = []
+        self.forgotten = {}
+        self.extended = False
+        self.order = order
+        self.version = 0
+        self.alive = True
+
+    def to_list(self):
+        nodes = []
+        tree_node = self
+        while tree_node is not None:
+            nodes.append(tree_node.node)
+            tree_node = tree_node.parent
+        nodes.reverse()
+        return nodes
+
+def make_sma_star(extensions_fn, has_loops_fn):
+
+    def sma_star(memory_limit):
+        """
+        Returns a search_algorithm(graph, start, goal, stats=False) that
+        holds at most memory_limit paths at once.
+        """
+        if memory_limit < 1:
+            raise ValueError("memory_limit must be at least 1")
+
+        def search_algorithm(graph, start, goal, stats=False):
+            """
+            Returns a path from start to goal, or None; with stats=True,
+            returns (path, a SearchStats) instead.
+            """
+            return _with_stats(run, graph, start, goal, stats)
+
+        def run(graph, start, goal, stats):
+            return _SMAStar(graph, start, goal, memory_limit, stats).run()
+
+        return search_algorithm
+
+    class _SMAStar(object):
+        # The state of one search.  'candidates' is a heap of the paths that
+        # can be extended, best first; 'leaves' is a heap of the leaves of
+        # the tree, worst first.  Both may hold out-of-date entries, which
+        # are skipped (see current).
+        def __init__(self, graph, start, goal, memory_limit, stats):
+            self.graph = graph
+            self.goal = goal
+            self.memory_limit = memory_limit
+            self.stats = stats
+            self.counter = itertools.count()
+            self.candidates = []
+            self.leaves = []
+            self.root = _TreeNode(start, None, 0,
+                                  graph.get_heuristic_value(start, goal),
+                                  next(self.counter))
+            self.used = 1
+            self.touch(self.root)
+
+        def touch(self, tree_node):
+            # Called whenever a path's values or children change.
+            tree_node.version += 1
+            if tree_node.pending < INF:
+                heapq.heappush(self.candidates,
+                               (tree_node.pending, -tree_node.depth,
+                                tree_node.order, tree_node.version, tree_node))
+            if not tree_node.children and tree_node is not self.root:
+                heapq.heappush(self.leaves,
+                               (-tree_node.value, tree_node.depth,
+                                -tree_node.order, tree_node.version, tree_node))
+
+        @staticmethod
+        def current(entry):
+            tree_node = entry[-1]
+            return tree_node.alive and tree_node.version == entry[-2]
+
+        def update_values(self, tree_node):
+            # Back the best value of each path's children up the tree.
+            while tree_node is not None:
+                value = min([tree_node.pending]
+                            + [child.value for child in tree_node.children])
+                if value == tree_node.value:
+                    return
+                tree_node.value = value
+                self.touch(tree_node)
+                tree_node = tree_node.parent
+
+        def forget_worst_leaf(self, busy):
+            set_aside = []
+            while True:
+                entry = heapq.heappop(self.leaves)
+                if not self.current(entry):
+                    continue
+                if entry[-1] is busy:
+                    set_aside.append(entry)
+                    continue
+                break
+            for kept in set_aside:
+                heapq.heappush(self.leaves, kept)
+            leaf = entry[-1]
+            leaf.alive = False
+            parent = leaf.parent
+            parent.children.remove(leaf)
+            if leaf.value < INF:
+                parent.forgotten[leaf.node] = leaf.value
+                parent.pending = min(parent.pending, leaf.value)
+            self.used -= 1
+            self.touch(parent)
+            self.update_values(parent)
+
+        def add_child(self, tree_node, node, floor):
+            graph, goal = self.graph, self.goal
+            length = tree_node.length + graph.get_edge(tree_node.node,
+                                                       node).length
+            # A path's value is never less than its parent's, and a path
+            # that's as long as memory allows can't lead anywhere else.
+            if node != goal and tree_node.depth + 2 >= self.memory_limit:
+                value = INF
+            else:
+                value = max(length + graph.get_heuristic_value(node, goal),
+                            floor)
+            child = _TreeNode(node, tree_node, length, value,
+                              next(self.counter))
+            tree_node.children.append(child)
+            self.used += 1
+            self.stats.generated += 1
+            self.touch(child)
+            if self.used > self.memory_limit:
+                self.forget_worst_leaf(tree_node)
+
+        def extend(self, tree_node):
+            if not tree_node.extended:
+                tree_node.extended = True
+                floor = tree_node.pending
+                tree_node.pending = INF
+                nodes = []
+                if tree_node.depth + 1 < self.memory_limit:
+                    nodes = [path[-1] for path in
+                             extensions_fn(self.graph, tree_node.to_list())
+                             if not has_loops_fn(path)]
+                for node in nodes:
+                    self.add_child(tree_node, node, floor)
+                self.stats.expanded += 1
+            else:
+                # Make the best of the forgotten paths again (the first one
+                # forgotten, if some tie), with the value it had.
+                forgotten = tree_node.forgotten
+                node = min(forgotten, key=forgotten.get)
+                floor = forgotten.pop(node)
+                tree_node.pending = min(forgotten.values()) if forgotten else INF
+                self.add_child(tree_node, node, floor)
+            self.touch(tree_node)
+            self.update_values(tree_node)
+
+        def run(self):
+            while self.candidates:
+                entry = heapq.heappop(self.candidates)
+                tree_node = entry[-1]
+                if not self.current(entry):
+                    continue
+                if tree_node.node == self.goal:
+                    return tree_node.to_list()
+                self.extend(tree_node)
+                self.stats.peak_agenda = max(self.stats.peak_agenda, self.used)
+            return None
+
+    return sma_star
@@ -1,9 +1,14 @@
 # MIT 6.034 Lab 2: Search
 # Written by 6.034 staff
 
-from search import Edge, UndirectedGraph, do_nothing_fn, make_generic_search
+from search import (Edge, UndirectedGraph, PathNode, do_nothing_fn,
+                    make_generic_search, sorts_agenda_by, keeps_beam_by,
+                    extends_to_neighbors)
 import read_graphs
+from landmarks import landmarks_for, distances_to
+from bounded import make_ida_star, make_sma_star
 from functools import reduce
+import heapq
 
 all_graphs = read_graphs.get_graphs()
 GRAPH_0 = all_graphs['GRAPH_0']
@@ -23,6 +28,8 @@ def path_length(graph, path):
     (That is, the list of nodes defines a path through the graph.)
     A path with fewer than 2 nodes should have length of 0.
     You can assume that all edges along the path have a valid numeric weight."""
+    if isinstance(path, PathNode):
+        return path.cost
     sum = 0
     for n in range(1, len(path)):
         sum += graph.get_edge(path[n-1], path[n]).length
@@ -39,6 +46,7 @@ def has_loops(path):
             nodes.append(node)
     return False
 
+@extends_to_neighbors
 def extensions(graph, path):
     """Returns a list of paths. Each path in the list should be a one-node
     extension of the input path, where an extension is defined as a path formed
@@ -146,11 +154,23 @@ def sort_heuristic_new_paths(graph, goalNode, new_paths):
         return graph.get_heuristic_value(path[-1], goalNode)
     return sorted(new_paths, key = sort)
 
+def heuristic_key(graph, goalNode, path):
+    return graph.get_heuristic_value(path[-1], goalNode)
+
+def length_key(graph, goalNode, path):
+    return path_length(graph, path)
+
+def heuristic_length_key(graph, goalNode, path):
+    return path_length(graph, path) + graph.get_heuristic_value(path[-1], goalNode)
+
+# sorts_agenda_by lets generic_search keep these agendas in a heap.
+@sorts_agenda_by(heuristic_key)
 def sort_heuristic_agenda_paths(graph, goalNode, agenda_paths):
     def sort(path):
         return graph.get_heuristic_value(path[-1], goalNode)
     return sorted(agenda_paths, key = sort)
 
+@sorts_agenda_by(length_key)
 def sort_length_agenda_paths(graph, goalNode, agenda_paths):
     def sort(path):
         path_length = 0
@@ -159,6 +179,7 @@ def sort_length_agenda_paths(graph, goalNode, agenda_paths):
         return path_length
     return sorted(agenda_paths, key = sort)
 
+@sorts_agenda_by(heuristic_length_key)
 def sort_heuristic_length_agenda_paths(graph, goalNode, agenda_paths):
     def sort(path):
         path_length = 0
@@ -167,6 +188,7 @@ def sort_heuristic_length_agenda_paths(graph, goalNode, agenda_paths):
         return path_length + graph.get_heuristic_value(path[-1], goalNode)
     return sorted(agenda_paths, key = sort)
 
+@sorts_agenda_by(None)
 def do_nothing(graph, goalNode, paths):
     return paths
 
@@ -187,6 +209,26 @@ generic_branch_and_bound_with_extended_set = [do_nothing, False, sort_length_age
 
 generic_a_star = [do_nothing, False, sort_heuristic_length_agenda_paths, True]
 
+# A* with landmark (ALT) lower bounds in place of graph's heuristic_dict, for
+# graphs that don't have one.  See landmarks.py, which also has
+# bidirectional_dijkstra and can fill in heuristic_dict from the landmarks.
+def alt_length_key(graph, goalNode, path):
+    return path_length(graph, path) + landmarks_for(graph).lower_bound(path[-1], goalNode)
+
+@sorts_agenda_by(alt_length_key)
+def sort_alt_length_agenda_paths(graph, goalNode, agenda_paths):
+    def sort(path):
+        return alt_length_key(graph, goalNode, path)
+    return sorted(agenda_paths, key = sort)
+
+generic_alt_a_star = [do_nothing, False, sort_alt_length_agenda_paths, True]
+
+# A* variants that don't hold the whole agenda (see bounded.py):
+# ida_star(graph, startNode, goalNode), or with a limit on the number of
+# paths held, sma_star(1000)(graph, startNode, goalNode).
+ida_star = make_ida_star(extensions, has_loops)
+sma_star = make_sma_star(extensions, has_loops)
+
 
 
 # Here is an example of how to call generic_search (uncomment to run):
@@ -202,14 +244,29 @@ generic_a_star = [do_nothing, False, sort_heuristic_length_agenda_paths, True]
 ### OPTIONAL: Generic Beam Search
 
 # If you want to run local tests for generic_beam, change TEST_GENERIC_BEAM to True:
-TEST_GENERIC_BEAM = False
+TEST_GENERIC_BEAM = True
 
 # The sort_agenda_fn for beam search takes fourth argument, beam_width:
 # def my_beam_sorting_fn(graph, goalNode, paths, beam_width):
 #     # YOUR CODE HERE
 #     return sorted_beam_agenda
 
-generic_beam = [None, None, None, False]
+@keeps_beam_by(heuristic_key)
+def sort_beam_agenda_paths(graph, goalNode, agenda_paths, beam_width):
+    # The agenda holds the rest of the layer being searched, then the paths
+    # one step longer; only the best beam_width of those are kept.  (If
+    # they're all the same length, either the layer is done, or it's all
+    # that's left and already no wider than the beam.)
+    if not agenda_paths:
+        return agenda_paths
+    depth = len(agenda_paths[-1])
+    layer = [path for path in agenda_paths if len(path) < depth]
+    next_layer = [path for path in agenda_paths if len(path) == depth]
+    def sort(path):
+        return (graph.get_heuristic_value(path[-1], goalNode), path)
+    return layer + heapq.nsmallest(beam_width, next_layer, key = sort)
+
+generic_beam = [sort_new_paths, False, sort_beam_agenda_paths, False]
 
 
 # Uncomment this to test your generic_beam search:
@@ -222,9 +279,12 @@ def is_admissible(graph, goalNode):
     """Returns True if this graph's heuristic is admissible; else False.
     A heuristic is admissible if it is either always exactly correct or overly
     optimistic; it never over-estimates the cost to the goal."""
+    # One search from the goal finds every node's shortest distance to it
+    # (see landmarks.py).  Nodes that can't reach the goal can't be
+    # over-estimated.
+    distances = distances_to(graph, goalNode)
     for node in graph.nodes:
-        shortest_path = generic_search(*generic_branch_and_bound_with_extended_set)(graph, node, goalNode)
-        if graph.get_heuristic_value(node, goalNode) > path_length(graph,shortest_path):
+        if node in distances and graph.get_heuristic_value(node, goalNode) > distances[node]:
             return False
     return True
 
@@ -0,0 +1,197 @@
+# MIT 6.034 Lab 2: Search
+
+# Shortest paths for graphs that don't come with a useful heuristic.
+#
+# bidirectional_dijkstra searches outward from the start and the goal at the
+# same time, and stops once the two searches can't find anything shorter than
+# the best path joining them so far.
+#
+# A Landmarks object holds the distances from a few "landmark" nodes to every
+# other node.  By the triangle inequality, for any landmark L,
+#     dist(node, goal) >= |dist(L, goal) - dist(L, node)|
+# so the largest of these over all the landmarks is an admissible (and
+# consistent) heuristic, known as ALT.  It can be used directly by A*
+# (generic_alt_a_star in lab2.py), saved to a file and loaded again, or
+# written into a graph's heuristic_dict for the other heuristic searches.
+#
+# distances_to is a distance oracle: one Dijkstra search outward from a goal
+# gives the exact distance from every node to it, which is all that checking
+# a heuristic for admissibility needs.
+#
+# Edge lengths must be numbers.
+
+import heapq
+import json
+
+INF = float('inf')
+
+def dijkstra(graph, source):
+    "Returns a dictionary of the distance from source to each node it can reach."
+    distances = {source: 0}
+    done = set()
+    queue = [(0, source)]
+    while queue:
+        distance, node = heapq.heappop(queue)
+        if node in done:
+            continue
+        done.add(node)
+        for edge in graph.get_neighboring_edges(node):
+            new_distance = distance + edge.length
+            if new_distance < distances.get(edge.endNode, INF):
+                distances[edge.endNode] = new_distance
+                heapq.heappush(queue, (new_distance, edge.endNode))
+    return distances
+
+def distances_to(graph, goal):
+    """Returns a dictionary of the length of the shortest path from each node
+    to goal, leaving out nodes that can't reach it.  The graph is
+    undirected, so this is one search outward from goal; it's only done
+    again if the graph's edges change."""
+    key = ('distances', goal)
+    if key not in graph._derived:
+        graph._derived[key] = dijkstra(graph, goal)
+    return graph._derived[key]
+
+def tighten_heuristic(graph, goal):
+    """Sets graph's heuristic to goal to the exact distance from each node
+    that can reach it (the best admissible heuristic there is), and returns
+    the graph."""
+    inner = graph.heuristic_dict.setdefault(goal, {})
+    inner.update(distances_to(graph, goal))
+    return graph
+
+def bidirectional_dijkstra(graph, start, goal):
+    """Returns a shortest path from start to goal, as a list of nodes, or
+    None if there isn't one.  If several paths are equally short, which one
+    is returned depends on the order the two searches meet in, so it may
+    not be the same one generic_a_star would return."""
+    if start == goal:
+        return [start]
+    # One of each for the forward (0) and backward (1) searches.
+    distances = [{start: 0}, {goal: 0}]
+    parents = [{start: None}, {goal: None}]
+    done = [set(), set()]
+    queues = [[(0, start)], [(0, goal)]]
+    best, meeting = INF, None
+
+    while queues[0] and queues[1]:
+        if queues[0][0][0] + queues[1][0][0] >= best:
+            break
+        side = 0 if queues[0][0][0] <= queues[1][0][0] else 1
+        distance, node = heapq.heappop(queues[side])
+        if node in done[side]:
+            continue
+        done[side].add(node)
+        other = 1 - side
+        for edge in graph.get_neighboring_edges(node):
+            neighbor = edge.endNode
+            new_distance = distance + edge.length
+            if new_distance < distances[side].get(neighbor, INF):
+                distances[side][neighbor] = new_distance
+                parents[side][neighbor] = node
+                heapq.heappush(queues[side], (new_distance, neighbor))
+            if neighbor in distances[other]:
+                total = (distances[side][neighbor]
+                         + distances[other][neighbor])
+                if total < best:
+                    best, meeting = total, neighbor
+
+    if meeting is None:
+        return None
+    path = []
+    node = meeting
+    while node is not None:
+        path.append(node)
+        node = parents[0][node]
+    path.reverse()
+    node = parents[1][meeting]
+    while node is not None:
+        path.append(node)
+        node = parents[1][node]
+    return path
+
+
+class Landmarks(object):
+    """
+    Distances from a few landmark nodes to every node, for ALT lower bounds.
+    If no landmarks are given, 'count' of them are chosen far apart: the
+    first node of the graph, then repeatedly the node farthest from all the
+    landmarks chosen so far.
+    """
+    def __init__(self, graph=None, count=4, landmarks=None):
+        self.landmarks = []
+        self.distances = []
+        if graph is None:
+            return
+        if landmarks is None:
+            landmarks = self._choose(graph, count)
+        for landmark in landmarks:
+            self.landmarks.append(landmark)
+            self.distances.append(dijkstra(graph, landmark))
+
+    def _choose(self, graph, count):
+        nodes = graph.nodes
+        if not nodes or count <= 0:
+            return []
+        chosen = [nodes[0]]
+        nearest = dijkstra(graph, nodes[0])
+        while len(chosen) < min(count, len(nodes)):
+            # Nodes the landmarks can't reach come first, then distant ones.
+            candidate = max(nodes, key=lambda node: nearest.get(node, INF))
+            if candidate in chosen:
+                break
+            chosen.append(candidate)
+            for node, distance in dijkstra(graph, candidate).items():
+                if distance < nearest.get(node, INF):
+                    nearest[node] = distance
+        return chosen
+
+    def lower_bound(self, node, goal):
+        "A lower bound on the length of the shortest path from node to goal."
+        bound = 0
+        for distances in self.distances:
+            to_node = distances.get(node)
+            to_goal = distances.get(goal)
+            if to_node is None and to_goal is None:
+                continue
+            if to_node is None or to_goal is None:
+                # One can reach the landmark and the other can't, so they
+                # can't reach each other either.
+                return INF
+            bound = max(bound, abs(to_goal - to_node))
+        return bound
+
+    def fill_heuristic(self, graph, goals=None):
+        """Writes the lower bounds to each of goals (by default, every node)
+        into graph.heuristic_dict, and returns the graph."""
+        if goals is None:
+            goals = graph.nodes
+        for goal in goals:
+            inner = graph.heuristic_dict.setdefault(goal, {})
+            for node in graph.nodes:
+                inner[node] = self.lower_bound(node, goal)
+        return graph
+
+    def save(self, file_name):
+        "Saves the landmarks and their distances, as JSON."
+        with open(file_name, 'w') as f:
+            json.dump({'landmarks': self.landmarks,
+                       'distances': self.distances}, f)
+
+    @classmethod
+    def load(cls, file_name):
+        "Loads landmarks saved by save().  They're only valid for the same graph."
+        with open(file_name, 'r') as f:
+            saved = json.load(f)
+        landmarks = cls()
+        landmarks.landmarks = saved['landmarks']
+        landmarks.distances = saved['distances']
+        return landmarks
+
+def landmarks_for(graph, count=4):
+    """Returns the Landmarks for a graph, working them out the first time
+    they're asked for (and again if the graph's edges change)."""
+    key = ('landmarks', count)
+    if key not in graph._derived:
+        graph._derived[key] = Landmarks(graph, count)
+    return graph._derived[key]
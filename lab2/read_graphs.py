@@ -1,65 +1,320 @@
 # MIT 6.034 Lab 2: Search
 
-from search import UndirectedGraph
-
-def get_graphs(file_name="graphs.txt", verbose=False):
-    with open(file_name, 'r') as f:
-        line_strings = [line.strip('\n').strip('\r') for line in f.readlines()
-                        if (line != '\n' and line[0] != '#')]
-    lines = []
-    for line_str in line_strings:
-        if '#' not in line_str:
-            lines.append(line_str.split(' '))
-        else:
-            i = line_str.find('#')
-            lines.append(line_str[:i].split(' '))
+# Reading graphs.txt.
+#
+# The file is read a line at a time, and each graph's nodes and edges are
+# collected in plain lists before the UndirectedGraph is made, so loading
+# takes time in proportion to the size of the file.  Duplicate edges and
+# missing nodes are reported (and handled) just as UndirectedGraph.join does.
+#
+# The parsed graphs are also saved in a binary cache, in the __pycache__
+# directory next to the file: a table of strings, then for each graph arrays
+# of node numbers, edge endpoints and lengths, and heuristic entries.  If the
+# file's size and modification time haven't changed since, get_graphs
+# memory-maps the cache and builds the graphs from those arrays instead of
+# parsing the file again.  The cache also keeps the messages about duplicate
+# edges and missing nodes, and they're printed again when it's loaded.
 
+import gc
+import mmap
+import os
+import struct
+import sys
+from array import array
+from contextlib import contextmanager
+
+from search import Edge, UndirectedGraph
+
+_CACHE_MAGIC = b'6034GR'
+_CACHE_VERSION = 2
+_CACHE_HEADER = struct.Struct('=6sHcxQqQQ')
+_GRAPH_HEADER = struct.Struct('=IIIIII')
+
+
+@contextmanager
+def _collector_paused():
+    # Making a million Edges would otherwise set off the cyclic garbage
+    # collector many times over, for objects that can't be garbage.
+    collecting = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if collecting:
+            gc.enable()
+
+
+class _GraphBuilder(object):
+    "Collects one graph's nodes, edges and heuristic while it's being read."
+    def __init__(self):
+        self.nodes = []
+        self.node_set = set()
+        self.edges = []
+        self.pairs = set()
+        self.heuristic = {}
+        self.warnings = []
+
+    def warn(self, message):
+        print(message)
+        self.warnings.append(message)
+
+    def set_nodes(self, nodes):
+        self.nodes = nodes
+        self.node_set = set(nodes)
+
+    def join(self, startNode, endNode, edgeLength=None):
+        # The same as UndirectedGraph.join, quirks and all.
+        if (startNode, endNode) in self.pairs:
+            self.warn("UndirectedGraph.join: Error adding edge to graph")
+            return
+        self.edges.append(Edge(startNode, endNode, edgeLength))
+        self.pairs.add((startNode, endNode))
+        self.pairs.add((endNode, startNode))
+        for node in [startNode, endNode]:
+            if node not in self.node_set:
+                self.warn("UndirectedGraph.join: Adding %s to list of nodes" % node)
+                self.nodes.append(startNode)
+                self.node_set.add(startNode)
+
+    def set_heuristic(self, heuristicDict):
+        self.heuristic = heuristicDict
+
+    def graph(self):
+        g = UndirectedGraph()
+        g.nodes = self.nodes
+        g.edges = self.edges
+        g.set_heuristic(self.heuristic)
+        return g
+
+    def __str__(self):
+        return str(self.graph())
+
+
+def _read_lines(f):
+    "Yields the lines of a graph file, split into words, without comments."
+    for line_str in f:
+        if line_str == '\n' or line_str[0] == '#':
+            continue
+        line_str = line_str.strip('\n').strip('\r')
+        if '#' in line_str:
+            line_str = line_str[:line_str.find('#')]
+        yield line_str.split(' ')
+
+def parse_graphs(file_name="graphs.txt", verbose=False):
+    "Reads the graphs in a file; returns a dictionary of _GraphBuilders."
     graphs = {}
     g = None
     heuristicDict = None
     recordingHeuristic = False
 
-    for line in lines:
-        label = line[0]
-        if label == '' or label == 'edges':
-            continue
-        if recordingHeuristic:
-            if label == 'heuristic-end':
-                g.set_heuristic(heuristicDict)
-                heuristicDict = None
-                recordingHeuristic = False
-            else: #add entry to heuristicDict
-                innerDict = {}
-                for kvPair in line[1:]:
-                    [key, value] = kvPair.split('-')
-                    innerDict[key] = float(value)
-                heuristicDict[label] = innerDict
-        elif label == 'graph':
-            if len(line) != 2:
-                raise Exception("invalid graph line. Expected syntax: 'graph graphName'")
-            g = UndirectedGraph()
-            graphs[line[1]] = g
-        elif label == 'nodes':
-            if g.nodes != []:
-                raise Exception("graph already has nodes list: \n" + str(g))
-            g.nodes = line[1:]
-        elif label == 'heuristic-start':
-            recordingHeuristic = True
-            heuristicDict = {}
-        else: #assume edge
-            try:
-                if len(line) == 2: #unweighted edge
-                    g.join(line[0], line[1])
-                elif len(line) == 3: #weighted edge
-                    g.join(line[0], line[1], float(line[2]))
-            except:
-                raise Exception("invalid edge. Expected syntax: 'startNode endNode' "
-                                + "OR 'startNode endNode edgeLength'")
-        if verbose:
-            print(line)
+    with open(file_name, 'r') as f, _collector_paused():
+        for line in _read_lines(f):
+            label = line[0]
+            if label == '' or label == 'edges':
+                continue
+            if recordingHeuristic:
+                if label == 'heuristic-end':
+                    g.set_heuristic(heuristicDict)
+                    heuristicDict = None
+                    recordingHeuristic = False
+                else: #add entry to heuristicDict
+                    innerDict = {}
+                    for kvPair in line[1:]:
+                        [key, value] = kvPair.split('-')
+                        innerDict[key] = float(value)
+                    heuristicDict[label] = innerDict
+            elif label == 'graph':
+                if len(line) != 2:
+                    raise Exception("invalid graph line. Expected syntax: 'graph graphName'")
+                g = _GraphBuilder()
+                graphs[line[1]] = g
+            elif label == 'nodes':
+                if g.nodes != []:
+                    raise Exception("graph already has nodes list: \n" + str(g))
+                g.set_nodes(line[1:])
+            elif label == 'heuristic-start':
+                recordingHeuristic = True
+                heuristicDict = {}
+            else: #assume edge
+                try:
+                    if len(line) == 2: #unweighted edge
+                        g.join(line[0], line[1])
+                    elif len(line) == 3: #weighted edge
+                        g.join(line[0], line[1], float(line[2]))
+                except:
+                    raise Exception("invalid edge. Expected syntax: 'startNode endNode' "
+                                    + "OR 'startNode endNode edgeLength'")
+            if verbose:
+                print(line)
+
+    return graphs
+
+
+#### The binary cache ##########################################################
+
+def cache_path(file_name):
+    "Where the cache for a graph file is kept."
+    directory, base = os.path.split(os.path.abspath(file_name))
+    return os.path.join(directory, '__pycache__', base + '.graphcache')
+
+def _source_stamp(file_name):
+    stat = os.stat(file_name)
+    return stat.st_size, stat.st_mtime_ns
+
+def _padded(data):
+    # Keep every array 8-byte aligned, so that it can be cast in place.
+    return data + b'\0' * (-len(data) % 8)
+
+def save_cache(file_name, builders):
+    "Writes the cache for a graph file, given what parse_graphs read from it."
+    strings = {}
+    def number(s):
+        if s not in strings:
+            strings[s] = len(strings)
+        return strings[s]
+
+    sections = []
+    for name, b in builders.items():
+        nodes = array('I', [number(n) for n in b.nodes])
+        starts = array('I', [number(e.startNode) for e in b.edges])
+        ends = array('I', [number(e.endNode) for e in b.edges])
+        lengths = array('d', [0.0 if e.length is None else e.length
+                              for e in b.edges])
+        weighted = bytes([e.length is not None for e in b.edges])
+        goals, counts = array('I'), array('I')
+        heuristic_nodes, values = array('I'), array('d')
+        for goal, inner in b.heuristic.items():
+            goals.append(number(goal))
+            counts.append(len(inner))
+            for node, value in inner.items():
+                heuristic_nodes.append(number(node))
+                values.append(value)
+        warnings = array('I', [number(w) for w in b.warnings])
+        header = _GRAPH_HEADER.pack(number(name), len(nodes), len(starts),
+                                    len(goals), len(values), len(warnings))
+        sections.append(_padded(header) + b''.join(
+            [_padded(a.tobytes()) for a in
+             [nodes, starts, ends, lengths, goals, counts, heuristic_nodes,
+              values, warnings]]
+            + [_padded(weighted)]))
+
+    encoded = [s.encode('utf-8') for s in strings]
+    offsets = array('Q', [0])
+    for s in encoded:
+        offsets.append(offsets[-1] + len(s))
+    size, mtime = _source_stamp(file_name)
+    header = _CACHE_HEADER.pack(_CACHE_MAGIC, _CACHE_VERSION,
+                                sys.byteorder[0].encode('ascii'), size, mtime,
+                                len(encoded), len(sections))
+
+    path = cache_path(file_name)
+    temp_path = path + '.tmp'
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(temp_path, 'wb') as out:
+            out.write(_padded(header))
+            out.write(offsets.tobytes())
+            out.write(_padded(b''.join(encoded)))
+            for section in sections:
+                out.write(section)
+        os.replace(temp_path, path)
+    except OSError:
+        # The cache is only an optimization; a read-only directory is fine.
+        pass
+
+def load_cache(file_name):
+    """
+    Returns the graphs in a file's cache, or None if there's no cache or
+    it's out of date.  Prints the messages that parsing the file printed.
+    """
+    path = cache_path(file_name)
+    try:
+        stamp = _source_stamp(file_name)
+        with open(path, 'rb') as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+                cached = _read_cache(memoryview(m), stamp)
+    except (OSError, ValueError, BufferError, struct.error, IndexError,
+            StopIteration, UnicodeDecodeError):
+        return None
+    if cached is None:
+        return None
+    graphs, warnings = cached
+    for message in warnings:
+        print(message)
+    return graphs
+
+def _read_cache(view, stamp):
+    magic, version, byteorder, size, mtime, n_strings, n_graphs = \
+        _CACHE_HEADER.unpack_from(view, 0)
+    if (magic != _CACHE_MAGIC or version != _CACHE_VERSION
+        or byteorder != sys.byteorder[0].encode('ascii')
+        or (size, mtime) != stamp):
+        return None
+    position = len(_padded(b'\0' * _CACHE_HEADER.size))
+
+    def take(typecode, count):
+        nonlocal position
+        itemsize = array(typecode).itemsize
+        end = position + count * itemsize
+        items = view[position:end].cast(typecode).tolist()
+        position = end + (-(end - position) % 8)
+        return items
+
+    offsets = take('Q', n_strings + 1)
+    end = position + offsets[-1]
+    text = bytes(view[position:end])
+    position = end + (-offsets[-1] % 8)
+    strings = [text[offsets[i]:offsets[i + 1]].decode('utf-8')
+               for i in range(n_strings)]
+
+    graphs = {}
+    warnings = []
+    for _ in range(n_graphs):
+        name, n_nodes, n_edges, n_goals, n_heuristic, n_warnings = \
+            _GRAPH_HEADER.unpack_from(view, position)
+        position += len(_padded(b'\0' * _GRAPH_HEADER.size))
+        nodes = take('I', n_nodes)
+        starts = take('I', n_edges)
+        ends = take('I', n_edges)
+        lengths = take('d', n_edges)
+        goals = take('I', n_goals)
+        counts = take('I', n_goals)
+        heuristic_nodes = take('I', n_heuristic)
+        values = take('d', n_heuristic)
+        warnings += [strings[w] for w in take('I', n_warnings)]
+        weighted = take('B', n_edges)
+
+        heuristic = {}
+        entries = iter(zip(heuristic_nodes, values))
+        for goal, count in zip(goals, counts):
+            inner = {}
+            for _ in range(count):
+                node, value = next(entries)
+                inner[strings[node]] = value
+            heuristic[strings[goal]] = inner
+        g = UndirectedGraph()
+        g.nodes = [strings[n] for n in nodes]
+        with _collector_paused():
+            g.edges = [Edge(strings[s], strings[e], length if w else None)
+                       for s, e, length, w in zip(starts, ends, lengths,
+                                                  weighted)]
+        g.set_heuristic(heuristic)
+        graphs[strings[name]] = g
+    return graphs, warnings
+
+
+def get_graphs(file_name="graphs.txt", verbose=False, use_cache=True):
+    graphs = None
+    if use_cache and not verbose:
+        graphs = load_cache(file_name)
+    if graphs is None:
+        builders = parse_graphs(file_name, verbose)
+        if use_cache:
+            save_cache(file_name, builders)
+        graphs = dict([(name, b.graph()) for name, b in builders.items()])
 
     if verbose:
         for graphName in sorted(graphs.keys()):
             print(graphName, ":", graphs[graphName])
 
-    return graphs
\ No newline at end of file
+    return graphs
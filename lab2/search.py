@@ -1,5 +1,10 @@
 # MIT 6.034 Lab 2: Search
 
+import heapq
+import time
+from collections import deque
+from contextlib import contextmanager
+
 def distinct(seq):
     seen = set()
     seen_add = seen.add
@@ -28,12 +33,146 @@ class Edge:
     __repr__ = __str__
 
 
+class EdgeList(list):
+    """
+    The edges of an UndirectedGraph.  It's an ordinary list, except that it
+    tells the graph whenever it changes, so that the graph's indexes of its
+    edges stay up to date.
+    """
+    _graph = None
+
+    def __init__(self, edges=(), graph=None):
+        list.__init__(self, edges)
+        self._graph = graph
+
+    def __reduce__(self):
+        # Copied or unpickled on its own, without a graph to tell; the graph
+        # makes a new EdgeList of its own (see UndirectedGraph.__setstate__).
+        return (EdgeList, (list(self),))
+
+    def _changed(self):
+        if self._graph is not None:
+            self._graph._edges_changed()
+
+    def append(self, edge):
+        list.append(self, edge)
+        if self._graph is not None:
+            self._graph._edge_appended(edge)
+
+    def extend(self, edges):
+        list.extend(self, edges)
+        self._changed()
+
+    def insert(self, index, edge):
+        list.insert(self, index, edge)
+        self._changed()
+
+    def remove(self, edge):
+        list.remove(self, edge)
+        self._changed()
+
+    def pop(self, *args):
+        edge = list.pop(self, *args)
+        self._changed()
+        return edge
+
+    def clear(self):
+        list.clear(self)
+        self._changed()
+
+    def sort(self, *args, **kwargs):
+        list.sort(self, *args, **kwargs)
+        self._changed()
+
+    def reverse(self):
+        list.reverse(self)
+        self._changed()
+
+    def __setitem__(self, index, value):
+        list.__setitem__(self, index, value)
+        self._changed()
+
+    def __delitem__(self, index):
+        list.__delitem__(self, index)
+        self._changed()
+
+    def __iadd__(self, edges):
+        list.__iadd__(self, edges)
+        self._changed()
+        return self
+
+    def __imul__(self, n):
+        list.__imul__(self, n)
+        self._changed()
+        return self
+
+
 class UndirectedGraph:
     def __init__(self, nodes=[], edges=[], heuristic_dict={}):
         self.nodes = nodes[:]
         self.edges = edges[:]
         self.heuristic_dict = heuristic_dict.copy()
 
+    # The edges are indexed by node, for get_edges.  The indexes are built
+    # when they're first needed, kept up to date as edges are added, and
+    # thrown away if the list of edges is changed in any other way.
+    @property
+    def edges(self):
+        return self._edges
+
+    @edges.setter
+    def edges(self, edges):
+        self._edges = EdgeList(edges, self)
+        self._edges_changed()
+
+    def _edges_changed(self):
+        self._incident = None
+        self._pairs = None
+        self._neighbors = {}
+        # Anything else worked out from the edges (such as landmark distances,
+        # see landmarks.py) is kept here, and thrown away when they change.
+        self._derived = {}
+
+    def _edge_appended(self, edge):
+        if '_neighbors' not in self.__dict__:
+            # The graph is still being set up.
+            self._edges_changed()
+            return
+        if self._incident is not None:
+            self._index_edge(edge)
+        self._neighbors.pop(edge.startNode, None)
+        self._neighbors.pop(edge.endNode, None)
+        self._derived = {}
+
+    def _index_edge(self, edge):
+        a, b = edge.startNode, edge.endNode
+        self._incident.setdefault(a, []).append(edge)
+        self._pairs.setdefault((a, b), []).append(edge)
+        if a != b:
+            self._incident.setdefault(b, []).append(edge)
+            self._pairs.setdefault((b, a), []).append(edge)
+
+    # Copies and pickles keep the edges, but not the indexes, which are built
+    # again when they're needed.
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        for name in ['_incident', '_pairs', '_neighbors', '_derived']:
+            state.pop(name, None)
+        state['_edges'] = list(self._edges)
+        return state
+
+    def __setstate__(self, state):
+        state = dict(state)
+        edges = state.pop('_edges', [])
+        self.__dict__.update(state)
+        self.edges = edges
+
+    def _build_index(self):
+        self._incident = {}
+        self._pairs = {}
+        for edge in self._edges:
+            self._index_edge(edge)
+
     def is_valid_path(self, path) :
         # all nodes are nodes in the path, and consecutive nodes are neighbors
         return all([x in self.nodes for x in path]) and all([self.get_edge(a,b) for (a,b) in zip(path, path[1:])])
@@ -42,18 +181,32 @@ class UndirectedGraph:
         """ Return a list of all the edges in the graph.  If start or end are
         provided, restricts to edges that start/end at particular nodes. """
 
+        if startNode is None and endNode is None:
+            return list(self._edges)
+        if self._incident is None:
+            self._build_index()
+        if startNode is None:
+            found = self._incident.get(endNode, ())
+        elif endNode is None:
+            found = self._incident.get(startNode, ())
+        else:
+            found = self._pairs.get((startNode, endNode), ())
+
         pred1 =  lambda node: (startNode is None) or (node == startNode)
         pred2 =  lambda node: (endNode is None)   or (node == endNode)
 
-        return [e for e in [e if pred1(e.startNode) and pred2(e.endNode) else
-             e.reverse() if pred2(e.startNode) and pred1(e.endNode)
-             else None
-             for e in self.edges
-        ] if e is not None]
+        # Edges keep the direction they were added in, unless they have to be
+        # reversed to start (or end) at the right node.
+        return [e if pred1(e.startNode) and pred2(e.endNode) else e.reverse()
+                for e in found]
 
     def get_neighbors(self, node):
         "Returns an alphabetical list of neighboring nodes. Each node appears at most once."
-        return sorted(distinct([e.endNode for e in self.get_edges(node)]))
+        if node is None:
+            return sorted(distinct([e.endNode for e in self.get_edges(node)]))
+        if node not in self._neighbors:
+            self._neighbors[node] = sorted(distinct([e.endNode for e in self.get_edges(node)]))
+        return self._neighbors[node][:]
 
     def get_neighboring_edges(self, startNode):
         "Returns a list of neighboring edges."
@@ -70,7 +223,11 @@ class UndirectedGraph:
 
     def is_neighbor(self, startNode, endNode):
         "Returns True if there is an edge connecting startNode to endNode, else False"
-        return any([endNode == e.endNode for e in self.get_edges(startNode)])
+        if startNode is None:
+            return any([endNode == e.endNode for e in self.get_edges()])
+        if self._incident is None:
+            self._build_index()
+        return (startNode, endNode) in self._pairs
 
     # CREATE AND MODIFY THE GRAPH
 
@@ -113,15 +270,278 @@ if False:
     print(g.get_neighboring_edges("B"))
 
 
+def _filter_width(length):
+    # 64 bits for a path of up to 16 nodes, and twice as many each time the
+    # path doubles in length after that: about four bits a node.
+    return 64 << max(0, (length - 1).bit_length() - 4)
+
+def _node_bits(node, width):
+    # Two bits of a filter 'width' bits wide; a path ORs together the bits
+    # of its nodes.
+    h = hash(node)
+    return (1 << (h % width)) | (1 << ((h // width) % width))
+
+class PathNode(object):
+    """
+    A path through a graph, kept as its last node and a pointer to the path
+    before it, so that the paths on an agenda share their common prefixes
+    instead of each being a separate list.
+
+    A PathNode can be used like the list of its nodes (len, indexing,
+    iteration, comparison), but path[-1], len(path), 'node in path' and
+    path.cost (the sum of the edge lengths) don't have to walk the whole
+    path.  'node in path' checks a filter of the path's nodes first (a Bloom
+    filter with about four bits per node, so it grows with the path), and
+    only walks back along the path if the filter can't rule it out.
+    """
+    __slots__ = ('parent', 'node', 'length', 'edge_length', '_cost', 'bits',
+                 'width')
+
+    def __init__(self, node, parent=None, edge_length=0):
+        self.parent = parent
+        self.node = node
+        self.edge_length = edge_length
+        if parent is None:
+            self.length = 1
+            self._cost = 0
+        else:
+            self.length = parent.length + 1
+            self._cost = None
+        self.width = _filter_width(self.length)
+        self.bits = _node_bits(node, self.width)
+        if parent is not None:
+            if parent.width == self.width:
+                self.bits |= parent.bits
+            else:
+                # The filter has just grown, so the bits of all the nodes
+                # before this one have to be worked out again.
+                path = parent
+                while path is not None:
+                    self.bits |= _node_bits(path.node, self.width)
+                    path = path.parent
+
+    def extend(self, node, edge_length):
+        "Returns a new path: this one, followed by node."
+        return PathNode(node, self, edge_length)
+
+    @property
+    def cost(self):
+        "The sum of the lengths of the edges along the path, as path_length adds them."
+        if self._cost is None:
+            unknown = []
+            path = self
+            while path._cost is None:
+                unknown.append(path)
+                path = path.parent
+            for path in reversed(unknown):
+                path._cost = path.parent._cost + path.edge_length
+        return self._cost
+
+    def to_list(self):
+        nodes = []
+        path = self
+        while path is not None:
+            nodes.append(path.node)
+            path = path.parent
+        nodes.reverse()
+        return nodes
+
+    def __contains__(self, node):
+        bits = _node_bits(node, self.width)
+        if self.bits & bits != bits:
+            return False
+        path = self
+        while path is not None:
+            if path.node == node:
+                return True
+            path = path.parent
+        return False
+
+    def __len__(self):
+        return self.length
+
+    def __getitem__(self, index):
+        if index == -1 or index == self.length - 1:
+            return self.node
+        return self.to_list()[index]
+
+    def __iter__(self):
+        return iter(self.to_list())
+
+    def _as_list(self, other):
+        return other.to_list() if isinstance(other, PathNode) else other
+
+    def _first_difference(self, other):
+        # Walks both paths back from the same length until they meet (paths
+        # on the same agenda usually share most of their nodes).  Returns
+        # the first pair of nodes that differ, or None if the shorter path
+        # is where the longer one starts.
+        a, b = self, other
+        while a.length > b.length:
+            a = a.parent
+        while b.length > a.length:
+            b = b.parent
+        difference = None
+        while a is not b:
+            if a.node != b.node:
+                difference = (a.node, b.node)
+            a, b = a.parent, b.parent
+        return difference
+
+    def __eq__(self, other):
+        if isinstance(other, PathNode):
+            return (self.length == other.length
+                    and self._first_difference(other) is None)
+        return self.to_list() == other
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __lt__(self, other):
+        if isinstance(other, PathNode):
+            if other.parent is self.parent:
+                return self.node < other.node
+            difference = self._first_difference(other)
+            if difference is None:
+                return self.length < other.length
+            return difference[0] < difference[1]
+        return self.to_list() < other
+
+    def __le__(self, other):
+        return self == other or self < other
+
+    def __gt__(self, other):
+        return not self <= other
+
+    def __ge__(self, other):
+        return not self < other
+
+    __hash__ = None
+
+    def __str__(self):
+        return "PathNode" + str(self.to_list())
+
+    __repr__ = __str__
+
+
 def do_nothing_fn(graph, goalNode, paths):
     return paths
 
+def extends_to_neighbors(extensions_fn):
+    """
+    Decorator for an extensions_fn that returns, in order, the paths that
+    go one step further to each of graph.get_neighbors(path[-1]) that isn't
+    already on the path.  generic_search can then extend PathNodes itself
+    instead of copying lists.
+    """
+    extensions_fn.extends_to_neighbors = True
+    return extensions_fn
+
+def sorts_agenda_by(key_fn):
+    """
+    Decorator for a sort_agenda_fn that sorts the agenda stably by
+    key_fn(graph, goalNode, path), or for one that leaves the agenda as it
+    is if key_fn is None.  generic_search can then keep the agenda in a
+    heap (or a deque) instead of re-sorting a list after every step; it
+    finds the same paths either way.
+    """
+    def mark(sort_agenda_fn):
+        sort_agenda_fn.agenda_key = key_fn
+        return sort_agenda_fn
+    return mark
+
+do_nothing_fn = sorts_agenda_by(None)(do_nothing_fn)
+
+def keeps_beam_by(key_fn):
+    """
+    Decorator for a beam search's sort_agenda_fn, which is given the rest of
+    the layer being searched followed by the paths one step longer found so
+    far, and keeps the layer as it is and the beam_width of the longer paths
+    with the smallest key_fn(graph, goalNode, path) (of paths that tie, the
+    ones that come first as lists), in that order.  generic_search can then
+    search a layer at a time, and only ever hold beam_width of the next
+    layer's paths, instead of re-sorting a list after every step.
+    """
+    def mark(sort_agenda_fn):
+        sort_agenda_fn.beam_key = key_fn
+        return sort_agenda_fn
+    return mark
+
+
+class SearchStats(object):
+    """
+    What a search did, for comparing strategies:
+      expanded               paths taken off the agenda and extended
+      generated              new paths put on the agenda
+      peak_agenda            the most paths on the agenda at once
+      extended               nodes in the extended set at the end
+      heuristic_evaluations  calls to graph.get_heuristic_value
+      pruned                 paths a beam search dropped from the agenda
+      seconds                how long the search took
+    """
+    FIELDS = ('expanded', 'generated', 'peak_agenda', 'extended',
+              'heuristic_evaluations', 'pruned', 'seconds')
+
+    def __init__(self):
+        self.expanded = 0
+        self.generated = 0
+        self.peak_agenda = 0
+        self.extended = 0
+        self.heuristic_evaluations = 0
+        self.pruned = 0
+        self.seconds = 0.0
+
+    def as_dict(self):
+        return dict([(field, getattr(self, field)) for field in self.FIELDS])
+
+    def __str__(self):
+        return "SearchStats(%s)" % ", ".join(
+            ["%s=%s" % (field, getattr(self, field)) for field in self.FIELDS])
+
+    __repr__ = __str__
+
+@contextmanager
+def counting_heuristic(graph, stats):
+    """
+    Counts calls to graph.get_heuristic_value in stats while the 'with'
+    block runs, by shadowing the method on this one graph.
+    """
+    shadowed = graph.__dict__.get('get_heuristic_value')
+    heuristic_fn = graph.get_heuristic_value
+    def counted(startNode, goalNode):
+        stats.heuristic_evaluations += 1
+        return heuristic_fn(startNode, goalNode)
+    graph.get_heuristic_value = counted
+    try:
+        yield
+    finally:
+        if shadowed is None:
+            del graph.get_heuristic_value
+        else:
+            graph.get_heuristic_value = shadowed
+
 def make_generic_search(extensions_fn, has_loops_fn): #hack to avoid circular imports
 
     def generic_search(sort_new_paths_fn = do_nothing_fn,
                        add_paths_to_front_of_agenda = True,
                        sort_agenda_fn = do_nothing_fn,
-                       use_extended_set = False):
+                       use_extended_set = False,
+                       agenda = 'auto'):
+        """
+        'agenda' chooses how the agenda is kept.  With 'list', it's a list
+        that sort_agenda_fn re-sorts after every step.  With 'auto' (the
+        default), if sort_agenda_fn was marked with sorts_agenda_by, it's a
+        deque (for a sort_agenda_fn that leaves it alone) or a binary heap
+        ordered by the key, and by when and in what order paths were added,
+        so that ties come out just as the stable sort would leave them.  A
+        beam search whose sort_agenda_fn was marked with keeps_beam_by, and
+        which adds new paths to the back of the agenda, goes a layer at a
+        time instead.
+
+        The search returns the path it found, or None; called with
+        stats=True, it returns (path, a SearchStats) instead, and counts
+        what it does as it goes.
+        """
 
         # To prevent tester from throwing unexpected errors
         args = [sort_new_paths_fn, add_paths_to_front_of_agenda,
@@ -130,17 +550,65 @@ def make_generic_search(extensions_fn, has_loops_fn): #hack to avoid circular im
             raise NotImplementedError("To implement, call with non-None arguments")
         elif None in args:
             raise TypeError("'None' is not a valid argument for generic_search")
+        if agenda not in ('auto', 'list'):
+            raise ValueError("Unknown kind of agenda: %s" % agenda)
+
+        # The heap and deque agendas hold PathNodes if they can; see
+        # extends_to_neighbors.
+        use_path_nodes = getattr(extensions_fn, 'extends_to_neighbors', False)
+
+        def new_paths_from(graph, goal, path):
+            if use_path_nodes:
+                # PathNodes never have loops, so has_loops_fn can be skipped.
+                lastNode = path.node
+                new_paths_unsorted = [
+                    path.extend(node, graph.get_edge(lastNode, node).length)
+                    for node in graph.get_neighbors(lastNode)
+                    if node not in path]
+            else:
+                new_paths_unsorted = [path for path in extensions_fn(graph, path)
+                                      if not has_loops_fn(path)]
+            return sort_new_paths_fn(graph, goal, new_paths_unsorted)
+
+        def first_path(start):
+            return PathNode(start) if use_path_nodes else [start]
+
+        def found(path):
+            return path.to_list() if use_path_nodes else path
 
         # Make search algorithm with arguments specified above
-        def search_algorithm(graph, start, goal, beam_width=None):
-            agenda = [[start]]
+        def search_algorithm(graph, start, goal, beam_width=None, stats=False):
+            search_stats = SearchStats()
+            if not stats:
+                return run(graph, start, goal, beam_width, search_stats)
+            began = time.perf_counter()
+            with counting_heuristic(graph, search_stats):
+                path = run(graph, start, goal, beam_width, search_stats)
+            search_stats.seconds = time.perf_counter() - began
+            return path, search_stats
+
+        def run(graph, start, goal, beam_width, stats):
+            if agenda == 'auto':
+                if beam_width == None and hasattr(sort_agenda_fn, 'agenda_key'):
+                    if sort_agenda_fn.agenda_key is None:
+                        return deque_search(graph, start, goal, stats)
+                    return heap_search(graph, start, goal,
+                                       sort_agenda_fn.agenda_key, stats)
+                if (beam_width != None and hasattr(sort_agenda_fn, 'beam_key')
+                    and not add_paths_to_front_of_agenda):
+                    return beam_search(graph, start, goal, beam_width,
+                                       sort_agenda_fn.beam_key, stats)
+
+            agenda_paths = [[start]]
             extended_set = set()
+            stats.peak_agenda = 1
 
-            while(agenda):
-                path = agenda.pop(0)
+            while(agenda_paths):
+                path = agenda_paths.pop(0)
                 lastNode = path[-1]
 
                 if(lastNode == goal):
+                    stats.extended = len(extended_set)
                     return path
                 elif use_extended_set and lastNode in extended_set:
                     continue
@@ -149,17 +617,137 @@ def make_generic_search(extensions_fn, has_loops_fn): #hack to avoid circular im
                     new_paths_unsorted = [path for path in extensions_fn(graph, path)
                                           if not has_loops_fn(path)]
                     new_paths = sort_new_paths_fn(graph, goal, new_paths_unsorted)
+                    stats.expanded += 1
+                    stats.generated += len(new_paths)
+                    stats.peak_agenda = max(stats.peak_agenda,
+                                            len(agenda_paths) + len(new_paths))
                     if add_paths_to_front_of_agenda:
-                        agenda = new_paths + agenda
+                        agenda_paths = new_paths + agenda_paths
                     else:
-                        agenda = agenda + new_paths
+                        agenda_paths = agenda_paths + new_paths
 
                     if beam_width == None:
-                        agenda = sort_agenda_fn(graph, goal, agenda)
+                        agenda_paths = sort_agenda_fn(graph, goal, agenda_paths)
                     else:
-                        agenda = sort_agenda_fn(graph, goal, agenda, beam_width)
+                        unpruned = len(agenda_paths)
+                        agenda_paths = sort_agenda_fn(graph, goal, agenda_paths, beam_width)
+                        stats.pruned += max(0, unpruned - len(agenda_paths))
 
             # no path found
+            stats.extended = len(extended_set)
+            return None
+
+        def deque_search(graph, start, goal, stats):
+            agenda_paths = deque([first_path(start)])
+            extended_set = set()
+            stats.peak_agenda = 1
+
+            while agenda_paths:
+                path = agenda_paths.popleft()
+                lastNode = path[-1]
+
+                if lastNode == goal:
+                    stats.extended = len(extended_set)
+                    return found(path)
+                elif use_extended_set and lastNode in extended_set:
+                    continue
+                extended_set.add(lastNode)
+                new_paths = new_paths_from(graph, goal, path)
+                if add_paths_to_front_of_agenda:
+                    agenda_paths.extendleft(reversed(new_paths))
+                else:
+                    agenda_paths.extend(new_paths)
+                stats.expanded += 1
+                stats.generated += len(new_paths)
+                stats.peak_agenda = max(stats.peak_agenda, len(agenda_paths))
+
+            stats.extended = len(extended_set)
+            return None
+
+        def heap_search(graph, start, goal, key_fn, stats):
+            # Each entry is (key, batch, place, path).  Paths added in the
+            # same step share a batch number, which grows with each step, or
+            # shrinks if paths go on the front of the agenda; 'place' keeps
+            # the order they were added in.  No two entries tie on all three,
+            # so paths themselves are never compared.
+            path = first_path(start)
+            agenda_paths = [(key_fn(graph, goal, path), 0, 0, path)]
+            extended_set = set()
+            batch = 0
+            stats.peak_agenda = 1
+
+            while agenda_paths:
+                path = heapq.heappop(agenda_paths)[3]
+                lastNode = path[-1]
+
+                if lastNode == goal:
+                    stats.extended = len(extended_set)
+                    return found(path)
+                elif use_extended_set and lastNode in extended_set:
+                    continue
+                extended_set.add(lastNode)
+                batch += 1
+                order = -batch if add_paths_to_front_of_agenda else batch
+                new_paths = new_paths_from(graph, goal, path)
+                for place, new_path in enumerate(new_paths):
+                    heapq.heappush(agenda_paths,
+                                   (key_fn(graph, goal, new_path), order,
+                                    place, new_path))
+                stats.expanded += 1
+                stats.generated += len(new_paths)
+                stats.peak_agenda = max(stats.peak_agenda, len(agenda_paths))
+
+            stats.extended = len(extended_set)
+            return None
+
+        def beam_search(graph, start, goal, beam_width, key_fn, stats):
+            # The list agenda would hold the rest of one layer and the best
+            # of the next; the first path to reach the goal would come out
+            # before anything else in the next layer.  Here the next layer
+            # is chosen from the paths as they're made, with a heap that
+            # never holds more than beam_width of them.
+            #
+            # The paths in a layer all have the same length, so one comes
+            # before another as a list if its parent does, or if they have
+            # the same parent and its last node comes first.  Each layer's
+            # paths are kept with their place in that order ('rank'), so
+            # ties never have to compare whole paths.
+            extended_set = set()
+            made = [0]
+
+            def next_paths(layer):
+                for rank, path in layer:
+                    lastNode = path[-1]
+                    if use_extended_set and lastNode in extended_set:
+                        continue
+                    extended_set.add(lastNode)
+                    stats.expanded += 1
+                    for new_path in new_paths_from(graph, goal, path):
+                        made[0] += 1
+                        yield (key_fn(graph, goal, new_path), rank,
+                               new_path[-1]), new_path
+
+            layer = [(0, first_path(start))]
+            stats.peak_agenda = 1
+            while layer:
+                for rank, path in layer:
+                    if path[-1] == goal:
+                        stats.extended = len(extended_set)
+                        return found(path)
+                made[0] = 0
+                best = heapq.nsmallest(beam_width, next_paths(layer),
+                                       key=lambda entry: entry[0])
+                stats.generated += made[0]
+                stats.pruned += made[0] - len(best)
+                stats.peak_agenda = max(stats.peak_agenda,
+                                        len(layer) + len(best))
+                ranks = sorted(range(len(best)),
+                               key=lambda i: best[i][0][1:])
+                layer = [None] * len(best)
+                for rank, i in enumerate(ranks):
+                    layer[i] = (rank, best[i][1])
+
+            stats.extended = len(extended_set)
             return None
 
         return search_algorithm
@@ -447,3 +447,215 @@ if TEST_HEURISTICS:
                             test_heuristic(val, True, False, True)),
               expected_val = 'Correct numerical values for heuristic to fit specifications',
               name = 'heuristic_4')
+
+
+#### Copying graphs ############################################################
+
+import copy
+import pickle
+
+def same_graph(graph, other):
+    "Do the two graphs have the same neighbors and edges everywhere?"
+    nodes = graph.nodes + [None]
+    return (graph.nodes == other.nodes
+            and all([graph.get_neighbors(node) == other.get_neighbors(node)
+                     for node in nodes])
+            and all([graph.get_edge(a, b) == other.get_edge(a, b)
+                     for a in graph.nodes for b in graph.nodes]))
+
+# Look things up in GRAPH_2 first, so that its indexes have been built.
+GRAPH_2.get_neighbors('S')
+for copied_graph in [pickle.loads(pickle.dumps(GRAPH_2)), copy.deepcopy(GRAPH_2)]:
+    (lambda copied_graph :
+     make_test(type = 'NESTED_FUNCTION',
+               getargs = [generic_branch_and_bound, [copied_graph, 'S', 'G']],
+               testanswer = (lambda val, original_val=None:
+                             val == list('SBCEG')
+                             and same_graph(GRAPH_2, copied_graph)),
+               expected_val = list('SBCEG'),
+               name = 'generic_search')
+     )(copied_graph)
+
+
+#### The graph cache ###########################################################
+
+import os
+
+def cache_is_reused(read_graphs):
+    """Once the cache has been written, are the graphs loaded from it without
+    writing it again, and the same as the ones parsed from the file?"""
+    read_graphs.get_graphs()
+    path = read_graphs.cache_path('graphs.txt')
+    written = os.stat(path).st_mtime_ns
+    cached = read_graphs.get_graphs()
+    parsed = read_graphs.get_graphs(use_cache=False)
+    return (os.stat(path).st_mtime_ns == written
+            and read_graphs.load_cache('graphs.txt') is not None
+            and sorted(cached) == sorted(parsed)
+            and all([same_graph(parsed[name], cached[name])
+                     and parsed[name].heuristic_dict == cached[name].heuristic_dict
+                     for name in parsed]))
+
+make_test(type = 'VALUE',
+          getargs = 'read_graphs',
+          testanswer = (lambda val, original_val=None: cache_is_reused(val)),
+          expected_val = ("The graphs read from the cache, without writing it " +
+                          "again, the same as the ones parsed from graphs.txt"),
+          name = 'read_graphs')
+
+
+#### Landmarks #################################################################
+
+from lab2 import generic_alt_a_star, landmarks_for, path_length
+from landmarks import dijkstra, bidirectional_dijkstra
+
+def alt_matches_dijkstra(search_fn):
+    """Are the landmark lower bounds no more than the distances Dijkstra
+    finds, and are the paths ALT A* and bidirectional Dijkstra find as short
+    as those distances?"""
+    for graph in [GRAPH_1, GRAPH_2, GRAPH_3]:
+        landmarks = landmarks_for(graph)
+        for start in graph.nodes:
+            distances = dijkstra(graph, start)
+            for goal in graph.nodes:
+                distance = distances.get(goal)
+                if distance is None:
+                    if search_fn(graph, start, goal) is not None:
+                        return False
+                    continue
+                if landmarks.lower_bound(start, goal) > distance:
+                    return False
+                for path in [search_fn(graph, start, goal),
+                             bidirectional_dijkstra(graph, start, goal)]:
+                    if (path is None or path[0] != start or path[-1] != goal
+                        or path_length(graph, path) != distance):
+                        return False
+    return True
+
+make_test(type = 'FUNCTION',
+          getargs = generic_alt_a_star,
+          testanswer = (lambda val, original_val=None: alt_matches_dijkstra(val)),
+          expected_val = ("Landmark lower bounds no more than the Dijkstra " +
+                          "distances, and shortest paths from ALT A* and " +
+                          "bidirectional Dijkstra"),
+          name = 'generic_search')
+
+
+#### Batches of searches #######################################################
+
+from batch import search_many
+
+def search_many_matches(search_fn, strategy, workers):
+    """Does search_many find the same path for every pair of nodes in
+    GRAPH_2 as searching for them one at a time, once each?"""
+    queries = [(start, goal) for start in GRAPH_2.nodes for goal in GRAPH_2.nodes]
+    found = {}
+    for index, path in search_many(GRAPH_2, queries, strategy, workers=workers):
+        if index in found:
+            return False
+        found[index] = path
+    return found == dict([(index, search_fn(GRAPH_2, start, goal))
+                          for index, (start, goal) in enumerate(queries)])
+
+for workers in [1, 2]:
+    (lambda workers :
+     make_test(type = 'FUNCTION',
+               getargs = generic_branch_and_bound,
+               testanswer = (lambda val, original_val=None:
+                             search_many_matches(val, generic_branch_and_bound,
+                                                 workers)),
+               expected_val = ("The same paths from search_many, with %d " % workers +
+                               "worker(s), as from one search at a time"),
+               name = 'generic_search')
+     )(workers)
+
+
+#### Beam search's agenda ######################################################
+
+from lab2 import generic_search
+
+def beam_matches_list_agenda(search_fn):
+    """Does the layer-at-a-time beam search find the same paths as the one
+    that re-sorts a list agenda, without ever holding more than two layers
+    of beam_width paths?"""
+    list_search = generic_search(*generic_beam, agenda = 'list')
+    for graph in [GRAPH_1, GRAPH_2, GRAPH_3]:
+        for start in graph.nodes:
+            for goal in graph.nodes:
+                for beam_width in range(1, 6):
+                    path, stats = search_fn(graph, start, goal, beam_width,
+                                            stats = True)
+                    if (path != list_search(graph, start, goal, beam_width)
+                        or stats.peak_agenda > 2 * beam_width):
+                        return False
+    return True
+
+if TEST_GENERIC_BEAM:
+    make_test(type = 'FUNCTION',
+              getargs = generic_beam,
+              testanswer = (lambda val, original_val=None:
+                            beam_matches_list_agenda(val)),
+              expected_val = ("The same paths as a beam search with a list " +
+                              "agenda, holding at most 2 * beam_width paths"),
+              name = 'generic_search')
+
+
+#### Search statistics #########################################################
+
+# The number of paths beam search drops from GRAPH_2's agenda on the way from
+# S to G, for each beam width; searches that don't use a beam drop none.
+pruned_tests = [[1, 'SADHFG', 5], [2, 'SBYCEG', 8], [3, 'SADEG', 7]]
+
+if TEST_GENERIC_BEAM:
+    for beam_width, answer_string, pruned in pruned_tests:
+        for agenda in ['auto', 'list']:
+            (lambda beam_width, answer_string, pruned, agenda :
+             make_test(type = 'NESTED_FUNCTION',
+                       getargs = [generic_beam + [agenda],
+                                  [GRAPH_2, 'S', 'G', beam_width, True]],
+                       testanswer = (lambda val, original_val=None:
+                                     val[0] == list(answer_string)
+                                     and val[1].pruned == pruned),
+                       expected_val = ("Path %s, with %d paths pruned"
+                                       % (list(answer_string), pruned)),
+                       name = 'generic_search')
+             )(beam_width, answer_string, pruned, agenda)
+
+make_test(type = 'NESTED_FUNCTION',
+          getargs = [generic_a_star, [GRAPH_2, 'S', 'G', None, True]],
+          testanswer = (lambda val, original_val=None:
+                        val[0] == list('SBCEG') and val[1].pruned == 0),
+          expected_val = "Path %s, with no paths pruned" % list('SBCEG'),
+          name = 'generic_search')
+
+
+#### Bounded A* ################################################################
+
+def bounded_matches_branch_and_bound(search_fn):
+    """Does search_fn find a path as short as branch and bound's from every
+    node to each goal that GRAPH_1 and GRAPH_2 have an admissible heuristic
+    for?  (GRAPH_3's heuristic isn't admissible.)"""
+    branch_and_bound = generic_search(*generic_branch_and_bound)
+    for graph, goal in [(GRAPH_1, 'c'), (GRAPH_1, 'd'), (GRAPH_2, 'G')]:
+        for start in graph.nodes:
+            path = search_fn(graph, start, goal)
+            expected = branch_and_bound(graph, start, goal)
+            if (path is None or path[0] != start or path[-1] != goal
+                or path_length(graph, path) != path_length(graph, expected)):
+                return False
+    return True
+
+make_test(type = 'VALUE',
+          getargs = 'ida_star',
+          testanswer = (lambda val, original_val=None:
+                        bounded_matches_branch_and_bound(val)),
+          expected_val = "Paths as short as branch and bound's",
+          name = 'ida_star')
+
+# With room for the longest of those paths, SMA* finds shortest ones.
+make_test(type = 'FUNCTION',
+          getargs = [6],
+          testanswer = (lambda val, original_val=None:
+                        bounded_matches_branch_and_bound(val)),
+          expected_val = "Paths as short as branch and bound's",
+          name = 'sma_star')
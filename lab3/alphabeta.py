@@ -0,0 +1,169 @@
+# MIT 6.034 Lab 3: Games
+
+# Minimax with alpha-beta pruning, with a transposition table (see
+# transposition.py) and move ordering (see ordering.py).
+#
+# alphabeta_search returns a (path, score, evaluations) like
+# minimax_search_alphabeta, and with neither a table nor an ordering it
+# searches the same states in the same order.  With a table, positions
+# already searched deeply enough aren't searched again, and the move that
+# was best before is tried first.  With an ordering, the children are
+# searched in the order it gives; the move at each ply of the best path
+# from the last search of the same state (the principal variation) goes
+# first, unless the table has a best move of its own.
+#
+# A search can be stopped from another thread by setting its 'stop' Event;
+# it raises SearchAborted at the next state it comes to, and leaves the
+# table and ordering as they would be after a search that had simply
+# visited fewer states.  If the Event has a 'lock', the search holds it
+# while it uses the table or ordering, and checks the Event first, so once
+# another thread has set the Event while holding the lock, the search won't
+# touch them again (even if it's in the middle of a slow heuristic).
+#
+# The score of a state whose whole subtree was searched, without the depth
+# limit cutting anything off, doesn't depend on the depth limit, so it goes
+# in the table as if it had been searched infinitely deep.
+
+from transposition import EXACT, LOWER, UPPER, scoring_functions
+
+INF = float('inf')
+
+class SearchAborted(Exception):
+    "Raised by a search when its stop Event is set."
+
+def alphabeta_search(state, alpha=-INF, beta=INF, heuristic_fn=None,
+                     depth_limit=INF, maximize=True, table=None, ordering=None,
+                     stop=None) :
+    """Performs minimax with alpha-beta pruning, using and filling the
+    transposition table and move ordering, if given.  Same return type as
+    dfs_maximizing; the evaluation count doesn't include scores taken from
+    the table."""
+    return search_to_depth(state, alpha, beta, heuristic_fn, depth_limit,
+                           maximize, table, ordering, stop)[0]
+
+def search_to_depth(state, alpha=-INF, beta=INF, heuristic_fn=None,
+                    depth_limit=INF, maximize=True, table=None, ordering=None,
+                    stop=None) :
+    """Like alphabeta_search, but returns (result, solved), where solved is
+    True if the depth limit didn't cut anything off, so that searching
+    deeper would give the same result."""
+    if (table is not None
+            and table.functions != scoring_functions(state, heuristic_fn)):
+        table.new_search(heuristic_fn, state)
+    pv = ()
+    if ordering is not None and ordering.pv is not None and ordering.pv[0] == state:
+        pv = ordering.pv[1]
+    search = _AlphaBeta(heuristic_fn, table, ordering, stop)
+    score, moves, evaluations, limited = search.search(state, alpha, beta,
+                                                       depth_limit, maximize,
+                                                       0, pv)
+    if ordering is not None:
+        def set_pv():
+            ordering.pv = (state, moves)
+        search.guarded(set_pv)
+    path = [state]
+    for index in moves:
+        path.append(path[-1].generate_next_states()[index])
+    return ((path, score, evaluations), not limited)
+
+
+class _AlphaBeta(object):
+    # One search.  Moves are indexes into generate_next_states().
+
+    def __init__(self, heuristic_fn, table, ordering, stop):
+        self.heuristic_fn = heuristic_fn
+        self.table = table
+        self.ordering = ordering
+        self.stop = stop
+        self.lock = getattr(stop, 'lock', None)
+
+    def guarded(self, fn, *args):
+        # Calls fn, which uses the table or ordering, unless the search has
+        # been stopped.
+        if self.lock is None:
+            return fn(*args)
+        with self.lock:
+            if self.stop.is_set():
+                raise SearchAborted()
+            return fn(*args)
+
+    def count_hit(self):
+        self.table.hits += 1
+
+    def search(self, state, alpha, beta, depth_limit, maximize, ply, pv):
+        # Returns (score, moves to the leaf, number of static evaluations,
+        # whether the depth limit cut off any of the states searched).
+        if self.stop is not None and self.stop.is_set():
+            raise SearchAborted()
+        table = self.table
+        key = None if table is None else table.key(state, maximize)
+        first = pv[0] if pv else None
+        if key is not None:
+            entry = self.guarded(table.probe, key)
+            if entry is not None:
+                if entry.depth >= depth_limit and (
+                        entry.flag == EXACT
+                        or (entry.flag == LOWER and entry.score >= beta)
+                        or (entry.flag == UPPER and entry.score <= alpha)):
+                    self.guarded(self.count_hit)
+                    return (entry.score, entry.moves, 0, entry.depth < INF)
+                if entry.moves:
+                    first = entry.moves[0]
+
+        if state.is_game_over():
+            score = state.get_endgame_score(maximize)
+            if key is not None:
+                self.guarded(table.store, key, INF, score, EXACT, ())
+            return (score, (), 1, False)
+        if depth_limit == 0:
+            score = self.heuristic_fn(state.get_snapshot(), maximize)
+            if key is not None:
+                self.guarded(table.store, key, 0, score, EXACT, ())
+            return (score, (), 1, True)
+
+        children = state.generate_next_states()
+        if self.ordering is not None:
+            order = self.guarded(self.ordering.order, state, children, ply,
+                                 first)
+        else:
+            order = list(range(len(children)))
+            if first is not None and first < len(children):
+                order.remove(first)
+                order.insert(0, first)
+
+        original_alpha, original_beta = alpha, beta
+        best_moves = ()
+        evaluations = 0
+        limited = False
+        for index in order:
+            child_pv = pv[1:] if pv and index == pv[0] else ()
+            score, moves, count, child_limited = self.search(
+                children[index], alpha, beta, depth_limit - 1, not maximize,
+                ply + 1, child_pv)
+            evaluations += count
+            limited = limited or child_limited
+            if maximize:
+                if score > alpha:
+                    alpha = score
+                    best_moves = (index,) + moves
+            else:
+                if score < beta:
+                    beta = score
+                    best_moves = (index,) + moves
+            if alpha >= beta:
+                if self.ordering is not None:
+                    self.guarded(self.ordering.cutoff, children[index], ply,
+                                 depth_limit)
+                break
+
+        score = alpha if maximize else beta
+        if score <= original_alpha:
+            flag = UPPER
+        elif score >= original_beta:
+            flag = LOWER
+        else:
+            flag = EXACT
+        if key is not None:
+            self.guarded(table.store, key, depth_limit if limited else INF,
+                         score, flag, best_moves)
+        return (score, best_moves, evaluations, limited)
@@ -0,0 +1,81 @@
+# MIT 6.034 Lab 3: Games
+
+# Progressive deepening with a deadline.
+#
+# timed_progressive_deepening searches to depth 1, 2, 3, ... in a worker
+# thread, and puts each depth's result in an AnytimeValue as soon as that
+# depth is done.  Once time_limit seconds have passed, the search of the
+# depth in progress is stopped and the AnytimeValue is returned with every
+# depth that finished, without waiting for the worker.  The worker may still
+# be inside a slow heuristic call for a while, but it holds the deadline's
+# lock whenever it uses the table or ordering (see SearchAborted in
+# alphabeta.py), so once the deadline is set, neither they nor the
+# AnytimeValue are changed by the search again.  The deepening also stops
+# early at depth_limit, or once a depth has searched the whole game tree
+# without the depth limit cutting anything off.
+#
+# The worker is a thread rather than a process, so that states, heuristics,
+# tables and orderings don't have to be sent anywhere, and the search can
+# stop as soon as it's told to.  The worker also watches the clock itself,
+# since the caller may not get to run again until a little after the
+# deadline.
+
+import threading
+import time
+
+from game_api import AnytimeValue
+from alphabeta import SearchAborted, search_to_depth
+
+INF = float('inf')
+
+class _Deadline(object):
+    # Used as the search's stop Event: set when the caller sets it, or when
+    # the deadline has passed.  The search holds 'lock' while it writes.
+    def __init__(self, deadline):
+        self.deadline = deadline
+        self.event = threading.Event()
+        self.lock = threading.Lock()
+
+    def set(self):
+        self.event.set()
+
+    def is_set(self):
+        return self.event.is_set() or time.perf_counter() >= self.deadline
+
+def timed_progressive_deepening(state, heuristic_fn, depth_limit=INF,
+                                maximize=True, time_limit=1.0, table=None,
+                                ordering=None) :
+    """Runs progressive deepening until time_limit seconds have passed, and
+    returns an AnytimeValue with the result of every depth that finished
+    (none, if not even depth 1 did)."""
+    anytime_value = AnytimeValue()
+    if table is not None:
+        table.new_search(heuristic_fn, state)
+    if ordering is not None:
+        ordering.new_search()
+    stop = _Deadline(time.perf_counter() + time_limit)
+
+    def deepen() :
+        depth = 1
+        while depth <= depth_limit:
+            try:
+                result, solved = search_to_depth(state, -INF, INF, heuristic_fn,
+                                                 depth, maximize, table,
+                                                 ordering, stop)
+            except SearchAborted:
+                return
+            with stop.lock:
+                if stop.is_set():
+                    return
+                anytime_value.set_value(result)
+            if solved:
+                return
+            depth += 1
+
+    worker = threading.Thread(target=deepen, name='progressive_deepening')
+    worker.daemon = True
+    worker.start()
+    worker.join(max(time_limit, 0))
+    with stop.lock:
+        stop.set()
+    return anytime_value
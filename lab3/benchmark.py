@@ -0,0 +1,233 @@
+# MIT 6.034 Lab 3: Games
+
+# Benchmarks for progressive deepening on the boards in boards.py.
+#
+# Each board is searched to the same depth with progressive_deepening and
+# heuristic_connectfour, once for each way of searching:
+#   fixed          the children in column order, as minimax_search_alphabeta
+#                  does on its own
+#   ordered        a MoveOrdering (principal variation, killers, history,
+#                  center first)
+#   table          a TranspositionTable
+#   table+ordered  both
+# and the results are printed as a table: the score, the total number of
+# static evaluations over all depths, how many fewer that is than 'fixed',
+# and the best time of a few runs.
+#
+# With --scaling, each board that isn't already over is instead searched
+# with minimax_search_alphabeta in a ParallelSearch (see parallel.py), by
+# root splitting and by Lazy SMP, with each number of workers, and the
+# table shows the time each took and how many times faster that is than
+# with the fewest workers.  The worker processes are started before the
+# clock starts.  Processes can only run at the same time on as many CPUs
+# as there are, so the speedup can't be more than that.
+#
+# Run it as
+#   python benchmark.py [--depth 4] [--boards BOARD_UHOH,BOARD_EMPTY]
+#                       [--searches fixed,ordered] [--repeat N] [--json]
+#                       [--output results.txt]
+#   python benchmark.py --scaling 1,2,4,8 [--modes root-split,lazy-smp]
+#                       [--depth 6] [--boards ...] [--repeat N] [--json]
+
+import argparse
+import os
+import json
+import sys
+import time
+
+import boards
+from lab3 import *
+from parallel import ParallelSearch
+
+SEARCHES = ['fixed', 'ordered', 'table', 'table+ordered']
+
+COLUMNS = ['board', 'search', 'score', 'evaluations', 'reduction', 'ms']
+
+MODES = ['root-split', 'lazy-smp']
+
+SCALING_COLUMNS = ['board', 'mode', 'workers', 'score', 'evaluations', 'ms',
+                   'speedup']
+
+def board_states() :
+    "A (name, AbstractGameState) for each ConnectFourBoard in boards.py."
+    return [(name, AbstractGameState(snapshot = board,
+                                     is_game_over_fn = is_game_over_connectfour,
+                                     generate_next_states_fn = next_boards_connectfour,
+                                     endgame_score_fn = endgame_score_connectfour_faster))
+            for name, board in sorted(vars(boards).items())
+            if is_class_instance(board, 'ConnectFourBoard')]
+
+def run_search(name, state, depth_limit, repeat=1) :
+    """Run progressive deepening one way; returns a dictionary ready for
+    JSON."""
+    best = None
+    for _ in range(repeat):
+        table = TranspositionTable() if 'table' in name else None
+        ordering = MoveOrdering() if 'ordered' in name else None
+        began = time.perf_counter()
+        anytime_value = progressive_deepening(state, heuristic_connectfour,
+                                              depth_limit, True, table, ordering)
+        seconds = time.perf_counter() - began
+        if best is None or seconds < best:
+            best = seconds
+    return {'search': name,
+            'score': anytime_value.get_value()[1],
+            'evaluations': anytime_value.total_evaluations,
+            'seconds': best}
+
+def run(searches, board_names=None, depth_limit=4, repeat=1) :
+    results = []
+    for board_name, state in board_states():
+        if board_names and board_name not in board_names:
+            continue
+        board_results = []
+        for name in searches:
+            result = run_search(name, state, depth_limit, repeat)
+            result['board'] = board_name
+            board_results.append(result)
+        fixed = [r['evaluations'] for r in board_results if r['search'] == 'fixed']
+        for result in board_results:
+            if fixed and fixed[0]:
+                result['reduction'] = 1 - float(result['evaluations']) / fixed[0]
+        results += board_results
+    return results
+
+def run_scaling(modes, worker_counts, board_names=None, depth_limit=4,
+                repeat=1) :
+    """Search each board with each mode and number of workers; returns a
+    list of dictionaries ready for JSON."""
+    states = [(board_name, state) for board_name, state in board_states()
+              if not state.is_game_over()
+              and (not board_names or board_name in board_names)]
+    results = []
+    for mode in modes:
+        for workers in worker_counts:
+            with ParallelSearch(workers, mode == 'lazy-smp') as search:
+                for board_name, state in states:
+                    best = None
+                    for _ in range(repeat):
+                        if search.table is not None:
+                            search.table.clear()
+                        began = time.perf_counter()
+                        path, score, evaluations = search.search(
+                            state, -INF, INF, heuristic_connectfour,
+                            depth_limit, True)
+                        seconds = time.perf_counter() - began
+                        if best is None or seconds < best:
+                            best = seconds
+                    results.append({'board': board_name, 'mode': mode,
+                                    'workers': workers, 'score': score,
+                                    'evaluations': evaluations,
+                                    'seconds': best})
+    fewest = min(worker_counts)
+    base = dict([((r['board'], r['mode']), r['seconds']) for r in results
+                 if r['workers'] == fewest])
+    for result in results:
+        result['speedup'] = base[(result['board'], result['mode'])] / result['seconds']
+    results.sort(key=lambda r: (r['board'], MODES.index(r['mode']), r['workers']))
+    return results
+
+def table(results, columns=COLUMNS) :
+    "The results, as a text table."
+    def cell(result, column):
+        if column == 'ms':
+            return '%.1f' % (result['seconds'] * 1000)
+        value = result.get(column)
+        if value is None:
+            return ''
+        if column == 'reduction':
+            return '%.0f%%' % (value * 100)
+        if column == 'speedup':
+            return '%.2fx' % value
+        return '%g' % value if isinstance(value, float) else str(value)
+    rows = [[cell(result, column) for column in columns] for result in results]
+    widths = [max([len(column)] + [len(row[i]) for row in rows])
+              for i, column in enumerate(columns)]
+    lines = ['  '.join([column.ljust(width)
+                        for column, width in zip(columns, widths)]).rstrip()]
+    for row in rows:
+        lines.append('  '.join([value.ljust(width)
+                                for value, width in zip(row, widths)]).rstrip())
+    if 'mode' in columns:
+        return '\n'.join(lines + [''] + scaling_totals(results))
+    totals = {}
+    for result in results:
+        totals[result['search']] = totals.get(result['search'], 0) + result['evaluations']
+    if 'fixed' in totals and totals['fixed']:
+        lines.append('')
+        for name in [s for s in SEARCHES if s in totals]:
+            lines.append('%s: %i evaluations in all, %.0f%% fewer than fixed'
+                         % (name, totals[name],
+                            100 * (1 - float(totals[name]) / totals['fixed'])))
+    return '\n'.join(lines)
+
+def scaling_totals(results) :
+    "A line for each mode and number of workers, with the time for all boards."
+    totals = {}
+    for result in results:
+        key = (MODES.index(result['mode']), result['workers'])
+        totals[key] = totals.get(key, 0) + result['seconds']
+    lines = []
+    for mode_index, workers in sorted(totals):
+        fewest = min([w for m, w in totals if m == mode_index])
+        lines.append('%s with %i worker%s: %.1f ms in all, %.2fx as fast as %i'
+                     % (MODES[mode_index], workers, '' if workers == 1 else 's',
+                        totals[(mode_index, workers)] * 1000,
+                        totals[(mode_index, fewest)] / totals[(mode_index, workers)],
+                        fewest))
+    return lines
+
+def main(argv=None) :
+    parser = argparse.ArgumentParser(
+        description="Compare move orderings for progressive deepening on the boards in boards.py.")
+    parser.add_argument('--depth', type=int, default=4,
+                        help="depth_limit for progressive_deepening")
+    parser.add_argument('--boards', default='',
+                        help="comma-separated board names (by default, all)")
+    parser.add_argument('--searches', default=','.join(SEARCHES),
+                        help="comma-separated searches: " + ', '.join(SEARCHES))
+    parser.add_argument('--repeat', type=int, default=1,
+                        help="report the best time of this many runs")
+    parser.add_argument('--scaling', default='',
+                        help="comma-separated numbers of workers, to compare parallel searches")
+    parser.add_argument('--modes', default=','.join(MODES),
+                        help="comma-separated parallel searches: " + ', '.join(MODES))
+    parser.add_argument('--json', action='store_true',
+                        help="print JSON instead of a table")
+    parser.add_argument('--output', help="write the results here")
+    args = parser.parse_args(argv)
+    if args.repeat < 1:
+        parser.error("--repeat must be at least 1")
+
+    board_names = [s for s in args.boards.split(',') if s]
+    if args.scaling:
+        modes = [s for s in args.modes.split(',') if s]
+        for name in modes:
+            if name not in MODES:
+                parser.error("unknown mode " + name)
+        worker_counts = [int(s) for s in args.scaling.split(',') if s]
+        results = run_scaling(modes, worker_counts, board_names, args.depth,
+                              args.repeat)
+        columns = SCALING_COLUMNS
+    else:
+        searches = [s for s in args.searches.split(',') if s]
+        for name in searches:
+            if name not in SEARCHES:
+                parser.error("unknown search " + name)
+        results = run(searches, board_names, args.depth, args.repeat)
+        columns = COLUMNS
+    if args.json:
+        text = json.dumps({'python': sys.version.split()[0],
+                           'cpus': os.cpu_count(),
+                           'depth': args.depth,
+                           'benchmarks': results}, indent=2)
+    else:
+        text = table(results, columns)
+    if args.output:
+        with open(args.output, 'w') as out:
+            out.write(text + '\n')
+    else:
+        print(text)
+
+if __name__ == '__main__':
+    main()
@@ -1,5 +1,6 @@
 # MIT 6.034 Lab 3: Games
 
+import random
 from copy import deepcopy
 from functools import reduce
 
@@ -57,23 +58,94 @@ class AbstractGameState :
         return deepcopy(self)
 
 
+def _count_bits(bits):
+    return bin(bits).count('1')
+
+def _zobrist_keys(num_bits, seed=6034):
+    """Random 64-bit numbers for Zobrist hashing, one for each type of piece
+    at each bit of a bitboard.  The seed is fixed, so that every process
+    hashes the same board to the same key."""
+    rnd = random.Random(seed)
+    return [[rnd.getrandbits(64) for bit in range(num_bits)] for piece in (1, 2)]
+
 class ConnectFourBoard :
     num_rows = 6  # board height
     num_cols = 7  # board width
 
+    # The pieces are kept as two bitboards (ints), one for each type of piece,
+    # in self.bitboards.  Each column has num_rows + 1 bits, starting from the
+    # bottom: the piece in column c at height h (0 is the bottom row) is bit
+    # c*(num_rows+1) + h.  The extra bit at the top of each column is never
+    # set, so shifting a bitboard can't carry a line of pieces from the top of
+    # one column to the bottom of the next.  self.heights holds the height of
+    # each column, and self.num_pieces the number of pieces.
+    column_bits = num_rows + 1
+
+    # self.zobrist_key is the XOR of zobrist_keys[piece - 1][bit] for every
+    # piece on the board, kept up to date as pieces are added and removed.
+    zobrist_keys = _zobrist_keys(num_cols * column_bits)
+
+    # The lines chains are found along, built the first time they're needed;
+    # see __chain_lines__.
+    _chain_lines = None
+
     def __init__(self, board_array=None, players=['Player One','Player Two'],
                  whose_turn=None) :
         """A board array is a list of rows. The pieces are either 0 (no player), 1, or 2."""
         if (not isinstance(players, (list, tuple))) or len(players) != 2:
             raise TypeError("Expected list of two players, got "+str(players))
-        if not board_array :
-            board_array = [[0 for c in range(ConnectFourBoard.num_cols)] for r in range(ConnectFourBoard.num_rows)]
-        self.board_array = [ [x if x is not 0 else None for x in row] for row in board_array]
+        self.board_array = board_array
         self.prev_move_string = 'none'
         self.players = players[:]
         self.whose_turn = whose_turn if whose_turn in players else players[0]
         if self.whose_turn != self.players[0] :
             self.players.reverse()
+        self._moves = []
+
+    @property
+    def board_array(self):
+        """The board as a list of rows, the top row first, with None where
+        there's no piece.  This is made from the bitboards each time."""
+        ones, twos = self.bitboards
+        rows = []
+        for h in reversed(range(self.num_rows)):
+            row = []
+            for bit in [1 << (col * self.column_bits + h)
+                        for col in range(self.num_cols)]:
+                row.append(1 if ones & bit else 2 if twos & bit else None)
+            rows.append(row)
+        return rows
+
+    @board_array.setter
+    def board_array(self, board_array):
+        if not board_array :
+            board_array = [[0 for c in range(ConnectFourBoard.num_cols)] for r in range(ConnectFourBoard.num_rows)]
+        bitboards = [0, 0]
+        zobrist_key = 0
+        for row_index, row in enumerate(board_array):
+            for col_index, x in enumerate(row):
+                if not x:
+                    continue
+                if x not in (1, 2):
+                    raise ValueError("Expected piece 0, 1 or 2, got " + str(x))
+                position = self.__position__(col_index, row_index)
+                bitboards[x - 1] |= 1 << position
+                zobrist_key ^= self.zobrist_keys[x - 1][position]
+        self.bitboards = bitboards
+        self.zobrist_key = zobrist_key
+        self.heights = [self.__height__(col) for col in range(self.num_cols)]
+        self.num_pieces = _count_bits(bitboards[0]) + _count_bits(bitboards[1])
+        self._chains = None
+
+    def __position__(self, col, row) :
+        "Return the bit for (col, row), where row 0 is the top row."
+        return col * self.column_bits + (self.num_rows - 1 - row)
+
+    def __height__(self, col) :
+        "Count the pieces at the bottom of the column, up to the first gap."
+        ones, twos = self.bitboards
+        column = ((ones | twos) >> (col * self.column_bits)) & ((1 << self.num_rows) - 1)
+        return ((column + 1) & ~column).bit_length() - 1
 
     def get_current_player_name(self) :
         """Return the current player. By default, 'Player One' or 'Player Two'."""
@@ -97,7 +169,19 @@ class ConnectFourBoard :
         return p if self.__piece_type__(p) == player_number else q
 
     def get_piece(self, col, row) :
-        return self.board_array[row][col]
+        # Negative indexes count from the end, as they did in board_array.
+        if -self.num_rows <= row < 0:
+            row += self.num_rows
+        if -self.num_cols <= col < 0:
+            col += self.num_cols
+        if not (0 <= row < self.num_rows and 0 <= col < self.num_cols):
+            raise IndexError("No square at col " + str(col) + ", row " + str(row))
+        bit = 1 << self.__position__(col, row)
+        if self.bitboards[0] & bit:
+            return 1
+        if self.bitboards[1] & bit:
+            return 2
+        return None
 
     def count_pieces(self, current_player=None) :
         """Return the total number of pieces on the board. If player is
@@ -105,23 +189,18 @@ class ConnectFourBoard :
         if current_player not in [True, False, None]:
             raise TypeError("Expected boolean value for current_player, got "
                             + str(current_player))
+        if current_player is None:
+            return self.num_pieces
         piece_type = self.__piece_type__(self.get_current_player_name() if current_player else self.get_other_player_name())
-        player_test = (lambda x: x) if current_player is None else (lambda piece: piece == piece_type)
-        return len(list(filter(player_test, sum(self.board_array,[]))))
+        return _count_bits(self.bitboards[piece_type - 1])
 
     def get_column_height(self, col_number) :
         """Return the number of pieces in the column; e.g., 0 if the column is empty."""
-        height = 0
-        for row in reversed(self.board_array) :
-            if row[col_number] :
-                height += 1
-            else :
-                break
-        return height
+        return self.heights[col_number]
 
     def is_column_full(self, col_number) :
         "Return True if column is full, False otherwise"
-        return self.get_column_height(col_number) == ConnectFourBoard.num_rows
+        return self.heights[col_number] == ConnectFourBoard.num_rows
 
     def add_piece(self, col_number, player=None) :
         """Adds a piece belonging to the player to the given column.
@@ -131,22 +210,93 @@ class ConnectFourBoard :
             raise IndexError("Can't add piece to full column "+str(col_number)+".")
 
         player = player or self.whose_turn
-        piece_type = self.__piece_type__(player)
         new_board = self.copy()
-        height = 1 + new_board.get_column_height(col_number)
-        new_board.board_array[-height][col_number] = piece_type
-        new_board.prev_move_string = ("Put " + str(player)
-                                      + "'s piece in col " + str(col_number))
-        # adding a piece causes the current player to swap
-        new_board.set_current_player_name(new_board.players[1])
+        new_board._moves = []  # it can't undo what led to it
+        new_board.__play__(col_number, player)
         return new_board
 
+    def apply_move(self, col_number, player=None) :
+        """Like add_piece, but adds the piece to this board instead of
+        returning a new one.  undo_move takes it back."""
+        if self.is_column_full(col_number) :
+            raise IndexError("Can't add piece to full column "+str(col_number)+".")
+        self._moves.append((col_number, self.heights[col_number],
+                            self.prev_move_string, self.players[:]))
+        self.__play__(col_number, player or self.whose_turn)
+        return self
+
+    def undo_move(self) :
+        """Take back the last move made with apply_move, restoring the
+        previous move string and the current player."""
+        if not self._moves :
+            raise IndexError("No move to undo.")
+        col_number, height, self.prev_move_string, players = self._moves.pop()
+        position = col_number * self.column_bits + height
+        bit = 1 << position
+        piece_type = 1 if self.bitboards[0] & bit else 2
+        self.zobrist_key ^= self.zobrist_keys[piece_type - 1][position]
+        self.bitboards = [self.bitboards[0] & ~bit, self.bitboards[1] & ~bit]
+        self.heights[col_number] = height
+        self.num_pieces -= 1
+        self.players = players
+        self.whose_turn = players[0]
+        self._chains = None
+        return self
+
+    def __play__(self, col_number, player) :
+        # Put the player's piece on top of the column, and swap players.
+        piece_type = self.__piece_type__(player)
+        position = col_number * self.column_bits + self.heights[col_number]
+        bit = 1 << position
+        self.zobrist_key ^= self.zobrist_keys[piece_type - 1][position]
+        if piece_type == 1:
+            self.bitboards = [self.bitboards[0] | bit, self.bitboards[1]]
+        else:
+            self.bitboards = [self.bitboards[0], self.bitboards[1] | bit]
+        self.heights[col_number] = self.__height__(col_number)
+        self.num_pieces += 1
+        self._chains = None
+        self.prev_move_string = ("Put " + str(player)
+                                 + "'s piece in col " + str(col_number))
+        # adding a piece causes the current player to swap
+        self.set_current_player_name(self.players[1])
+
     def describe_previous_move(self) :
         "Returns a string describing the most recent move leading to current state"
         return self.prev_move_string
 
     def copy(self) :
-        return deepcopy(self)
+        new_board = self.__class__.__new__(self.__class__)
+        new_board.__dict__.update(self.__dict__)
+        new_board.heights = self.heights[:]
+        new_board.players = self.players[:]
+        new_board._moves = self._moves[:]
+        return new_board
+
+    def __deepcopy__(self, memo) :
+        return self.copy()
+
+    def has_four_in_a_row(self, current_player=None) :
+        """Return True if there are four pieces of the same type in a row
+        (horizontally, vertically or diagonally).  If player is provided,
+        only looks at that player's pieces."""
+        if current_player not in [True, False, None]:
+            raise TypeError("Expected boolean value for current_player, got "
+                            + str(current_player))
+        if current_player is None:
+            bitboards = self.bitboards
+        else:
+            piece_type = self.__piece_type__(self.get_current_player_name() if current_player else self.get_other_player_name())
+            bitboards = [self.bitboards[piece_type - 1]]
+        # A shift of 1 is one step up a column, column_bits one step right,
+        # and one less or more than that a step along a diagonal.
+        shifts = [1, self.column_bits, self.column_bits - 1, self.column_bits + 1]
+        for pieces in bitboards:
+            for shift in shifts:
+                pairs = pieces & (pieces >> shift)
+                if pairs & (pairs >> (2 * shift)):
+                    return True
+        return False
 
     def __get_line__(self, col, row, dx, dy) :
         """Return the list of pieces you get starting at (col, row) and
@@ -175,51 +325,88 @@ class ConnectFourBoard :
         if current_player not in [True, False, None]:
             raise TypeError("Expected boolean value for current_player, got "
                             + str(current_player))
+        if self._chains is None:
+            chains = self.__singleton_runs__()
+            for direction in ['horizontal', 'vertical', 'northeast', 'northwest']:
+                chains += [run for run in self.__runs__(direction) if run[1] > 1]
+            self._chains = chains
+        if current_player is None:
+            return [[piece] * length for piece, length in self._chains]
         piece_type = self.__piece_type__(self.get_current_player_name() if current_player else self.get_other_player_name())
-        player_test = (lambda chain: True) if current_player is None else (lambda chain : chain[0] == piece_type)
-
-        ret = []
-        ret += self.get_singleton_chains()
-        ret += self.get_horizontal_chains(False)
-        ret += self.get_vertical_chains(False)
-        ret += self.get_northeast_chains(False)
-        ret += self.get_northwest_chains(False)
-
-        ret = list(filter(player_test, ret))
 
-        # Uncomment these lines to print chains as lists of player names instead of lists of 1's and 2's:
-        #whose = self.__whose_piece__()
-        #return map(lambda x: map(lambda y: whose.get(y),x) , ret)
-
-        return ret
+        return [[piece] * length for piece, length in self._chains
+                if piece == piece_type]
 
     def get_singleton_chains(self):
-        def has_twin_in_neighbors(col, row):
-            "returns True if piece has a neighbor of same type, else False"
-            piece_type = self.get_piece(col, row)
-            for x in [col-1, col, col+1]:
-                for y in [row-1, row, row+1]:
-                    if ((x, y) == (col, row) or x < 0 or y < 0
-                        or x >= self.num_cols or y >= self.num_rows):
-                        continue
-                    if self.get_piece(x, y) == piece_type:
-                        return True
-            return False
-
-        singleton_chains = []
-        for row_index in range(self.num_rows):
-            for col_index in range(self.num_cols):
-                piece_type = self.get_piece(col_index, row_index)
-                if piece_type is None or has_twin_in_neighbors(col_index, row_index):
-                    continue
-                singleton_chains.append([piece_type])
-        return singleton_chains
+        return [[piece] * length for piece, length in self.__singleton_runs__()]
+
+    def __singleton_runs__(self):
+        "Return (piece, 1) for each piece with no neighbor of the same type."
+        singletons = 0
+        for pieces in self.bitboards:
+            neighbors = 0
+            for shift in [1, self.column_bits - 1, self.column_bits, self.column_bits + 1]:
+                neighbors |= (pieces << shift) | (pieces >> shift)
+            singletons |= pieces & ~neighbors
+        if not singletons:
+            return []
+        ones = self.bitboards[0]
+        return [(1 if ones & bit else 2, 1)
+                for bit in self.__chain_lines__()['rows'] if singletons & bit]
 
     def get_horizontal_chains(self, includeSingletons=False):
-        return self.__get_non_diagonal_chains__(1, 0, includeSingletons) # horizontal rightward
+        return self.__get_chains__('horizontal', includeSingletons) # horizontal rightward
 
     def get_vertical_chains(self, includeSingletons=False):
-        return self.__get_non_diagonal_chains__(0, 1, includeSingletons) #vertical downward
+        return self.__get_chains__('vertical', includeSingletons) #vertical downward
+
+    def __get_chains__(self, direction, includeSingletons=False):
+        return [[piece] * length for piece, length in self.__runs__(direction)
+                if includeSingletons or length > 1]
+
+    def __runs__(self, direction):
+        """Return (piece, length) for each maximal contiguous chain along the
+        lines in one direction, in order."""
+        ones, twos = self.bitboards
+        occupied = ones | twos
+        runs = []
+        for line_bits, bits in self.__chain_lines__()[direction]:
+            if not occupied & line_bits:
+                continue
+            piece, length = None, 0
+            for bit in bits:
+                x = 1 if ones & bit else 2 if twos & bit else None
+                if x == piece:
+                    length += 1
+                    continue
+                if piece:
+                    runs.append((piece, length))
+                piece, length = x, 1
+            if piece:
+                runs.append((piece, length))
+        return runs
+
+    def __chain_lines__(self):
+        """The lines of the board, for each direction, as (all of the line's
+        bits, each bit along the line), in the same order as
+        __get_non_diagonal_chains__ and __get_diagonal_chains__; and 'rows',
+        every bit in reading order."""
+        if ConnectFourBoard._chain_lines is None:
+            def to_bits(indexes):
+                bits = [1 << self.__position__(c, r) for c, r in indexes]
+                return (sum(bits), bits)
+            rows, cols = range(self.num_rows), range(self.num_cols)
+            lines = {
+                'horizontal': [[(c, r) for c in cols] for r in rows],
+                'vertical': [[(c, r) for r in rows] for c in cols],
+                'northeast': [x for x in self.__get_diagonal_indexes__(+1, -1) if x],
+                'northwest': [x for x in self.__get_diagonal_indexes__(-1, -1) if x]}
+            chain_lines = dict([(direction, list(map(to_bits, indexes)))
+                                for direction, indexes in lines.items()])
+            chain_lines['rows'] = [1 << self.__position__(c, r)
+                                   for r in rows for c in cols]
+            ConnectFourBoard._chain_lines = chain_lines
+        return ConnectFourBoard._chain_lines
 
     def __get_non_diagonal_chains__(self, dx, dy, includeSingletons=False):
         "Get all chains in a particular direction, horizontal or vertical."
@@ -255,10 +442,10 @@ class ConnectFourBoard :
         return ret
 
     def get_northeast_chains(self, includeSingletons=False):
-        return self.__get_diagonal_chains__(+1, -1, includeSingletons)
+        return self.__get_chains__('northeast', includeSingletons)
 
     def get_northwest_chains(self, includeSingletons=False):
-        return self.__get_diagonal_chains__(-1, -1, includeSingletons)
+        return self.__get_chains__('northwest', includeSingletons)
 
     def __get_diagonal_chains__(self, dx, dy=-1, includeSingletons=False):
         indexes = self.__get_diagonal_indexes__(dx, dy, includeSingletons)
@@ -293,8 +480,7 @@ class ConnectFourBoard :
 
     def __piece_type__(self, player=None) :
         player = player or self.whose_turn
-        num_pieces = len([x for x in reduce(lambda a,b:a+b, self.board_array) if bool(x)])
-        return [1,2][((player != self.whose_turn) + num_pieces) % 2]
+        return [1,2][((player != self.whose_turn) + self.num_pieces) % 2]
 
     def __whose_piece__(self) :
         """Return a dictionary sending piece symbol to player name."""
@@ -304,11 +490,11 @@ class ConnectFourBoard :
         """Given two ConnectFourBoard objects, returns True if they have pieces in
         the same places (that is, same .board_array attribute), otherwise False."""
         return (is_class_instance(other, 'ConnectFourBoard')
-                and (self.board_array == other.board_array))
+                and (self.bitboards == other.bitboards))
 
     def __eq__(self, other):
         return (is_class_instance(other, 'ConnectFourBoard')
-                and (self.board_array == other.board_array)
+                and (self.bitboards == other.bitboards)
                 and (self.prev_move_string == other.prev_move_string)
                 and (self.players == other.players)
                 and (self.whose_turn == other.whose_turn))
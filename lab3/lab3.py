@@ -4,6 +4,11 @@
 from game_api import *
 from boards import *
 from toytree import GAME1
+from transposition import TranspositionTable
+from ordering import MoveOrdering
+from alphabeta import alphabeta_search
+from anytime import timed_progressive_deepening
+from parallel import ParallelSearch
 
 INF = float('inf')
 
@@ -13,9 +18,8 @@ INF = float('inf')
 
 def is_game_over_connectfour(board):
     """Returns True if game is over, otherwise False."""
-    for chain in board.get_all_chains():
-        if len(chain) >= 4:
-            return True
+    if board.has_four_in_a_row():
+        return True
     for col in range(board.num_cols):
         if not board.is_column_full(col):
             return False
@@ -34,12 +38,10 @@ def next_boards_connectfour(board):
 def endgame_score_connectfour(board, is_current_player_maximizer):
     """Given an endgame board, returns 1000 if the maximizer has won,
     -1000 if the minimizer has won, or 0 in case of a tie."""
-    for chain in board.get_all_chains(is_current_player_maximizer):
-        if len(chain) >= 4:
-            return 1000
-    for chain in board.get_all_chains(not is_current_player_maximizer):
-        if len(chain) >= 4:
-            return -1000
+    if board.has_four_in_a_row(is_current_player_maximizer):
+        return 1000
+    if board.has_four_in_a_row(not is_current_player_maximizer):
+        return -1000
     return 0
 
 def endgame_score_connectfour_faster(board, is_current_player_maximizer):
@@ -186,9 +188,32 @@ def minimax_search(state, heuristic_fn=always_zero, depth_limit=INF, maximize=Tr
 
 
 def minimax_search_alphabeta(state, alpha=-INF, beta=INF, heuristic_fn=always_zero,
-                             depth_limit=INF, maximize=True) :
+                             depth_limit=INF, maximize=True, transposition_table=None,
+                             move_ordering=None, workers=None, lazy_smp=False) :
     """"Performs minimax with alpha-beta pruning. Same return type 
-    as dfs_maximizing."""
+    as dfs_maximizing.  If a TranspositionTable is given, positions already
+    in it aren't searched again (see transposition.py); if a MoveOrdering is
+    given, the best-looking moves are searched first (see ordering.py).  With
+    a number of workers, searches in that many processes, splitting up the
+    moves from the state or, with lazy_smp, sharing a transposition table
+    (see parallel.py); the score is the same, but the path may be a
+    different one of the equally good ones, and the evaluations are counted
+    over all of the workers.  Workers can't be combined with a
+    TranspositionTable or MoveOrdering, since they use their own.  The
+    processes are started for this one search; to keep them for the next
+    one, pass a ParallelSearch as workers instead, and close it when done."""
+    if workers is not None and (transposition_table is not None
+                                or move_ordering is not None):
+        raise ValueError("minimax_search_alphabeta can't use workers with a "
+                         "transposition_table or move_ordering")
+    if isinstance(workers, ParallelSearch):
+        return workers.search(state, alpha, beta, heuristic_fn, depth_limit, maximize)
+    if workers is not None:
+        with ParallelSearch(workers, lazy_smp) as search:
+            return search.search(state, alpha, beta, heuristic_fn, depth_limit, maximize)
+    if transposition_table is not None or move_ordering is not None:
+        return alphabeta_search(state, alpha, beta, heuristic_fn, depth_limit,
+                                maximize, transposition_table, move_ordering)
     if state.is_game_over():
         return ([state], state.get_endgame_score(maximize), 1)
     elif depth_limit == 0:
@@ -232,12 +257,38 @@ def minimax_search_alphabeta(state, alpha=-INF, beta=INF, heuristic_fn=always_ze
 
 
 def progressive_deepening(state, heuristic_fn=always_zero, depth_limit=INF,
-                          maximize=True) :
+                          maximize=True, transposition_table=None, move_ordering=None,
+                          time_limit=None, workers=None, lazy_smp=False) :
     """Runs minimax with alpha-beta pruning. At each level, updates anytime_value
-    with the tuple returned from minimax_search_alphabeta. Returns anytime_value."""
+    with the tuple returned from minimax_search_alphabeta. Returns anytime_value.
+    If a TranspositionTable or MoveOrdering is given, every level uses it, so
+    each one starts with the best moves found by the levels before.  With a
+    time_limit (in seconds), returns once it has passed, with the levels that
+    finished by then (see anytime.py).  With workers, every level is searched
+    in the same worker processes (see minimax_search_alphabeta)."""
+    if time_limit is not None and workers is not None:
+        raise ValueError("progressive_deepening can't use workers with a time_limit")
+    if workers is not None and (transposition_table is not None
+                                or move_ordering is not None):
+        raise ValueError("progressive_deepening can't use workers with a "
+                         "transposition_table or move_ordering")
+    if workers is not None and not isinstance(workers, ParallelSearch):
+        with ParallelSearch(workers, lazy_smp) as search:
+            return progressive_deepening(state, heuristic_fn, depth_limit, maximize,
+                                         transposition_table, move_ordering,
+                                         workers=search)
+    if time_limit is not None:
+        return timed_progressive_deepening(state, heuristic_fn, depth_limit, maximize,
+                                           time_limit, transposition_table, move_ordering)
     anytime_value = AnytimeValue()
+    if transposition_table is not None:
+        transposition_table.new_search(heuristic_fn, state)
+    if move_ordering is not None:
+        move_ordering.new_search()
     for d in range(1, depth_limit+1):
-        anytime_value.set_value(minimax_search_alphabeta(state, -INF, INF, heuristic_fn, d, maximize))
+        anytime_value.set_value(minimax_search_alphabeta(state, -INF, INF, heuristic_fn, d, maximize,
+                                                         transposition_table, move_ordering,
+                                                         workers))
     return anytime_value
 
 
@@ -0,0 +1,87 @@
+# MIT 6.034 Lab 3: Games
+
+# Move ordering for alpha-beta search.
+#
+# Alpha-beta prunes the most when the best move is searched first.  A
+# MoveOrdering sorts the children of each state by:
+#  1. the principal-variation move (the best move from the last search, or
+#     the transposition table's best move),
+#  2. the killer moves at this ply (recent moves that caused a cutoff in a
+#     sibling's subtree), most recent first,
+#  3. the history heuristic (the total of depth*depth over every cutoff the
+#     move has caused, anywhere in the tree), highest first,
+#  4. a fallback key, by default center_first, and then the order
+#     generate_next_states() gave them in.
+# A move is named by describe_previous_move() of the state it leads to, so
+# in Connect Four it's the column (and whose piece it is).
+#
+# Any object with the same methods can be used instead: alphabeta_search
+# calls order() for each state it expands, cutoff() for each move that
+# causes a cutoff, and reads and sets pv; new_search() is called when
+# progressive deepening starts.
+
+INF = float('inf')
+
+def center_first(state, child) :
+    """A fallback key for Connect Four: how far the column of the move from
+    state to child is from the middle column.  For other games, 0."""
+    board, new_board = state.get_snapshot(), child.get_snapshot()
+    bitboards = getattr(board, 'bitboards', None)
+    if bitboards is None:
+        return 0
+    added = ((new_board.bitboards[0] | new_board.bitboards[1])
+             & ~(bitboards[0] | bitboards[1]))
+    if not added:
+        return 0
+    col = (added.bit_length() - 1) // board.column_bits
+    return abs(2 * col - (board.num_cols - 1))
+
+class MoveOrdering :
+    def __init__(self, killers=2, history=True, fallback_key=center_first) :
+        self.num_killers = killers
+        self.use_history = history
+        self.fallback_key = fallback_key
+        self.killers = {}   # ply -> list of move names
+        self.history = {}   # move name -> score
+        self.pv = None      # (root state, moves) from the last search
+
+    def new_search(self) :
+        """Forget the killer moves and the principal variation, and halve the
+        history scores, so that newer cutoffs count for more."""
+        self.killers = {}
+        self.pv = None
+        self.history = dict([(move, score // 2)
+                             for move, score in self.history.items() if score > 1])
+
+    def order(self, state, children, ply, first=None) :
+        "Return the indexes of children, in the order to search them."
+        killers = self.killers.get(ply, [])
+        history = self.history if self.use_history else {}
+        fallback_key = self.fallback_key
+        def key(index) :
+            child = children[index]
+            move = child.describe_previous_move()
+            return (index != first,
+                    killers.index(move) if move in killers else len(killers),
+                    -history.get(move, 0),
+                    fallback_key(state, child) if fallback_key else 0,
+                    index)
+        return sorted(range(len(children)), key=key)
+
+    def cutoff(self, child, ply, depth_limit) :
+        "Remember that the move to child caused a cutoff."
+        move = child.describe_previous_move()
+        if self.num_killers:
+            killers = self.killers.setdefault(ply, [])
+            if move in killers:
+                killers.remove(move)
+            killers.insert(0, move)
+            del killers[self.num_killers:]
+        if self.use_history:
+            depth = depth_limit if depth_limit < INF else 1
+            self.history[move] = self.history.get(move, 0) + depth * depth
+
+    def __str__(self) :
+        return ("<MoveOrdering with %i killers per ply%s>"
+                % (self.num_killers, " and history" if self.use_history else ""))
+    __repr__ = __str__
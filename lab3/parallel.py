@@ -0,0 +1,218 @@
+# MIT 6.034 Lab 3: Games
+
+# Minimax with alpha-beta pruning in a pool of worker processes.
+#
+# ParallelSearch(workers) keeps a pool of processes ready, and its search
+# method returns a (path, score, evaluations) like minimax_search_alphabeta,
+# with the same score.  The path can be a different one of the equally good
+# ones, since the workers order the moves for themselves.  It works for any AbstractGameState that can be
+# pickled: its snapshot, and the game's functions and the heuristic, which
+# have to be defined at the top level of a module (as they are for
+# ConnectFourBoard and ToyTree).  The evaluation count is the total over
+# all of the workers.  Starting the processes takes far longer than a small
+# search, so to search many times (as progressive_deepening does, once per
+# depth), make one ParallelSearch, pass it as the workers argument of
+# minimax_search_alphabeta or progressive_deepening each time, and close it
+# (or use it in a with statement) when done.  There are two ways of
+# splitting up the work:
+#
+# Root splitting (the default): the move from the state that looks best
+# (see MoveOrdering) is searched first, on its own; then the other moves
+# are searched at the same time, one per worker, with the alpha (or beta)
+# the first move gave, so they can be pruned against it.  The score is the
+# same as searching alone.  Moves searched at the same time can't be pruned
+# against each other, so there are usually more evaluations in all.
+#
+# Lazy SMP (lazy_smp=True): every worker runs progressive deepening from the
+# state, all sharing one SharedTranspositionTable (see transposition.py).
+# Worker 0 searches the moves in the usual order (with a MoveOrdering); the
+# others go through them in shuffled orders, half of them a level deeper,
+# so that they fill the table with positions worker 0 will come to.  Once
+# worker 0 has finished depth_limit, the others are stopped, and worker 0's
+# result is returned.  With an infinite depth_limit, there are no levels:
+# every worker searches the whole tree, in its own order.
+#
+# With workers=1 there is still a pool of one process, so that scaling can
+# be measured against it.
+
+import multiprocessing
+import os
+import random
+
+from game_api import always_zero
+from transposition import SharedTranspositionTable, scoring_functions
+from ordering import MoveOrdering
+from alphabeta import SearchAborted, alphabeta_search, search_to_depth
+
+INF = float('inf')
+
+# The shared table (for Lazy SMP) and the Event that stops the helpers, in
+# each worker.
+_table = None
+_stop = None
+
+def _init_worker(table, stop) :
+    global _table, _stop
+    _table, _stop = table, stop
+
+def _search_move(task) :
+    """Search one move from the root, in a worker process."""
+    index, state, alpha, beta, heuristic_fn, depth_limit, maximize = task
+    return (index,) + alphabeta_search(state, alpha, beta, heuristic_fn,
+                                       depth_limit, maximize, None,
+                                       MoveOrdering())
+
+class _ShuffledOrdering(object) :
+    # For the Lazy SMP helpers: the table's best move first, then the rest
+    # in a random order.
+    def __init__(self, seed) :
+        self.random = random.Random(seed)
+        self.pv = None
+
+    def new_search(self) :
+        pass
+
+    def order(self, state, children, ply, first=None) :
+        order = list(range(len(children)))
+        self.random.shuffle(order)
+        if first in order:
+            order.remove(first)
+            order.insert(0, first)
+        return order
+
+    def cutoff(self, child, ply, depth_limit) :
+        pass
+
+def _lazy_smp_worker(task) :
+    """Run progressive deepening from the root, in a worker process.  Returns
+    (worker id, the result of the deepest level finished, the number of
+    static evaluations in all)."""
+    worker_id, state, alpha, beta, heuristic_fn, depth_limit, maximize, generation = task
+    _table.functions = scoring_functions(state, heuristic_fn)
+    _table.generation = generation
+    if worker_id == 0:
+        ordering, stop, extra_depth = MoveOrdering(), None, 0
+    else:
+        ordering, stop, extra_depth = _ShuffledOrdering(worker_id), _stop, worker_id % 2
+    result, evaluations = None, 0
+    depth = 1 if depth_limit < INF else INF
+    try:
+        while depth <= depth_limit:
+            level, solved = search_to_depth(state, alpha, beta, heuristic_fn,
+                                            min(depth + extra_depth, depth_limit),
+                                            maximize, _table, ordering, stop)
+            result = level
+            evaluations += level[2]
+            if solved or depth == INF:
+                break
+            depth += 1
+    except SearchAborted:
+        pass
+    return (worker_id, result, evaluations)
+
+class ParallelSearch :
+    def __init__(self, workers=None, lazy_smp=False, table_size=2**16) :
+        if workers is None:
+            workers = os.cpu_count() or 1
+        if workers < 1:
+            raise ValueError("workers must be at least 1")
+        self.workers = workers
+        self.lazy_smp = lazy_smp
+        if 'fork' in multiprocessing.get_all_start_methods():
+            context = multiprocessing.get_context('fork')
+        else:
+            context = multiprocessing.get_context()
+        self.table = SharedTranspositionTable(table_size) if lazy_smp else None
+        self.stop = context.Event()
+        self.pool = context.Pool(workers, _init_worker, (self.table, self.stop))
+
+    def search(self, state, alpha=-INF, beta=INF, heuristic_fn=always_zero,
+               depth_limit=INF, maximize=True) :
+        """Performs minimax with alpha-beta pruning in the worker processes.
+        Same return type as dfs_maximizing."""
+        if depth_limit == 0 or state.is_game_over():
+            return alphabeta_search(state, alpha, beta, heuristic_fn,
+                                    depth_limit, maximize)
+        if self.lazy_smp:
+            return self.__lazy_smp__(state, alpha, beta, heuristic_fn,
+                                     depth_limit, maximize)
+        return self.__root_split__(state, alpha, beta, heuristic_fn,
+                                   depth_limit, maximize)
+
+    def __root_split__(self, state, alpha, beta, heuristic_fn, depth_limit,
+                       maximize) :
+        children = state.generate_next_states()
+        order = MoveOrdering().order(state, children, 0)
+        def task(index, alpha, beta):
+            return (index, children[index], alpha, beta, heuristic_fn,
+                    depth_limit - 1, not maximize)
+
+        results = {}
+        first = order[0]
+        results[first] = self.pool.apply(_search_move, (task(first, alpha, beta),))[1:]
+        first_score = results[first][1]
+        window = (max(alpha, first_score), beta) if maximize else (alpha, min(beta, first_score))
+        if window[0] < window[1]:
+            tasks = [task(index, window[0], window[1]) for index in order[1:]]
+            for result in self.pool.imap_unordered(_search_move, tasks):
+                results[result[0]] = result[1:]
+
+        # Choose as a search that went through the moves in 'order' would.
+        best_path = []
+        evaluations = 0
+        for index in order:
+            if index not in results:
+                continue
+            path, score, count = results[index]
+            evaluations += count
+            if maximize:
+                if score > alpha:
+                    alpha = score
+                    best_path = path
+            else:
+                if score < beta:
+                    beta = score
+                    best_path = path
+        return ([state] + best_path, alpha if maximize else beta, evaluations)
+
+    def __lazy_smp__(self, state, alpha, beta, heuristic_fn, depth_limit,
+                     maximize) :
+        self.table.new_search(heuristic_fn, state)
+        self.stop.clear()
+        pending = [self.pool.apply_async(_lazy_smp_worker,
+                                         ((worker_id, state, alpha, beta,
+                                           heuristic_fn, depth_limit, maximize,
+                                           self.table.generation),))
+                   for worker_id in range(self.workers)]
+        try:
+            worker_id, result, evaluations = pending[0].get()
+        finally:
+            self.stop.set()
+            helpers = [p.get() for p in pending[1:]]
+            self.stop.clear()
+        evaluations += sum([count for _, _, count in helpers])
+        path, score, _ = result
+        return ([state] + path[1:], score, evaluations)
+
+    def close(self) :
+        self.pool.close()
+        self.pool.join()
+
+    def terminate(self) :
+        self.pool.terminate()
+        self.pool.join()
+
+    def __enter__(self) :
+        return self
+
+    def __exit__(self, *exc_info) :
+        if exc_info[0] is None:
+            self.close()
+        else:
+            self.terminate()
+
+    def __str__(self) :
+        return ("<ParallelSearch with %i worker%s%s>"
+                % (self.workers, "" if self.workers == 1 else "s",
+                   ", Lazy SMP" if self.lazy_smp else ""))
+    __repr__ = __str__
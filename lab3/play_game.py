@@ -11,6 +11,9 @@ from boards import *
 from lab3 import *
 
 TESTING = False
+# Seconds the AI may take for each move.  If set, it searches as deep as it
+# can in that time (but no deeper than the depth limit).
+TIME_LIMIT = None
 QUIT = ['q', 'Q', 'quit', 'Quit', 'QUIT']
 YES = ['y', 'yes', 'Y', 'Yes', 'YES']
 NO = ['n', 'no', 'N', 'No', 'NO']
@@ -95,9 +98,18 @@ def print_ai_move(state):
     print('\nAI move:', description)
 
 
-def ai_turn(state, depth_limit):
-    alphabeta_ret = minimax_search_alphabeta(
-        state, -INF, INF, heuristic_connectfour, depth_limit)
+def ai_turn(state, depth_limit, time_limit=None):
+    time_limit = TIME_LIMIT if time_limit is None else time_limit
+    if time_limit is None:
+        alphabeta_ret = minimax_search_alphabeta(
+            state, -INF, INF, heuristic_connectfour, depth_limit)
+    else:
+        alphabeta_ret = progressive_deepening(
+            state, heuristic_connectfour, depth_limit, True,
+            TranspositionTable(), MoveOrdering(), time_limit).get_value()
+        if alphabeta_ret is None:
+            # Not even depth 1 finished in time, so take the first move.
+            alphabeta_ret = ([state, state.generate_next_states()[0]], None, 0)
     new_state = alphabeta_ret[0][1]
     print_ai_move(new_state)
     return new_state
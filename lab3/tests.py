@@ -6,6 +6,8 @@ from boards import *
 from lab3 import (next_boards_connectfour, is_game_over_connectfour,
                   endgame_score_connectfour, endgame_score_connectfour_faster,
                   minimax_search)
+from transposition import TranspositionTable
+import time
 INF = float('inf')
 lab_number = 3
 
@@ -767,3 +769,211 @@ make_test(type = 'VALUE',
           testanswer = ANSWER_4_testanswer,
           expected_val = "correct value of ANSWER_4 ('1', '2', '3', '4', or '5')",
           name = ANSWER_4_getargs)
+
+
+## progressive_deepening with a time limit
+
+# A heuristic slow enough that the deadline passes while it's running.
+def slow_heuristic(board, maximize) :
+    time.sleep(0.2)
+    return 0
+
+TIMED_TABLE = TranspositionTable()
+TIMED_START = [None]
+
+def progressive_timed_0_getargs() :  #TEST 45
+    TIMED_TABLE.clear()
+    TIMED_START[0] = time.perf_counter()
+    GAME = AbstractGameState(BOARD_EMPTY, is_game_over_connectfour, next_boards_connectfour, endgame_score_connectfour)
+    return [GAME, slow_heuristic, 4, True, TIMED_TABLE, None, 0.01]
+
+def progressive_timed_0_testanswer(val, original_val = None) :
+    """progressive_deepening must return soon after the time limit, even
+    when the heuristic is slow, and once it has returned, the search must not
+    write to the transposition table any more: the caller may be about to use
+    it."""
+    if not is_class_instance(val, 'AnytimeValue'):
+        return False
+    if time.perf_counter() - TIMED_START[0] > 0.15:
+        return False
+    entries = list(TIMED_TABLE.table)
+    time.sleep(0.5)
+    return entries == list(TIMED_TABLE.table)
+
+make_test(type = 'FUNCTION_ENCODED_ARGS',
+          getargs = progressive_timed_0_getargs,
+          testanswer = progressive_timed_0_testanswer,
+          expected_val = ("An AnytimeValue object, returned soon after the " +
+                          "time limit, with the transposition table left " +
+                          "alone once it has been returned"),
+          name = 'progressive_deepening')
+
+
+## ConnectFourBoard's bitboards
+
+# A game played out with apply_move, checked after every move against the
+# pieces kept in a plain list of rows, and then taken back with undo_move.
+BITBOARD_MOVES = [3, 3, 4, 2, 2, 5, 6, 1, 0, 0, 0, 0, 0, 0, 1, 1, 1, 1, 1, 2,
+                  2, 2, 2, 3, 3, 3, 3, 4, 4, 4, 4, 4, 5, 5, 5, 5, 5, 6, 6, 6,
+                  6, 6]
+
+def rows_have_four(rows) :
+    for r in range(len(rows)):
+        for c in range(len(rows[r])):
+            for dr, dc in [(0, 1), (1, 0), (1, 1), (1, -1)]:
+                line = [(r + i*dr, c + i*dc) for i in range(4)]
+                if (all([0 <= y < len(rows) and 0 <= x < len(rows[r]) for y, x in line])
+                    and rows[r][c] and all([rows[y][x] == rows[r][c] for y, x in line])):
+                    return True
+    return False
+
+def bitboard_replay_agrees() :
+    board = ConnectFourBoard()
+    rows = [[None] * board.num_cols for r in range(board.num_rows)]
+    for number, col in enumerate(BITBOARD_MOVES):
+        row = board.num_rows - 1 - board.get_column_height(col)
+        board.apply_move(col)
+        rows[row][col] = 1 + number % 2
+        if (board.board_array != rows
+            or board.has_four_in_a_row() != rows_have_four(rows)
+            or board.zobrist_key != ConnectFourBoard(rows).zobrist_key
+            or board.count_pieces() != number + 1):
+            return False
+    for move in BITBOARD_MOVES:
+        board.undo_move()
+    return board.same_board_array(ConnectFourBoard()) and board.zobrist_key == 0
+
+def bitboard_0_getargs() :  #TEST 46
+    return [BOARD_FULL_TIED]
+
+def bitboard_0_testanswer(val, original_val = None) :
+    return val == True and bitboard_replay_agrees()
+
+make_test(type = 'FUNCTION_ENCODED_ARGS',
+          getargs = bitboard_0_getargs,
+          testanswer = bitboard_0_testanswer,
+          expected_val = ("True, with the board's pieces, four-in-a-row check " +
+                          "and Zobrist key right after every move of a game, " +
+                          "and back to empty after undoing it"),
+          name = 'is_game_over_connectfour')
+
+
+## minimax_search_alphabeta with a transposition table
+
+from lab3 import minimax_search_alphabeta, heuristic_connectfour
+
+def connectfour_game(board) :
+    return AbstractGameState(board, is_game_over_connectfour, next_boards_connectfour, endgame_score_connectfour)
+
+def other_heuristic(board, maximize) :
+    return [-1, 1][maximize] * (board.get_column_height(3) - board.get_column_height(2))
+
+SEARCH_TABLE = TranspositionTable()
+
+def table_0_getargs() :  #TEST 47
+    SEARCH_TABLE.clear()
+    return [connectfour_game(BOARD_UHOH), -INF, INF, heuristic_connectfour, 4, True, SEARCH_TABLE]
+
+def table_0_testanswer(val, original_val = None) :
+    """With a transposition table, the search must find the same path and
+    score as without one, in no more evaluations.  Searching again with the
+    same table needs no evaluations at all, and searching with a different
+    heuristic must not use what the table holds for the old one."""
+    plain = minimax_search_alphabeta(connectfour_game(BOARD_UHOH), -INF, INF, heuristic_connectfour, 4, True)
+    again = minimax_search_alphabeta(connectfour_game(BOARD_UHOH), -INF, INF, heuristic_connectfour, 4, True, SEARCH_TABLE)
+    other = minimax_search_alphabeta(connectfour_game(BOARD_UHOH), -INF, INF, other_heuristic, 4, True, SEARCH_TABLE)
+    other_plain = minimax_search_alphabeta(connectfour_game(BOARD_UHOH), -INF, INF, other_heuristic, 4, True)
+    return (is_dfs_return_type(val) and val[:2] == plain[:2] and val[2] <= plain[2]
+            and again[:2] == plain[:2] and again[2] == 0
+            and other[:2] == other_plain[:2])
+
+make_test(type = 'FUNCTION_ENCODED_ARGS',
+          getargs = table_0_getargs,
+          testanswer = table_0_testanswer,
+          expected_val = ("The same path and score as minimax_search_alphabeta " +
+                          "without a transposition table, in no more evaluations"),
+          name = 'minimax_search_alphabeta')
+
+
+## progressive_deepening with move ordering
+
+from lab3 import progressive_deepening
+from ordering import MoveOrdering
+
+def ordered_deepening_agrees(val, board) :
+    """Ordering the moves (with or without a table) must give the same score
+    at every depth as plain progressive deepening, in no more evaluations."""
+    if not is_class_instance(val, 'AnytimeValue'):
+        return False
+    plain = progressive_deepening(connectfour_game(board), heuristic_connectfour, 4, True).history
+    h = val.history
+    return (all(map(is_dfs_return_type, h)) and len(h) == len(plain)
+            and [x[1] for x in h] == [x[1] for x in plain]
+            and all([x[2] <= y[2] for x, y in zip(h, plain)]))
+
+def ordering_0_getargs() :  #TEST 48
+    return [connectfour_game(BOARD_UHOH), heuristic_connectfour, 4, True, None, MoveOrdering()]
+
+def ordering_0_testanswer(val, original_val = None) :
+    return ordered_deepening_agrees(val, BOARD_UHOH)
+
+make_test(type = 'FUNCTION_ENCODED_ARGS',
+          getargs = ordering_0_getargs,
+          testanswer = ordering_0_testanswer,
+          expected_val = ("An AnytimeValue with the same score at every depth as " +
+                          "without move ordering, in no more evaluations"),
+          name = 'progressive_deepening')
+
+def ordering_1_getargs() :  #TEST 49
+    return [connectfour_game(BOARD_PARTIAL), heuristic_connectfour, 4, True, TranspositionTable(), MoveOrdering()]
+
+def ordering_1_testanswer(val, original_val = None) :
+    return ordered_deepening_agrees(val, BOARD_PARTIAL)
+
+make_test(type = 'FUNCTION_ENCODED_ARGS',
+          getargs = ordering_1_getargs,
+          testanswer = ordering_1_testanswer,
+          expected_val = ("An AnytimeValue with the same score at every depth as " +
+                          "without a table or move ordering, in no more evaluations"),
+          name = 'progressive_deepening')
+
+
+## minimax_search_alphabeta in worker processes
+
+def parallel_agrees(val, board) :
+    """Searching in worker processes must give the same score as searching
+    alone, with a path of moves from the state (though it may be another of
+    the equally good ones)."""
+    plain = minimax_search_alphabeta(connectfour_game(board), -INF, INF, heuristic_connectfour, 4, True)
+    if not is_dfs_return_type(val) or val[1] != plain[1]:
+        return False
+    path = val[0]
+    return (path[0] == connectfour_game(board) and 1 < len(path) <= 5
+            and all([path[i+1] in path[i].generate_next_states()
+                     for i in range(len(path) - 1)]))
+
+def parallel_0_getargs() :  #TEST 50
+    return [connectfour_game(BOARD_UHOH), -INF, INF, heuristic_connectfour, 4, True, None, None, 2]
+
+def parallel_0_testanswer(val, original_val = None) :
+    return parallel_agrees(val, BOARD_UHOH)
+
+make_test(type = 'FUNCTION_ENCODED_ARGS',
+          getargs = parallel_0_getargs,
+          testanswer = parallel_0_testanswer,
+          expected_val = ("The same score as minimax_search_alphabeta in one " +
+                          "process, splitting the moves from the state"),
+          name = 'minimax_search_alphabeta')
+
+def parallel_1_getargs() :  #TEST 51
+    return [connectfour_game(BOARD_PARTIAL), -INF, INF, heuristic_connectfour, 4, True, None, None, 2, True]
+
+def parallel_1_testanswer(val, original_val = None) :
+    return parallel_agrees(val, BOARD_PARTIAL)
+
+make_test(type = 'FUNCTION_ENCODED_ARGS',
+          getargs = parallel_1_getargs,
+          testanswer = parallel_1_testanswer,
+          expected_val = ("The same score as minimax_search_alphabeta in one " +
+                          "process, with Lazy SMP"),
+          name = 'minimax_search_alphabeta')
@@ -0,0 +1,222 @@
+# MIT 6.034 Lab 3: Games
+
+# A transposition table for minimax with alpha-beta pruning.
+#
+# The same position can be reached by playing the same moves in a different
+# order, and alpha-beta would search it again each time.  A
+# TranspositionTable remembers the score of each position it has searched
+# (keyed by the snapshot's zobrist_key, and whether the maximizer is to
+# move), how deep it was searched, whether the score is exact or only a
+# lower or upper bound (because alpha-beta cut the search short), and the
+# moves to the leaf the score came from.  alphabeta_search (in alphabeta.py)
+# uses a score from the table instead of searching again when it was
+# searched at least as deep and the score is good enough for the current
+# alpha and beta, and otherwise searches the move that was best before first.
+#
+# The table holds at most 'size' entries.  With policy='depth', each
+# position has one slot, which is only given to a new entry if it was
+# searched at least as deep as the old one (or the old one is from an
+# earlier search).  With policy='two-tier', each slot has a second place
+# that always takes the newest entry, so recent positions are kept too.
+#
+# Snapshots without a zobrist_key (like ToyTree) are searched as usual,
+# without the table.
+#
+# A score depends on the heuristic and on the game's functions (whether a
+# state is over, its next states, and its endgame score), so the table
+# remembers which ones its scores were found with, and is cleared when a
+# search uses different ones.
+#
+# A SharedTranspositionTable works the same way, but keeps its entries in
+# shared memory, so that worker processes (see parallel.py) can all use it
+# at once.  It takes no locks: each entry is stored with its key XORed with
+# a hash of the rest of the entry, so an entry that one process read while
+# another was halfway through writing it doesn't match any key, and is
+# simply missed.
+
+import ctypes
+import hashlib
+import struct
+from collections import namedtuple
+from multiprocessing.sharedctypes import RawArray
+
+EXACT, LOWER, UPPER = 'exact', 'lower', 'upper'
+
+# Keys for positions with the minimizer to move are XORed with this.
+_MINIMIZER_KEY = 0x5d6e0c2ab1f97f43
+
+# 'moves' are the indexes into generate_next_states() of the moves from the
+# position to the leaf the score came from.
+Entry = namedtuple('Entry', 'key depth score flag moves generation')
+
+def scoring_functions(state, heuristic_fn) :
+    """The functions that the scores of a search of the state depend on."""
+    return (heuristic_fn,
+            getattr(state, 'is_game_over_fn', None),
+            getattr(state, 'generate_next_states_fn', None),
+            getattr(state, 'endgame_score_fn', None))
+
+class TranspositionTable :
+    def __init__(self, size=2**16, policy='two-tier') :
+        if policy not in ('depth', 'two-tier'):
+            raise ValueError("Expected policy 'depth' or 'two-tier', got "
+                             + str(policy))
+        if size < 2:
+            raise ValueError("size must be at least 2")
+        self.size = size
+        self.policy = policy
+        self.ways = 2 if policy == 'two-tier' else 1
+        self.num_slots = size // self.ways
+        self.table = self.__make_table__(self.num_slots * self.ways)
+        self.generation = 0
+        self.functions = None
+        self.probes = 0
+        self.hits = 0
+
+    def key(self, state, maximize) :
+        "Return the key for the state, or None if its snapshot can't be hashed."
+        zobrist_key = getattr(state.get_snapshot(), 'zobrist_key', None)
+        if zobrist_key is None:
+            return None
+        return zobrist_key if maximize else zobrist_key ^ _MINIMIZER_KEY
+
+    def new_search(self, heuristic_fn=None, state=None) :
+        """Start a new search of the state: entries from earlier searches can
+        be replaced by any new entry.  If the heuristic or the game's
+        functions aren't the ones the scores were found with, the table is
+        cleared."""
+        self.generation += 1
+        functions = scoring_functions(state, heuristic_fn)
+        if functions != self.functions:
+            self.clear()
+            self.functions = functions
+
+    def clear(self) :
+        self.table = self.__make_table__(len(self.table))
+
+    # The places entries are kept in; SharedTranspositionTable keeps them
+    # somewhere else.
+    def __make_table__(self, length) :
+        return [None] * length
+
+    def __get_entry__(self, index) :
+        return self.table[index]
+
+    def __set_entry__(self, index, entry) :
+        self.table[index] = entry
+
+    def probe(self, key) :
+        "Return the Entry for the key, or None."
+        self.probes += 1
+        start = (key % self.num_slots) * self.ways
+        for index in range(start, start + self.ways):
+            entry = self.__get_entry__(index)
+            if entry is not None and entry.key == key:
+                return entry
+        return None
+
+    def store(self, key, depth, score, flag, moves) :
+        entry = Entry(key, depth, score, flag, moves, self.generation)
+        start = (key % self.num_slots) * self.ways
+        old = self.__get_entry__(start)
+        if (old is None or old.key == key or old.generation != self.generation
+                or depth >= old.depth):
+            self.__set_entry__(start, entry)
+            if self.ways == 2:
+                # Keep what was displaced in the slot's second place (but not
+                # a second entry for the same key).
+                second = self.__get_entry__(start + 1)
+                if old is not None and old.key != key:
+                    self.__set_entry__(start + 1, old)
+                elif second is not None and second.key == key:
+                    self.__set_entry__(start + 1, None)
+        elif self.ways == 2:
+            self.__set_entry__(start + 1, entry)
+
+    def __len__(self) :
+        return len([index for index in range(len(self.table))
+                    if self.__get_entry__(index) is not None])
+
+    def __str__(self) :
+        return ("<TranspositionTable holding %i of %i entries, %i hits in %i probes>"
+                % (len(self), self.size, self.hits, self.probes))
+    __repr__ = __str__
+
+
+# The most moves a SharedTranspositionTable entry can hold; entries with
+# longer paths aren't stored.
+MAX_SHARED_MOVES = 40
+
+_FLAGS = [EXACT, LOWER, UPPER]
+_INT_SCORE = 0x80
+
+class _SharedEntry(ctypes.Structure):
+    _fields_ = [('check', ctypes.c_uint64),
+                ('score', ctypes.c_double),
+                ('depth', ctypes.c_int32),       # -1 for INF
+                ('generation', ctypes.c_int32),
+                ('flag', ctypes.c_uint8),        # + _INT_SCORE if score is an int
+                ('num_moves', ctypes.c_uint8),
+                ('moves', ctypes.c_uint8 * MAX_SHARED_MOVES)]
+
+def _entry_hash(score, depth, generation, flag, moves) :
+    data = struct.pack('<diiB', score, depth, generation, flag) + bytes(moves)
+    return int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(), 'little')
+
+class SharedTranspositionTable(TranspositionTable) :
+    """A TranspositionTable in shared memory.  Make it before starting the
+    worker processes, and give it to them when they start (for example, in
+    a Pool's initargs)."""
+
+    def __make_table__(self, length) :
+        return RawArray(_SharedEntry, length)
+
+    def clear(self) :
+        ctypes.memset(self.table, 0, ctypes.sizeof(self.table))
+
+    def __get_entry__(self, index) :
+        shared = self.table[index]
+        if not shared.check:
+            return None
+        num_moves = min(shared.num_moves, MAX_SHARED_MOVES)
+        moves = tuple(shared.moves[:num_moves])
+        key = shared.check ^ _entry_hash(shared.score, shared.depth,
+                                         shared.generation, shared.flag, moves)
+        flag = shared.flag & ~_INT_SCORE
+        if flag >= len(_FLAGS):
+            return None
+        score = int(shared.score) if shared.flag & _INT_SCORE else shared.score
+        depth = float('inf') if shared.depth < 0 else shared.depth
+        return Entry(key, depth, score, _FLAGS[flag], moves, shared.generation)
+
+    def __set_entry__(self, index, entry) :
+        shared = self.table[index]
+        if entry is None:
+            shared.check = 0
+            return
+        if len(entry.moves) > MAX_SHARED_MOVES or max(entry.moves + (0,)) > 255:
+            return
+        depth = -1 if entry.depth == float('inf') else int(entry.depth)
+        flag = _FLAGS.index(entry.flag)
+        if isinstance(entry.score, int):
+            flag |= _INT_SCORE
+        shared.check = 0
+        shared.score = entry.score
+        shared.depth = depth
+        shared.generation = entry.generation
+        shared.flag = flag
+        shared.num_moves = len(entry.moves)
+        shared.moves[:len(entry.moves)] = entry.moves
+        shared.check = entry.key ^ _entry_hash(entry.score, depth,
+                                               entry.generation, flag,
+                                               entry.moves)
+
+    def __getstate__(self) :
+        state = self.__dict__.copy()
+        state['functions'] = None
+        return state
+
+    def __str__(self) :
+        return ("<SharedTranspositionTable holding %i of %i entries>"
+                % (len(self), self.size))
+    __repr__ = __str__